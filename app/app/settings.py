@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -26,6 +27,9 @@ SECRET_KEY = os.environ.get('SECRET_KEY', '123testchange')  # noqa
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = bool(int(os.environ.get('DEBUG', 0)))
 
+# Running manage.py test
+TESTING = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS = []
 ALLOWED_HOSTS.extend(
     filter(
@@ -38,12 +42,15 @@ ALLOWED_HOSTS.extend(
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # No autodiscover at startup, app/urls_admin.py does it
+    'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # OpClass() in index expressions (core/models.py)
+    'django.contrib.postgres',
     'core',
     'rest_framework',
     'rest_framework.authtoken',
@@ -53,6 +60,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Probes (/healthz, /readyz) skip everything below
+    'core.middleware.HealthCheckMiddleware',
+    # First after probes so it measures the whole stack
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,6 +72,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # After auth middleware so admin session users are known
+    'core.middleware.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
@@ -82,6 +96,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'app.wsgi.application'
 
+# Warm up the app in the uWSGI master before forking (core/warmup.py)
+WSGI_PRELOAD = os.environ.get('WSGI_PRELOAD', '1') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
@@ -139,6 +156,16 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Hashed names and .gz/.br copies of static files (core/storage.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -154,10 +181,170 @@ AUTH_USER_MODEL = 'core.User'
 # schema from rest framework
 # through spectacular package
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema'
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+
+    # Token buckets shared by the workers of a node, per user
+    # or per IP for anonymous requests (core/throttling.py)
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.SharedMemoryThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'read': os.environ.get('THROTTLE_RATE_READ', '600/min'),
+        'write': os.environ.get('THROTTLE_RATE_WRITE', '120/min'),
+        'upload': os.environ.get('THROTTLE_RATE_UPLOAD', '20/min'),
+    },
+    # Anonymous clients are told apart by REMOTE_ADDR, which nginx
+    # sets (proxy/uwsgi_params). X-Forwarded-For comes from the
+    # client, trusting it would give a new budget per request
+    'NUM_PROXIES': 0,
 }
+if TESTING:
+    # Buckets would carry over between tests and runs (user
+    # ids restart with each test database), throttle tests
+    # set their own rates and table
+    REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {}
+
+# File holding the token buckets, mapped by every worker. One
+# table per host: every process on it (workers, a dev server,
+# manage.py) shares the buckets, set another path to keep apart
+THROTTLE_TABLE_PATH = os.environ.get(
+    'THROTTLE_TABLE_PATH', '/tmp/recipe-throttle'
+)
+THROTTLE_TABLE_SLOTS = int(os.environ.get('THROTTLE_TABLE_SLOTS', 65536))
 
 # Enable to get image upload work through the browser interface
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
+
+# Where the generated schema files are kept (core/schema.py)
+SCHEMA_ROOT = os.environ.get('SCHEMA_ROOT', '/vol/web/schema')
+
+# Where profiles taken by core.middleware.ProfilerMiddleware
+# are stored and how often the sampling profiler samples (s).
+# Not under /vol/web, the proxy serves that volume as /static
+PROFILE_ROOT = os.environ.get('PROFILE_ROOT', '/vol/profiles')
+PROFILE_SAMPLE_INTERVAL = 0.001
+
+# Cached recipe responses (e.g facets, core/cache.py). The default
+# local memory cache is per worker process: every worker fills its
+# own copy (hit rate drops with more workers) and changes reach the
+# other workers through core/invalidation.py. Set CACHE_BACKEND and
+# CACHE_LOCATION to a shared backend (e.g
+# django.core.cache.backends.redis.RedisCache, redis://host:6379)
+# to share entries across workers and nodes
+CACHE_BACKEND = os.environ.get(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache',
+)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'recipe-api'),
+    },
+}
+if CACHE_BACKEND.endswith('LocMemCache'):
+    # Entries per worker, the default (300) is soon full
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000)),
+    }
+
+# Seconds cached recipe responses (e.g facets) are kept,
+# they are invalidated on change anyway (core/cache.py)
+RECIPE_CACHE_TIMEOUT = int(os.environ.get('RECIPE_CACHE_TIMEOUT', 300))
+
+# Seconds a successful /readyz check is reused (core/health.py)
+READYZ_CACHE_SECONDS = float(os.environ.get('READYZ_CACHE_SECONDS', 5))
+
+# Users whose bitmap index (core/bitmaps.py) each worker keeps
+BITMAP_INDEX_USERS = int(os.environ.get('BITMAP_INDEX_USERS', 1000))
+
+# Admin changelists of tables bigger than this (rows, from
+# planner estimates) show an estimated count instead of running
+# COUNT(*), and rows handled per query by admin bulk actions
+ADMIN_EXACT_COUNT_LIMIT = int(
+    os.environ.get('ADMIN_EXACT_COUNT_LIMIT', 10000)
+)
+ADMIN_BATCH_SIZE = int(os.environ.get('ADMIN_BATCH_SIZE', 1000))
+
+# Requests slower than this (ms) are logged with
+# their SQL by core.middleware.ServerTimingMiddleware
+SLOW_REQUEST_THRESHOLD_MS = int(
+    os.environ.get('SLOW_REQUEST_THRESHOLD_MS', 500)
+)
+# Password hashing alone takes longer than the threshold,
+# every login/sign up/password change would be logged
+SLOW_REQUEST_SKIP_ROUTES = ['user:create', 'user:token', 'user:me']
+
+# Seconds a response stored for an Idempotency-Key header is
+# replayed, and how long a duplicate waits for the first
+# request still running (core/idempotency.py)
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 86400))
+IDEMPOTENCY_WAIT_TIMEOUT = float(
+    os.environ.get('IDEMPOTENCY_WAIT_TIMEOUT', 10)
+)
+
+# Max rows of one delta sync response, and days deleted rows
+# are remembered for it (compact_tombstones command)
+SYNC_CHANGES_LIMIT = int(os.environ.get('SYNC_CHANGES_LIMIT', 500))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(
+    os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 30)
+)
+
+# Thread applying cache invalidations of other workers,
+# started after fork by app/wsgi.py (core/invalidation.py)
+INVALIDATION_LISTENER = os.environ.get(
+    'INVALIDATION_LISTENER', '1'
+) == '1'
+INVALIDATION_COALESCE_MS = int(
+    os.environ.get('INVALIDATION_COALESCE_MS', 50)
+)
+
+# Background jobs (core/jobs.py, run_workers command)
+JOB_WORKER_THREADS = int(os.environ.get('JOB_WORKER_THREADS', 4))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+
+# Retry n waits about BASE * 2^(n-1) seconds, at most MAX
+JOB_RETRY_BASE_DELAY = 10
+JOB_RETRY_MAX_DELAY = 3600
+
+# A job whose worker stopped refreshing its lock for longer
+# is assumed lost (worker died) and queued again
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 600))
+
+# Jobs run_workers queues on its own, name -> seconds between runs
+PERIODIC_JOBS = {
+    'core.reconcile_recipe_counts': 24 * 60 * 60,
+    'core.purge_idempotency_keys': 60 * 60,
+    'core.compact_tombstones': 24 * 60 * 60,
+}
+
+# Account and bulk recipe deletion (core/deletion.py): rows per
+# transaction, pause between batches (s), replica lag (s) above
+# which batches wait, and seconds of work per job
+DELETION_BATCH_SIZE = int(os.environ.get('DELETION_BATCH_SIZE', 500))
+DELETION_BATCH_PAUSE = float(os.environ.get('DELETION_BATCH_PAUSE', 0.05))
+DELETION_MAX_REPLICATION_LAG = float(
+    os.environ.get('DELETION_MAX_REPLICATION_LAG', 5)
+)
+DELETION_TIME_BUDGET = int(os.environ.get('DELETION_TIME_BUDGET', 120))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+        'null': {
+            'class': 'logging.NullHandler',
+        },
+    },
+    'loggers': {
+        'core.slow_requests': {
+            # Tests check entries with assertLogs, not the console
+            'handlers': ['null'] if TESTING else ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,49 @@
+"""
+Settings of the API worker pool
+
+Requests under /api/ authenticate with tokens only, so this profile
+drops what just the admin needs: sessions, CSRF, messages, Django
+authentication middleware, templates and the browsable API. The
+admin and Swagger UI are served by another pool running app.settings
+(scripts/run.sh, proxy/default.conf.tpl).
+
+DRF itself still imports the django.contrib.admin package (through
+admindocs, for its schema generators), but the admin app, its
+ModelAdmins and URLs are not loaded.
+
+    DJANGO_SETTINGS_MODULE=app.settings_api
+"""
+from app.settings import *  # noqa: F401,F403
+from app.settings import INSTALLED_APPS, REST_FRAMEWORK
+
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS
+    if app not in (
+        'django.contrib.admin.apps.SimpleAdminConfig',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+    )
+]
+
+MIDDLEWARE = [
+    # Probes (/healthz, /readyz) skip everything below
+    'core.middleware.HealthCheckMiddleware',
+    # First after probes so it measures the whole stack
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ServerTimingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    # Finds staff users by token, no session here
+    'core.middleware.ProfilerMiddleware',
+]
+
+ROOT_URLCONF = 'app.urls_api'
+
+# No template is ever rendered
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
@@ -13,47 +13,28 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
+from django.urls import path
+from django.urls.resolvers import RoutePattern, URLResolver
 
-# This 'include' helper function
-# allow to add URLS from different app
-from django.urls import path, include
-
-# For static media file
-from django.conf.urls.static import static
-from django.conf import settings
-
-# Import spectacular to link url
-# to serve api document
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
+from app.urls_api import urlpatterns as api_urlpatterns
+from core import views as core_views
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
-
-    # Define api/schema as a view of api schema
-    # to generate schema file
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
+    # Unlike include(), a resolver given the module name only
+    # imports it when a request gets there, workers that never
+    # serve the admin never load it (core/warmup.py)
+    URLResolver(
+        RoutePattern('admin/', is_endpoint=False),
+        'app.urls_admin',
+        app_name='admin',
+        namespace='admin',
+    ),
 
     # For document api link using swagger
-    # from api_schema url (define above)
-    path('api/docs/', SpectacularSwaggerView.as_view(url_name='api-schema'),
-         name='api-doc'),
+    # from api_schema url (app/urls_api.py)
+    path('api/docs/', core_views.docs, name='api-doc'),
 
-    # Add user view url to main app
-    # 'user.urls' is file path
-    path('api/user/', include('user.urls')),
-
-    # Add recipe
-    path('api/recipe/', include('recipe.urls'))
+    # API (metrics, schema, user, recipe), also served
+    # alone by the API pool (app/settings_api.py)
+    *api_urlpatterns,
 ]
-
-# For debug mode, serving media file from local
-# In production local files will not accessible (must)
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
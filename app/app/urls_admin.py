@@ -0,0 +1,10 @@
+"""
+Admin URLs, imported on the first admin request (see app/urls.py)
+"""
+from django.contrib import admin
+
+# Registers the ModelAdmins of every app (core/admin.py ...),
+# skipped at startup by SimpleAdminConfig
+admin.autodiscover()
+
+urlpatterns = admin.site.get_urls()
@@ -0,0 +1,27 @@
+"""
+URLs of the API, the whole URLconf of the API pool (app/settings_api.py)
+"""
+from django.urls import path, include
+
+from core import views as core_views
+
+urlpatterns = [
+    # Prometheus scrape endpoint
+    path('metrics', core_views.metrics, name='metrics'),
+
+    # Liveness/readiness probes, answered early by
+    # core.middleware.HealthCheckMiddleware
+    path('healthz', core_views.healthz, name='healthz'),
+    path('readyz', core_views.readyz, name='readyz'),
+
+    # Define api/schema as a view of api schema, generated
+    # once per code version and served from memory (core/schema.py)
+    path('api/schema/', core_views.schema, name='api-schema'),
+
+    # Add user view url to main app
+    # 'user.urls' is file path
+    path('api/user/', include('user.urls')),
+
+    # Add recipe
+    path('api/recipe/', include('recipe.urls'))
+]
@@ -9,8 +9,27 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+from core.invalidation import start_listener  # noqa: E402
+from core import warmup  # noqa: E402
+
+# Threads don't survive fork, under uWSGI start the invalidation
+# listener in every worker once it's forked from the master
+try:
+    from uwsgidecorators import postfork
+except ImportError:
+    start_listener()
+else:
+    # Loaded in the master (no --lazy-apps), build what the workers
+    # need once so it's shared with them (core/warmup.py)
+    if settings.WSGI_PRELOAD:
+        warmup.warm_up()
+        warmup.freeze()
+
+    postfork(start_listener)
@@ -2,7 +2,18 @@
 Custom Django admin
 """
 
-from django.contrib import admin
+import json
+import os
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.http import FileResponse, Http404
+from django.utils.functional import cached_property
+from django.urls import path, reverse
+from django.utils.html import format_html
 
 # Import as base class to customize
 # Dont meet conflict other UserAdmin uses
@@ -13,6 +24,117 @@ from django.utils.translation import gettext_lazy
 
 # Import customed models
 from . import models
+from .counters import reconcile_recipe_counts
+
+
+def estimated_count(queryset):
+    """Rows of queryset estimated by PostgreSQL, None if unknown"""
+    if connection.vendor != 'postgresql':
+        return None
+
+    # Whole table: row count kept by VACUUM/ANALYZE, -1 if the
+    # table was never analyzed
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < 0:
+            return None
+        return int(row[0])
+
+    # Filtered (search, list filters): rows expected by the planner
+    plan = json.loads(queryset.explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator skipping COUNT(*) on big tables
+
+    Counting millions of rows reads the whole table (or index) on
+    every changelist page, planner estimates are free. Small
+    results are still counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < settings.ADMIN_EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+def batched_ids(queryset, size):
+    """Primary keys of queryset, size at a time
+
+    Keyset pagination (pk > last), each batch is found from
+    the index instead of skipping the previous ones
+    """
+    queryset = queryset.order_by('pk').values_list('pk', flat=True)
+    last = None
+    while True:
+        batch = queryset if last is None else queryset.filter(pk__gt=last)
+        ids = list(batch[:size])
+        if not ids:
+            return
+        yield ids
+        last = ids[-1]
+
+
+@admin.action(
+    permissions=['delete'],
+    description=gettext_lazy('Delete selected %(verbose_name_plural)s'),
+)
+def delete_in_batches(modeladmin, request, queryset):
+    """Delete ADMIN_BATCH_SIZE rows per transaction
+
+    Replaces delete_selected, whose confirmation page loads every
+    selected object and its relations, and which deletes them all
+    in one long transaction
+    """
+    model = queryset.model
+    deleted = 0
+    for ids in batched_ids(queryset, settings.ADMIN_BATCH_SIZE):
+        batch = model.objects.filter(pk__in=ids)
+        with transaction.atomic():
+            # Admin history like delete_selected, one entry per row
+            modeladmin.log_deletions(request, batch)
+            _, per_model = batch.delete()
+        deleted += per_model.get(model._meta.label, 0)
+
+    modeladmin.message_user(
+        request,
+        f'Deleted {deleted} {model._meta.verbose_name_plural}.',
+        messages.SUCCESS,
+    )
+
+
+@admin.action(description=gettext_lazy('Recount recipes of selected'))
+def recount_recipes(modeladmin, request, queryset):
+    """Fix recipe_count of selected tags/ingredients, in batches"""
+    fixed = 0
+    for ids in batched_ids(queryset, settings.ADMIN_BATCH_SIZE):
+        fixed += reconcile_recipe_counts(queryset.model, ids)
+
+    modeladmin.message_user(
+        request, f'Fixed {fixed} recipe counts.', messages.SUCCESS,
+    )
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Options of admins of tables with millions of rows"""
+
+    paginator = EstimatedCountPaginator
+    # "N results (M total)" would run an unfiltered COUNT(*)
+    show_full_result_count = False
+    actions = [delete_in_batches]
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
 
 
 class MyAdmin(UserAdmin):
@@ -23,6 +145,13 @@ class MyAdmin(UserAdmin):
     ordering = ['id']
     list_display = ['email', 'name']
 
+    # UserAdmin searches username and first/last names, which
+    # this model doesn't have. Prefix search uses an index
+    # (core/models.py), also used by autocomplete of other admins
+    search_fields = ['^email']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     # Customized fields sets, only
     # specified fields exist in model
     # created by me or intergrated with
@@ -74,6 +203,110 @@ class MyAdmin(UserAdmin):
 # this admin
 # Specify custom admin_class of user is MyAdmin
 admin.site.register(models.User, MyAdmin)
-admin.site.register(models.Recipe)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
+
+
+class RecipeAdmin(ScalableAdmin):
+    """Recipes, without loading every tag/ingredient in the form"""
+
+    list_display = ['id', 'title', 'user', 'price',
+                    'minute_to_make_recipe']
+    list_select_related = ['user']
+    search_fields = ['^title']
+    ordering = ['-id']
+
+    # Searched by email instead of a <select> of every user
+    autocomplete_fields = ['user']
+    # Ids typed in (or picked in a popup), tags/ingredients of
+    # all users would not fit in a <select>
+    raw_id_fields = ['tags', 'ingredients']
+
+
+class RecipeLinkAdmin(ScalableAdmin):
+    """Tags and ingredients"""
+
+    list_display = ['id', 'name', 'user', 'recipe_count']
+    list_select_related = ['user']
+    search_fields = ['^name']
+    ordering = ['-id']
+    autocomplete_fields = ['user']
+    readonly_fields = ['recipe_count']
+    actions = [delete_in_batches, recount_recipes]
+
+
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Tag, RecipeLinkAdmin)
+admin.site.register(models.Ingredient, RecipeLinkAdmin)
+
+
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Browse recent request profiles"""
+
+    list_display = ['created_at', 'method', 'path', 'mode',
+                    'status_code', 'duration_ms', 'user', 'download']
+    list_filter = ['mode', 'method']
+    list_select_related = ['user']
+
+    # Profiles are created by the middleware only
+    readonly_fields = [field.name for field in
+                       models.RequestProfile._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    # Extra admin url serving the profile file
+    def get_urls(self):
+        return [
+            path(
+                '<int:profile_id>/download/',
+                self.admin_site.admin_view(self.download_view),
+                name='core_requestprofile_download',
+            ),
+        ] + super().get_urls()
+
+    @admin.display(description='File')
+    def download(self, obj):
+        url = reverse('admin:core_requestprofile_download', args=[obj.id])
+        return format_html('<a href="{}">{}</a>', url, obj.file_name)
+
+    def download_view(self, request, profile_id):
+        # admin_view only checks is_staff, profiles show
+        # code paths and data of other users
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        profile = self.get_object(request, str(profile_id))
+        if profile is None:
+            raise Http404
+
+        file_path = os.path.join(settings.PROFILE_ROOT, profile.file_name)
+        if not os.path.exists(file_path):
+            raise Http404
+
+        return FileResponse(
+            open(file_path, 'rb'),
+            as_attachment=True,
+            filename=profile.file_name,
+        )
+
+
+admin.site.register(models.RequestProfile, RequestProfileAdmin)
+
+
+class DeletionOperationAdmin(admin.ModelAdmin):
+    """Progress of background deletions (core/deletion.py)"""
+
+    # user_id, the user of a finished account deletion is gone
+    list_display = ['id', 'kind', 'user_id', 'status', 'deleted',
+                    'total', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind']
+
+    # Recipe ids of a bulk deletion can be 100k long
+    fields = readonly_fields = ['kind', 'user_id', 'status', 'deleted',
+                                'total', 'pending_files', 'created_at',
+                                'finished_at']
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(models.DeletionOperation, DeletionOperationAdmin)
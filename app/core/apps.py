@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Connect signal handlers once models are loaded
+        from core import signals  # noqa
+
+        # Register jobs of every app (<app>/tasks.py) so they
+        # can be enqueued from anywhere (core/jobs.py)
+        autodiscover_modules('tasks')
@@ -0,0 +1,291 @@
+"""
+Per user bitmap index of recipe tags and ingredients
+
+Every recipe of a user gets a bit position, every tag and
+ingredient a bitset (a Python int, bit n set if recipe n is
+linked to it). Filters are bitwise operations instead of joins:
+
+    any of ids   OR of their bitsets
+    all of ids   AND of their bitsets
+    pantry       recipes using only pantry ingredients, i.e. linked
+                 to one of them AND NOT linked to any other
+
+Indexes live in the memory of each worker, built on first use
+(LRU of BITMAP_INDEX_USERS users), patched from signals once the
+transaction commits and dropped when another worker changes the
+recipes of the user (core/invalidation.py).
+"""
+import threading
+
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from core import invalidation
+from core.models import Recipe
+
+ANY = 'any'
+ALL = 'all'
+
+# Share of positions of deleted recipes above which an index
+# is compacted, see UserIndex.compact()
+MAX_DEAD_SHARE = 0.25
+
+_lock = threading.Lock()
+
+# user id -> UserIndex, least recently used first
+_indexes = OrderedDict()
+
+# user id -> recipe ids changed while its index was loading
+_loading = {}
+
+_pending = threading.local()
+
+
+class UserIndex:
+    """Bitsets of the recipes of one user"""
+
+    def __init__(self):
+        # recipe id -> bit, bit -> recipe id
+        self.positions = {}
+        self.recipe_ids = []
+        # tag/ingredient id -> bitset
+        self.tags = {}
+        self.ingredients = {}
+        # recipe id -> (tag ids, ingredient ids), to unset its bits
+        self.links = {}
+
+    def set_recipe(self, recipe_id, tag_ids, ingredient_ids):
+        """Add a recipe or replace its links"""
+        self.remove_recipe(recipe_id)
+
+        # A recipe keeps its bit, new ones take the next
+        bit = self.positions.setdefault(recipe_id, len(self.recipe_ids))
+        if bit == len(self.recipe_ids):
+            self.recipe_ids.append(recipe_id)
+
+        mask = 1 << bit
+        for bitsets, ids in ((self.tags, tag_ids),
+                             (self.ingredients, ingredient_ids)):
+            for target_id in ids:
+                bitsets[target_id] = bitsets.get(target_id, 0) | mask
+
+        self.links[recipe_id] = (frozenset(tag_ids),
+                                 frozenset(ingredient_ids))
+
+    def remove_recipe(self, recipe_id):
+        """Unset the bits of a recipe (deleted or links changing)"""
+        if recipe_id not in self.links:
+            return
+
+        mask = ~(1 << self.positions[recipe_id])
+        tag_ids, ingredient_ids = self.links.pop(recipe_id)
+        for bitsets, ids in ((self.tags, tag_ids),
+                             (self.ingredients, ingredient_ids)):
+            for target_id in ids:
+                bitset = bitsets[target_id] & mask
+                if bitset:
+                    bitsets[target_id] = bitset
+                else:
+                    del bitsets[target_id]
+
+    def dead_share(self):
+        """Share of bit positions left by deleted recipes"""
+        if not self.recipe_ids:
+            return 0
+        return 1 - len(self.links) / len(self.recipe_ids)
+
+    def compact(self):
+        """Give live recipes positions 0..n-1 again
+
+        Bits of deleted recipes stay taken until then, bitsets
+        would grow with every recipe the user ever had
+        """
+        links = self.links
+        live = sorted(links, key=self.positions.get)
+        self.__init__()
+        for recipe_id in live:
+            self.set_recipe(recipe_id, *links[recipe_id])
+
+    def match(self, bitsets, ids, mode=ANY):
+        """Bitset of recipes linked to any/all of ids"""
+        ids = list(ids)
+        if mode == ALL:
+            result = bitsets.get(ids[0], 0) if ids else 0
+            for target_id in ids[1:]:
+                result &= bitsets.get(target_id, 0)
+            return result
+
+        result = 0
+        for target_id in ids:
+            result |= bitsets.get(target_id, 0)
+        return result
+
+    def pantry(self, ingredient_ids):
+        """Bitset of recipes whose ingredients are all in ingredient_ids
+
+        Recipes without ingredients are left out
+        """
+        pantry = set(ingredient_ids)
+        missing = 0
+        for ingredient_id, bitset in self.ingredients.items():
+            if ingredient_id not in pantry:
+                missing |= bitset
+
+        return self.match(self.ingredients, pantry) & ~missing
+
+    def to_ids(self, bitset):
+        """Recipe ids of the bits set in bitset"""
+        # bin() runs in C, far faster than shifting a big int per bit
+        bits = bin(bitset)[:1:-1]
+        return [
+            self.recipe_ids[bit]
+            for bit, flag in enumerate(bits) if flag == '1'
+        ]
+
+
+def _read_links(recipes):
+    """{recipe id: (tag ids, ingredient ids)} of a Recipe queryset"""
+    links = {
+        recipe_id: (set(), set())
+        for recipe_id in recipes.values_list('id', flat=True)
+    }
+    relations = [
+        (Recipe.tags.through, 'tag_id', 0),
+        (Recipe.ingredients.through, 'ingredient_id', 1),
+    ]
+    for through, column, side in relations:
+        rows = through.objects.filter(
+            recipe__in=recipes,
+        ).values_list('recipe_id', column)
+        for recipe_id, target_id in rows:
+            # Recipe may have been created after the first query
+            if recipe_id in links:
+                links[recipe_id][side].add(target_id)
+
+    return links
+
+
+def _build(user_id):
+    index = UserIndex()
+    links = _read_links(Recipe.objects.filter(user_id=user_id))
+    for recipe_id in sorted(links):
+        index.set_recipe(recipe_id, *links[recipe_id])
+    return index
+
+
+def get_index(user_id):
+    """Index of the user, built if this worker has none"""
+    with _lock:
+        index = _indexes.get(user_id)
+        if index is not None:
+            _indexes.move_to_end(user_id)
+            return index
+        _loading.setdefault(user_id, set())
+
+    index = _build(user_id)
+
+    # Changes committed while building may be missing, read them again
+    with _lock:
+        changed = _loading.pop(user_id, set())
+    if changed is None:
+        # Another worker changed the recipes meanwhile, use the
+        # index for this request only
+        return index
+    if changed:
+        _patch(index, changed)
+
+    with _lock:
+        _indexes[user_id] = index
+        while len(_indexes) > settings.BITMAP_INDEX_USERS:
+            _indexes.popitem(last=False)
+
+    return index
+
+
+def filter_recipe_ids(user_id, tags=None, ingredients=None, match=ANY,
+                      pantry=None):
+    """Ids of the user recipes matching tags/ingredients/pantry
+
+    tags, ingredients: ids, recipes linked to any (or all) of them
+    pantry: ingredient ids, recipes made only of those
+    """
+    if not tags and not ingredients and pantry is None:
+        raise ValueError('No filter given')
+
+    index = get_index(user_id)
+
+    with _lock:
+        result = -1
+        if tags:
+            result &= index.match(index.tags, tags, match)
+        if ingredients:
+            result &= index.match(index.ingredients, ingredients, match)
+        if pantry is not None:
+            result &= index.pantry(pantry)
+
+        return index.to_ids(result)
+
+
+def _patch(index, recipe_ids):
+    """Read recipes again into index, missing ones were deleted"""
+    links = _read_links(Recipe.objects.filter(id__in=recipe_ids))
+
+    with _lock:
+        for recipe_id in recipe_ids:
+            if recipe_id in links:
+                index.set_recipe(recipe_id, *links[recipe_id])
+            else:
+                index.remove_recipe(recipe_id)
+
+        if index.dead_share() > MAX_DEAD_SHARE:
+            index.compact()
+
+
+def schedule_update(user_id, recipe_ids):
+    """Update index of the user once the transaction commits"""
+    if not hasattr(_pending, 'changes'):
+        _pending.changes = {}
+    _pending.changes.setdefault(user_id, set()).update(recipe_ids)
+
+    # Same scheme as core/invalidation.py, the first callback
+    # run applies everything pending
+    transaction.on_commit(_apply_pending)
+
+
+def _apply_pending():
+    changes = _pending.__dict__.pop('changes', {})
+    for user_id, recipe_ids in changes.items():
+        with _lock:
+            index = _indexes.get(user_id)
+            if _loading.get(user_id) is not None:
+                _loading[user_id].update(recipe_ids)
+
+        # Nothing to do for users without an index here
+        if index is not None:
+            _patch(index, recipe_ids)
+
+
+def clear():
+    """Drop every index of this worker"""
+    with _lock:
+        _indexes.clear()
+
+
+def _drop(user_ids):
+    """Invalidation of 'recipes' by other workers, keys are user ids"""
+    if user_ids is None:
+        clear()
+        return
+
+    with _lock:
+        for user_id in map(int, user_ids):
+            _indexes.pop(user_id, None)
+            if user_id in _loading:
+                # Being built from data older than this change
+                _loading[user_id] = None
+
+
+# Changes of this worker are patched in by the signals
+invalidation.subscribe('recipes', _drop, remote_only=True)
@@ -0,0 +1,55 @@
+"""
+Cache keys of per user recipe data
+
+Works with any cache backend (settings.CACHES). With the default
+local memory cache each worker has its own entries and counters,
+the invalidation bus (core/invalidation.py) bumps the counters of
+the other workers.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+
+def _generation_key(user_id):
+    return f'recipe-generation:{user_id}'
+
+
+def user_generation(user_id):
+    """Current generation of user recipe data"""
+
+    # Start from a unique value, if the counter is ever
+    # evicted, old entries can't match the new generation
+    cache.add(_generation_key(user_id), time.time_ns(), None)
+    return cache.get(_generation_key(user_id))
+
+
+def bump_user_generation(user_id):
+    """Invalidate every cached entry of the user
+
+    Entries are never deleted, they just can't be
+    looked up anymore and expire on their own
+    """
+    try:
+        cache.incr(_generation_key(user_id))
+    except ValueError:
+        # Not in cache (never read or evicted)
+        cache.set(_generation_key(user_id), time.time_ns(), None)
+
+
+def recipe_cache_key(user_id, name, query_params):
+    """Key for a cached recipe list style response
+
+    name: which response (e.g 'list', 'facets')
+    query_params: request filters, order does not matter
+    """
+    params = '&'.join(
+        f'{key}={",".join(sorted(query_params.getlist(key)))}'
+        for key in sorted(query_params)
+    )
+    digest = hashlib.sha1(params.encode()).hexdigest()
+
+    return (
+        f'recipe:{name}:{user_id}:{user_generation(user_id)}:{digest}'
+    )
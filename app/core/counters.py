@@ -0,0 +1,59 @@
+"""
+Denormalized recipe counters of tags and ingredients
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from core.models import Recipe, Tag, Ingredient
+
+
+def counted_relations():
+    """(model, through model, column of model in through) pairs"""
+    return [
+        (Tag, Recipe.tags.through, 'tag_id'),
+        (Ingredient, Recipe.ingredients.through, 'ingredient_id'),
+    ]
+
+
+def change_recipe_counts(model, ids, delta):
+    """Add delta to recipe_count of the given rows"""
+    if not ids or not delta:
+        return
+
+    # F expression so the database adds to the current value,
+    # concurrent requests can't overwrite each other
+    model.objects.filter(id__in=ids).update(
+        recipe_count=F('recipe_count') + delta,
+    )
+
+
+def reconcile_recipe_counts(model, ids=None):
+    """Fix rows of model whose recipe_count drifted, return how many
+
+    ids: only check those rows (e.g admin action), all when None
+    """
+    through, column = {
+        relation[0]: relation[1:] for relation in counted_relations()
+    }[model]
+
+    actual = Coalesce(
+        Subquery(
+            through.objects.filter(**{column: OuterRef('pk')})
+            .order_by()
+            .values(column)
+            .annotate(count=Count('*'))
+            .values('count')
+        ),
+        Value(0),
+    )
+
+    rows = model.objects.all()
+    if ids is not None:
+        rows = rows.filter(pk__in=ids)
+
+    drifted = rows.annotate(actual=actual).exclude(
+        recipe_count=F('actual'),
+    )
+    return model.objects.filter(
+        pk__in=drifted.values('pk'),
+    ).update(recipe_count=actual)
@@ -0,0 +1,195 @@
+"""
+Account and bulk recipe deletion, in the background and in batches
+
+Deleting an account cascades through its recipes, tags, ingredients,
+their links and index rows. Done in the request, that is one long
+transaction locking every row until it commits, and a replica
+falling behind while it replays it.
+
+Instead the request only records a DeletionOperation (and for an
+account, deactivates it at once), the core.run_deletion job then
+deletes DELETION_BATCH_SIZE rows per transaction. Rows still go
+through Django's delete() so signals keep counters, tombstones and
+indexes right. Before each batch the job waits for replicas lagging
+more than DELETION_MAX_REPLICATION_LAG (or hands over to a later
+job), and image files of deleted recipes are removed once their
+batch has committed.
+"""
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+
+from core.jobs import enqueue
+from core.models import DeletionOperation, Ingredient, Recipe, Tag, User
+
+JOB_NAME = 'core.run_deletion'
+
+# Seconds before a job stopped by replica lag runs again
+LAG_RETRY_DELAY = 30
+
+
+def delete_account(user):
+    """Deactivate user now, queue deletion of all it owns"""
+    with transaction.atomic():
+        # Inactive users fail token authentication,
+        # the token goes too so it can't be reused
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        Token.objects.filter(user=user).delete()
+
+        total = 1 + sum(
+            model.objects.filter(user=user).count()
+            for model in (Recipe, Tag, Ingredient)
+        )
+        operation = DeletionOperation.objects.create(
+            user=user, kind=DeletionOperation.ACCOUNT, total=total,
+        )
+        enqueue(JOB_NAME, {'operation_id': operation.id})
+
+    return operation
+
+
+def delete_recipes(user, recipe_ids):
+    """Queue deletion of the recipes of user among recipe_ids"""
+    recipe_ids = sorted(
+        Recipe.objects.filter(user=user, id__in=recipe_ids)
+        .values_list('id', flat=True)
+    )
+    with transaction.atomic():
+        operation = DeletionOperation.objects.create(
+            user=user, kind=DeletionOperation.RECIPES,
+            recipe_ids=recipe_ids, total=len(recipe_ids),
+        )
+        enqueue(JOB_NAME, {'operation_id': operation.id})
+
+    return operation
+
+
+def _batches(operation):
+    """(model, ids) to delete, one batch at a time
+
+    Ids are looked up again for each batch, so a job resumed after
+    a failure starts from what is left
+    """
+    size = settings.DELETION_BATCH_SIZE
+    if operation.kind == DeletionOperation.RECIPES:
+        for start in range(0, len(operation.recipe_ids), size):
+            ids = list(Recipe.objects.filter(
+                user_id=operation.user_id,
+                id__in=operation.recipe_ids[start:start + size],
+            ).values_list('id', flat=True))
+            if ids:
+                yield Recipe, ids
+        return
+
+    # Recipes first, deleting them removes the links to tags
+    # and ingredients (and the work of their cascade)
+    for model in (Recipe, Tag, Ingredient):
+        rows = model.objects.filter(
+            user_id=operation.user_id,
+        ).order_by('id').values_list('id', flat=True)
+        while True:
+            ids = list(rows[:size])
+            if not ids:
+                break
+            yield model, ids
+
+
+def _delete_batch(operation, model, ids):
+    """Delete rows of one batch in their own transaction"""
+    with transaction.atomic():
+        files = []
+        if model is Recipe:
+            files = list(
+                Recipe.objects.filter(id__in=ids).exclude(image='')
+                .exclude(image=None).values_list('image', flat=True)
+            )
+
+        _, per_model = model.objects.filter(id__in=ids).delete()
+
+        operation.deleted += per_model.get(model._meta.label, 0)
+        operation.pending_files = operation.pending_files + files
+        operation.save(update_fields=['deleted', 'pending_files'])
+
+
+def _remove_files(operation):
+    """Remove images of recipes deleted by committed batches"""
+    if not operation.pending_files:
+        return
+
+    for name in operation.pending_files:
+        default_storage.delete(name)
+    operation.pending_files = []
+    operation.save(update_fields=['pending_files'])
+
+
+def replication_lag():
+    """Seconds the slowest replica is behind, 0 without replicas
+
+    Lag columns are NULL for roles without pg_monitor, no pacing then
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT COALESCE(EXTRACT(EPOCH FROM MAX(replay_lag)), 0) '
+            'FROM pg_stat_replication'
+        )
+        return float(cursor.fetchone()[0])
+
+
+def _wait_for_replicas(deadline):
+    """Wait while replicas lag behind, False if still at deadline"""
+    while replication_lag() > settings.DELETION_MAX_REPLICATION_LAG:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(1)
+    return True
+
+
+def run(operation_id):
+    """Delete rows of an operation for up to DELETION_TIME_BUDGET s
+
+    What is left goes to a new job, so one job never keeps a
+    worker (and the jobs queued behind it) for long
+    """
+    operation = DeletionOperation.objects.get(id=operation_id)
+    if operation.status == DeletionOperation.DONE:
+        return
+
+    operation.status = DeletionOperation.RUNNING
+    operation.save(update_fields=['status'])
+    deadline = time.monotonic() + settings.DELETION_TIME_BUDGET
+
+    # Left by a run that stopped before removing them
+    _remove_files(operation)
+
+    for model, ids in _batches(operation):
+        # Before every batch, the first one of a job too: replicas
+        # still behind at the deadline get a later job, the worker
+        # is not kept waiting
+        if not _wait_for_replicas(deadline):
+            enqueue(JOB_NAME, {'operation_id': operation.id},
+                    delay=LAG_RETRY_DELAY)
+            return
+
+        _delete_batch(operation, model, ids)
+        _remove_files(operation)
+
+        if time.monotonic() > deadline:
+            enqueue(JOB_NAME, {'operation_id': operation.id})
+            return
+        time.sleep(settings.DELETION_BATCH_PAUSE)
+
+    with transaction.atomic():
+        if operation.kind == DeletionOperation.ACCOUNT:
+            # Cascades to what little is left (tokens, keys)
+            User.objects.filter(id=operation.user_id).delete()
+            operation.deleted += 1
+
+        operation.status = DeletionOperation.DONE
+        operation.finished_at = timezone.now()
+        operation.save(update_fields=['deleted', 'status', 'finished_at'])
@@ -0,0 +1,76 @@
+"""
+Liveness and readiness of a worker (/healthz, /readyz)
+
+Liveness only says the process answers requests, readiness that
+it can serve them: the database answers and every migration of
+the code is applied. Orchestrators probe often, so a ready result
+is kept READYZ_CACHE_SECONDS, a failure is checked again on the
+next probe so a worker gets traffic as soon as it is ready.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+
+_lock = threading.Lock()
+
+# time.monotonic() until which the worker is known ready
+_ready_until = 0
+
+# Migrations of the running code stay applied once they are
+_migrated = False
+
+
+def database_ok():
+    """True if a trivial query runs"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return True
+    except DatabaseError:
+        return False
+
+
+def migrations_applied():
+    """True if no migration of the installed apps is left to apply"""
+    global _migrated
+
+    if not _migrated:
+        # Loads every migration file, done until they are applied only
+        executor = MigrationExecutor(connection)
+        targets = executor.loader.graph.leaf_nodes()
+        _migrated = not executor.migration_plan(targets)
+
+    return _migrated
+
+
+def check_ready():
+    """None when ready, else the reason why not"""
+    global _ready_until
+
+    with _lock:
+        if time.monotonic() < _ready_until:
+            return None
+
+    if not database_ok():
+        return 'database unavailable'
+    try:
+        if not migrations_applied():
+            return 'migrations not applied'
+    except DatabaseError:
+        return 'database unavailable'
+
+    with _lock:
+        _ready_until = time.monotonic() + settings.READYZ_CACHE_SECONDS
+    return None
+
+
+def reset():
+    """Forget cached results (tests)"""
+    global _ready_until, _migrated
+
+    with _lock:
+        _ready_until = 0
+        _migrated = False
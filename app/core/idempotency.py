@@ -0,0 +1,165 @@
+"""
+Idempotency-Key support for unsafe API handlers
+
+A client retrying a request sends the same Idempotency-Key header,
+the first response is stored and replayed to the duplicates
+instead of running the handler again
+"""
+import datetime
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+# Postgres error code of lock_timeout
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+def fingerprint(request):
+    """Hash of what the request asks for (method, path and body)"""
+    digest = hashlib.sha256(f'{request.method} {request.path}'.encode())
+    data = request.data
+
+    if not isinstance(data, dict):
+        digest.update(json.dumps(data, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    for name in sorted(data):
+        values = data.getlist(name) if hasattr(data, 'getlist') else [
+            data[name]
+        ]
+        for value in values:
+            digest.update(name.encode())
+
+            # Uploaded file, hash the content and rewind
+            # so the handler can still read it
+            if hasattr(value, 'chunks'):
+                for chunk in value.chunks():
+                    digest.update(chunk)
+                value.seek(0)
+            else:
+                digest.update(
+                    json.dumps(value, sort_keys=True, default=str).encode()
+                )
+
+    return digest.hexdigest()
+
+
+def _expired(record):
+    ttl = datetime.timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    return record.created_at < timezone.now() - ttl
+
+
+def _claim(user, key, digest):
+    """Insert the key row, None if it already exists
+
+    A duplicate sent while the first request is running blocks
+    here on the unique index until the first transaction ends
+    """
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user=user, key=key, fingerprint=digest,
+            )
+    except IntegrityError:
+        return None
+
+
+def _set_lock_timeout(seconds):
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        if seconds is None:
+            cursor.execute('SET LOCAL lock_timeout TO DEFAULT')
+        else:
+            cursor.execute(
+                "SELECT set_config('lock_timeout', %s, true)",
+                [f'{int(seconds * 1000)}ms'],
+            )
+
+
+def _replay(record):
+    return Response(
+        record.response,
+        status=record.status_code,
+        headers={REPLAYED_HEADER: 'true'},
+    )
+
+
+def idempotent(handler):
+    """Honor the Idempotency-Key header on a viewset handler
+
+    The handler runs in the transaction holding the key row, so
+    its writes and the stored response are committed together.
+    Only responses below 400 are stored, an error rolls the key
+    back and the client can retry with it.
+    """
+    @functools.wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return handler(self, request, *args, **kwargs)
+
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response(
+                {'detail': f'{HEADER} is too long'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        digest = fingerprint(request)
+
+        with transaction.atomic():
+            _set_lock_timeout(settings.IDEMPOTENCY_WAIT_TIMEOUT)
+            try:
+                record = _claim(request.user, key, digest)
+                if record is None:
+                    record = IdempotencyKey.objects.get(
+                        user=request.user, key=key,
+                    )
+                    if _expired(record):
+                        record.delete()
+                        record = _claim(request.user, key, digest)
+                    else:
+                        if record.fingerprint != digest:
+                            return Response(
+                                {'detail': f'{HEADER} was already used '
+                                           'for a different request'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            )
+                        return _replay(record)
+            except OperationalError as exc:
+                if getattr(exc.__cause__, 'pgcode', None) != (
+                    LOCK_NOT_AVAILABLE
+                ):
+                    raise
+                return Response(
+                    {'detail': f'A request with this {HEADER} '
+                               'is still in progress'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            _set_lock_timeout(None)
+
+            response = handler(self, request, *args, **kwargs)
+
+            if response.status_code >= 400:
+                transaction.set_rollback(True)
+                return response
+
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save(update_fields=['status_code', 'response'])
+
+        return response
+
+    return wrapper
@@ -0,0 +1,219 @@
+"""
+Invalidation bus between workers over Postgres LISTEN/NOTIFY
+
+Caches of a worker (e.g the local memory cache) are not seen by
+the other workers and nodes. A change publishes a message like
+('recipes', user_id), it's applied to this worker right away and
+sent with NOTIFY once the transaction commits. A listener thread
+in every worker applies the messages of the others.
+"""
+import logging
+import os
+import select
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'cache_invalidation'
+
+# NOTIFY payloads must be shorter than 8000 bytes,
+# a bigger batch is sent as "flush everything"
+MAX_PAYLOAD = 7900
+FLUSH_ALL = '*'
+
+# kind -> [(callback, remote_only)], callbacks are called with a
+# set of keys, or None when everything of the kind must be dropped
+_subscribers = {}
+
+_pending = threading.local()
+_listener = None
+
+
+def subscribe(kind, callback, remote_only=False):
+    """Call callback(keys) when keys of kind are invalidated
+
+    remote_only: only for messages of other workers, for state
+    this worker keeps up to date by itself
+    """
+    _subscribers.setdefault(kind, []).append((callback, remote_only))
+
+
+def apply(messages, remote=False):
+    """Run callbacks of {kind: keys}, keys None drops everything"""
+    for kind, keys in messages.items():
+        for callback, remote_only in _subscribers.get(kind, []):
+            if remote_only and not remote:
+                continue
+            try:
+                callback(keys)
+            except Exception:
+                logger.exception('Invalidation of %s failed', kind)
+
+
+def flush_all():
+    """Drop everything, used when messages may have been missed"""
+    apply({kind: None for kind in _subscribers}, remote=True)
+
+
+def publish(kind, key):
+    """Invalidate key of kind here now, and in other workers on commit
+
+    Messages of one transaction are sent in a single NOTIFY
+    """
+    key = str(key)
+    apply({kind: {key}})
+
+    # The first callback run on commit sends everything pending,
+    # the others find nothing left. Leftovers of a rolled back
+    # transaction go with the next commit, a harmless extra.
+    if not hasattr(_pending, 'messages'):
+        _pending.messages = set()
+    _pending.messages.add(f'{kind}:{key}')
+    transaction.on_commit(_send)
+
+
+def _send():
+    messages = _pending.__dict__.pop('messages', set())
+    if not messages:
+        return
+
+    payload = ','.join(sorted(messages))
+    if len(payload) > MAX_PAYLOAD:
+        payload = FLUSH_ALL
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_notify(%s, %s)', [CHANNEL, f'{os.getpid()}|{payload}'],
+        )
+
+
+def parse(payloads, own_pid=None):
+    """{kind: keys} of NOTIFY payloads, None if everything is flushed
+
+    Messages sent by own_pid were already applied when published
+    """
+    messages = {}
+    for payload in payloads:
+        pid, _, body = payload.partition('|')
+        if own_pid is not None and pid == str(own_pid):
+            continue
+        if body == FLUSH_ALL:
+            return None
+
+        for message in body.split(','):
+            kind, _, key = message.partition(':')
+            messages.setdefault(kind, set()).add(key)
+
+    return messages
+
+
+class Listener(threading.Thread):
+    """Thread applying invalidations sent by other workers"""
+
+    def __init__(self, settings_dict, coalesce=0.05, keepalive=30,
+                 retry=1):
+        """
+        coalesce: seconds to wait for more messages of a burst
+        keepalive: seconds between checks of an idle connection
+        retry: seconds between reconnect attempts
+        """
+        super().__init__(name='invalidation-listener', daemon=True)
+        self.settings_dict = settings_dict
+        self.coalesce = coalesce
+        self.keepalive = keepalive
+        self.retry = retry
+        self.pid = os.getpid()
+        self.stopping = threading.Event()
+
+        # Set while LISTEN is active, tests wait on it
+        self.listening = threading.Event()
+        self.backend_pid = None
+
+    def stop(self):
+        self.stopping.set()
+
+    def _connect(self):
+        params = self.settings_dict
+        conn = psycopg2.connect(
+            dbname=params['NAME'],
+            user=params['USER'],
+            password=params['PASSWORD'],
+            host=params['HOST'] or None,
+            port=params['PORT'] or None,
+        )
+        conn.set_isolation_level(
+            psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT,
+        )
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        return conn
+
+    def run(self):
+        while not self.stopping.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                self.backend_pid = conn.get_backend_pid()
+
+                # Anything sent while not listening is lost
+                flush_all()
+                self.listening.set()
+                self._listen(conn)
+            except psycopg2.Error:
+                logger.warning('Invalidation listener disconnected',
+                               exc_info=True)
+            finally:
+                self.listening.clear()
+                if conn is not None:
+                    conn.close()
+
+            self.stopping.wait(self.retry)
+
+    def _listen(self, conn):
+        while not self.stopping.is_set():
+            ready, _, _ = select.select([conn], [], [], self.keepalive)
+            if not ready:
+                # Idle, make sure the connection is still alive
+                with conn.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                continue
+
+            conn.poll()
+            if not conn.notifies:
+                continue
+
+            # Let the rest of a burst arrive, apply it once
+            time.sleep(self.coalesce)
+            conn.poll()
+            payloads = [notify.payload for notify in conn.notifies]
+            conn.notifies.clear()
+
+            messages = parse(payloads, self.pid)
+            if messages is None:
+                flush_all()
+            elif messages:
+                apply(messages, remote=True)
+
+
+def start_listener():
+    """Start the listener of this process (once, after fork)"""
+    global _listener
+
+    if not settings.INVALIDATION_LISTENER:
+        return None
+    if _listener is not None and _listener.pid == os.getpid():
+        return _listener
+
+    _listener = Listener(
+        connection.settings_dict,
+        coalesce=settings.INVALIDATION_COALESCE_MS / 1000,
+    )
+    _listener.start()
+    return _listener
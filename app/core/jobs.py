@@ -0,0 +1,251 @@
+"""
+Background jobs stored in Postgres
+
+Jobs are rows of core.models.Job, workers (run_workers command)
+claim them with SELECT ... FOR UPDATE SKIP LOCKED, so any number
+of workers can poll the same table without a broker and without
+blocking each other.
+
+Register a function and enqueue it:
+
+    @register('core.reconcile_recipe_counts')
+    def reconcile(**payload):
+        ...
+
+    enqueue('core.reconcile_recipe_counts', priority=5)
+
+Enqueued inside a transaction, the job only exists if it commits.
+Jobs to run every so often are listed in settings.PERIODIC_JOBS,
+run_workers queues them.
+"""
+import datetime
+import logging
+import random
+import time
+import traceback
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.metrics import JOBS_PROCESSED, JOBS_READY, JOB_DURATION, JOB_LAG
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+# name -> (function, default options)
+_registry = {}
+
+# Advisory lock key of schedule_periodic()
+SCHEDULE_LOCK = 5_206_113
+
+
+def register(name, priority=0, max_attempts=5):
+    """Decorator registering a job function under name"""
+    def decorator(func):
+        _registry[name] = (func, {
+            'priority': priority, 'max_attempts': max_attempts,
+        })
+        return func
+    return decorator
+
+
+def registered():
+    """Names of registered jobs"""
+    return sorted(_registry)
+
+
+def enqueue(name, payload=None, priority=None, run_at=None, delay=None,
+            max_attempts=None):
+    """Queue a job, return the Job
+
+    payload: keyword arguments of the function (JSON serializable)
+    run_at/delay: run not before this time / seconds from now
+    """
+    if name not in _registry:
+        raise KeyError(f'No job registered as "{name}"')
+
+    defaults = _registry[name][1]
+    if run_at is None:
+        run_at = timezone.now()
+    if delay:
+        run_at += datetime.timedelta(seconds=delay)
+
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        priority=defaults['priority'] if priority is None else priority,
+        max_attempts=(defaults['max_attempts'] if max_attempts is None
+                      else max_attempts),
+        run_at=run_at,
+    )
+
+
+def backoff(attempts):
+    """Seconds before retry number attempts, exponential with jitter"""
+    delay = min(
+        settings.JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1),
+        settings.JOB_RETRY_MAX_DELAY,
+    )
+    # Jobs failing together don't all come back together
+    return delay * random.uniform(0.5, 1.0)
+
+
+def claim(worker_id):
+    """Lock the next ready job for worker_id, None if none is ready"""
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            Job.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_at__lte=now)
+            .order_by('-priority', 'run_at', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_at = now
+        job.locked_by = worker_id
+        job.save(update_fields=[
+            'status', 'attempts', 'locked_at', 'locked_by',
+        ])
+
+    JOB_LAG.labels(job.name).observe(
+        max((now - job.run_at).total_seconds(), 0)
+    )
+    return job
+
+
+def _finish(job, **fields):
+    """Save fields if job is still the claim of its worker
+
+    A job reclaimed as stale may be queued or running elsewhere
+    by now, its first worker must not overwrite that. Returns
+    False then.
+    """
+    updated = Job.objects.filter(
+        id=job.id, status=Job.RUNNING,
+        locked_by=job.locked_by, attempts=job.attempts,
+    ).update(**fields)
+
+    for field, value in fields.items():
+        setattr(job, field, value)
+    return updated == 1
+
+
+def _retry_or_fail(job, error):
+    """Queue job again later, or mark it failed when out of attempts"""
+    if job.attempts >= job.max_attempts:
+        fields = {'status': Job.FAILED, 'finished_at': timezone.now()}
+        outcome = 'failed'
+    else:
+        fields = {
+            'status': Job.QUEUED,
+            'run_at': timezone.now() + datetime.timedelta(
+                seconds=backoff(job.attempts),
+            ),
+        }
+        outcome = 'retry'
+
+    if not _finish(job, last_error=error, locked_at=None, **fields):
+        outcome = 'lost'
+    JOBS_PROCESSED.labels(job.name, outcome).inc()
+    return outcome
+
+
+def run(job):
+    """Run a claimed job and record the outcome"""
+    start = time.perf_counter()
+    try:
+        func = _registry[job.name][0]
+        func(**job.payload)
+    except Exception:
+        logger.exception('Job %s failed', job)
+        outcome = _retry_or_fail(job, traceback.format_exc())
+    else:
+        outcome = 'done'
+        if not _finish(job, status=Job.DONE, locked_at=None,
+                       finished_at=timezone.now()):
+            outcome = 'lost'
+        JOBS_PROCESSED.labels(job.name, outcome).inc()
+
+    if outcome == 'lost':
+        logger.warning('Job %s was reclaimed while %s ran it',
+                       job, job.locked_by)
+
+    JOB_DURATION.labels(job.name).observe(time.perf_counter() - start)
+    return outcome
+
+
+def heartbeat(worker_ids):
+    """Refresh the lock of jobs running on worker_ids
+
+    Called by run_workers while its workers are alive, so only
+    jobs of a dead worker get older than JOB_LOCK_TIMEOUT
+    """
+    return Job.objects.filter(
+        status=Job.RUNNING, locked_by__in=worker_ids,
+    ).update(locked_at=timezone.now())
+
+
+def reclaim_stale():
+    """Queue again jobs whose worker died while running them"""
+    cutoff = timezone.now() - datetime.timedelta(
+        seconds=settings.JOB_LOCK_TIMEOUT,
+    )
+    with transaction.atomic():
+        stale = list(
+            Job.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=Job.RUNNING, locked_at__lt=cutoff)
+        )
+        for job in stale:
+            _retry_or_fail(job, f'Lock of {job.locked_by} expired')
+
+    return len(stale)
+
+
+def schedule_periodic():
+    """Queue the jobs of settings.PERIODIC_JOBS that are due
+
+    One queued or running job per name at most, the next one runs
+    an interval after the last one. Upkeep of every run_workers
+    process calls this, a lock lets only one of them at a time.
+    """
+    now = timezone.now()
+    queued = []
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_xact_lock(%s)',
+                           [SCHEDULE_LOCK])
+            if not cursor.fetchone()[0]:
+                return queued
+
+        for name, interval in settings.PERIODIC_JOBS.items():
+            named = Job.objects.filter(name=name)
+            if named.filter(status__in=[Job.QUEUED, Job.RUNNING]).exists():
+                continue
+
+            last = named.order_by('-run_at').values_list(
+                'run_at', flat=True,
+            ).first()
+            run_at = now
+            if last is not None:
+                run_at = max(now, last + datetime.timedelta(
+                    seconds=interval,
+                ))
+            queued.append(enqueue(name, run_at=run_at))
+
+    return queued
+
+
+def ready_count():
+    """Queued jobs ready to run"""
+    count = Job.objects.filter(
+        status=Job.QUEUED, run_at__lte=timezone.now(),
+    ).count()
+    JOBS_READY.set(count)
+    return count
@@ -0,0 +1,333 @@
+"""
+Benchmark API endpoints against a seeded database
+"""
+import io
+import json
+import platform
+import statistics
+import tempfile
+import time
+
+from decimal import Decimal
+
+import django
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.metrics import QueryTimer
+from core.models import Recipe, Tag, Ingredient
+
+BENCH_EMAIL = 'benchmark@example.com'
+BENCH_PASSWORD = 'benchmarkpassword123'
+
+
+class Command(BaseCommand):
+    """Run API benchmark scenarios and compare with a baseline"""
+
+    help = (
+        'Drive the API routes in process against seeded data, report '
+        'throughput, latency percentiles and query counts as JSON.'
+    )
+
+    SCENARIOS = [
+        'recipe_list_filtered',
+        'recipe_detail',
+        'recipe_create_with_tags',
+        'recipe_upload_image',
+        'token_login',
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--recipes', type=int, default=500,
+            help='Number of recipes seeded for the benchmark user',
+        )
+        parser.add_argument(
+            '--scenario', action='append', choices=self.SCENARIOS,
+            help='Run only these scenarios (can be repeated)',
+        )
+        parser.add_argument('--output', default='benchmark-results.json')
+        parser.add_argument('--baseline', help='Results file to compare')
+        parser.add_argument(
+            '--max-regression', type=float, default=10.0,
+            help='Allowed regression against baseline in percent',
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Keep seeded and created rows instead of deleting them',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint"""
+        if options['iterations'] < 2:
+            raise CommandError('--iterations must be at least 2')
+
+        scenarios = options['scenario'] or self.SCENARIOS
+
+        # The test client uses 'testserver' as host, and uploaded
+        # images go to a throw away directory
+        media_root = tempfile.TemporaryDirectory()
+        overrides = override_settings(
+            ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver'],
+            MEDIA_ROOT=media_root.name,
+
+            # Measure the handlers, not the throttle
+            REST_FRAMEWORK={
+                **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {},
+            },
+        )
+
+        # Every request commits on its own as it would in
+        # production, so on_commit work (index updates, cache
+        # invalidation) is measured too. Rows of the run are
+        # deleted at the end, each run starts from the same data
+        with media_root, overrides:
+            fixtures = self._seed(options['recipes'])
+            try:
+                results = {
+                    name: self._run(
+                        getattr(self, f'_scenario_{name}'),
+                        fixtures,
+                        options['iterations'],
+                        options['warmup'],
+                    )
+                    for name in scenarios
+                }
+            finally:
+                if not options['keep']:
+                    self._cleanup(fixtures)
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'iterations': options['iterations'],
+            'recipes': options['recipes'],
+            'scenarios': results,
+        }
+
+        with open(options['output'], 'w') as file:
+            json.dump(report, file, indent=2)
+
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<26} {result["throughput_rps"]:>9.1f} req/s  '
+                f'p50 {result["latency_ms"]["p50"]:>8.2f}ms  '
+                f'p95 {result["latency_ms"]["p95"]:>8.2f}ms  '
+                f'p99 {result["latency_ms"]["p99"]:>8.2f}ms  '
+                f'{result["queries"]:>5.1f} queries'
+            )
+        self.stdout.write(f'Results written to {options["output"]}')
+
+        if options['baseline']:
+            self._compare(results, options['baseline'],
+                          options['max_regression'])
+
+    @transaction.atomic
+    def _seed(self, recipe_count):
+        """Create benchmark user with tags, ingredients and recipes"""
+        user = get_user_model().objects.filter(email=BENCH_EMAIL).first()
+        created_user = user is None
+        if created_user:
+            user = get_user_model().objects.create_user(
+                email=BENCH_EMAIL,
+                password=BENCH_PASSWORD,
+            )
+        token, _ = Token.objects.get_or_create(user=user)
+
+        # Rows of the user above these ids are from this run
+        first_ids = {
+            model: model.objects.aggregate(last=Max('id'))['last'] or 0
+            for model in (Recipe, Tag, Ingredient)
+        }
+
+        tags = Tag.objects.bulk_create(
+            Tag(user=user, name=f'Bench tag {i}') for i in range(20)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f'Bench ingredient {i}')
+            for i in range(50)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                user=user,
+                title=f'Bench recipe {i}',
+                description='Benchmark recipe',
+                minute_to_make_recipe=5 + i % 120,
+                price=Decimal(i % 50) + Decimal('0.99'),
+            )
+            for i in range(recipe_count)
+        )
+
+        # Every recipe gets a few tags and ingredients,
+        # picked deterministically so runs are comparable
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tags[(i + j) % 20])
+            for i, recipe in enumerate(recipes) for j in range(3)
+        )
+        Recipe.ingredients.through.objects.bulk_create(
+            Recipe.ingredients.through(
+                recipe=recipe, ingredient=ingredients[(i + j) % 50],
+            )
+            for i, recipe in enumerate(recipes) for j in range(5)
+        )
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        return {
+            'client': client,
+            'user': user,
+            'created_user': created_user,
+            'first_ids': first_ids,
+            'tags': tags,
+            'ingredients': ingredients,
+            'recipes': recipes,
+        }
+
+    def _cleanup(self, fixtures):
+        """Delete rows seeded and created by the run"""
+        user = fixtures['user']
+        if fixtures['created_user']:
+            # Cascades to everything the run made
+            user.delete()
+            return
+
+        # Recipes first, their links go with them
+        for model, first_id in fixtures['first_ids'].items():
+            model.objects.filter(user=user, id__gt=first_id).delete()
+
+    def _run(self, scenario, fixtures, iterations, warmup):
+        """Run one scenario and summarize its measurements"""
+        for i in range(warmup):
+            scenario(fixtures, i)
+
+        latencies = []
+        queries = []
+        started = time.perf_counter()
+
+        for i in range(iterations):
+            timer = QueryTimer()
+            start = time.perf_counter()
+            with connection.execute_wrapper(timer):
+                res = scenario(fixtures, warmup + i)
+            latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(timer.count)
+
+            if res.status_code >= 400:
+                raise CommandError(
+                    f'{scenario.__name__} returned {res.status_code}: '
+                    f'{res.content[:200]}'
+                )
+
+        elapsed = time.perf_counter() - started
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+
+        return {
+            'requests': iterations,
+            'throughput_rps': round(iterations / elapsed, 2),
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies), 3),
+                'p50': round(cuts[49], 3),
+                'p95': round(cuts[94], 3),
+                'p99': round(cuts[98], 3),
+            },
+            'queries': round(statistics.fmean(queries), 2),
+        }
+
+    def _compare(self, results, baseline_path, max_regression):
+        """Fail when a scenario regressed more than allowed"""
+        with open(baseline_path) as file:
+            baseline = json.load(file)['scenarios']
+
+        limit = 1 + max_regression / 100
+        regressions = []
+
+        for name, result in results.items():
+            base = baseline.get(name)
+            if base is None:
+                continue
+
+            checks = [
+                ('p95 latency', result['latency_ms']['p95'],
+                 base['latency_ms']['p95'] * limit),
+                ('queries', result['queries'], base['queries'] * limit),
+            ]
+            for label, value, allowed in checks:
+                if value > allowed:
+                    regressions.append(
+                        f'{name}: {label} {value} > allowed {allowed:.2f}'
+                    )
+
+            if result['throughput_rps'] < base['throughput_rps'] / limit:
+                regressions.append(
+                    f'{name}: throughput {result["throughput_rps"]} < '
+                    f'allowed {base["throughput_rps"] / limit:.2f}'
+                )
+
+        if regressions:
+            raise CommandError(
+                'Regressed against baseline:\n' + '\n'.join(regressions)
+            )
+
+        self.stdout.write(self.style.SUCCESS('No regression against baseline'))
+
+    # Scenarios, each one makes a single request
+    def _scenario_recipe_list_filtered(self, fixtures, i):
+        tags = fixtures['tags']
+        ingredients = fixtures['ingredients']
+        return fixtures['client'].get(reverse('recipe:recipe-list'), {
+            'tags': f'{tags[i % 20].id},{tags[(i + 7) % 20].id}',
+            'ingredients': f'{ingredients[i % 50].id}',
+        })
+
+    def _scenario_recipe_detail(self, fixtures, i):
+        recipes = fixtures['recipes']
+        recipe = recipes[i % len(recipes)]
+        return fixtures['client'].get(
+            reverse('recipe:recipe-detail', args=[recipe.id])
+        )
+
+    def _scenario_recipe_create_with_tags(self, fixtures, i):
+        return fixtures['client'].post(reverse('recipe:recipe-list'), {
+            'title': f'Created recipe {i}',
+            'description': 'Created by benchmark',
+            'minute_to_make_recipe': 10,
+            'price': '5.50',
+            'tags': [{'name': f'Bench tag {(i + j) % 25}'} for j in range(3)],
+            'ingredients': [{'name': 'Bench ingredient 1'}],
+        }, format='json')
+
+    def _scenario_recipe_upload_image(self, fixtures, i):
+        recipes = fixtures['recipes']
+        recipe = recipes[i % len(recipes)]
+
+        image = io.BytesIO()
+        Image.new('RGB', (64, 64)).save(image, format='JPEG')
+        image.name = 'bench.jpg'
+        image.seek(0)
+
+        return fixtures['client'].post(
+            reverse('recipe:recipe-upload-image', args=[recipe.id]),
+            {'image': image},
+            format='multipart',
+        )
+
+    def _scenario_token_login(self, fixtures, i):
+        return APIClient().post(reverse('user:token'), {
+            'email': BENCH_EMAIL,
+            'password': BENCH_PASSWORD,
+        })
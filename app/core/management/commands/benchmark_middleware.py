@@ -0,0 +1,132 @@
+"""
+Benchmark per request overhead of the full and the API-only stacks
+"""
+import importlib
+import io
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, transaction
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from core.warmup import _environ
+
+BENCH_EMAIL = 'benchmark-middleware@example.com'
+
+PROFILES = {
+    'full': 'app.settings',
+    'api': 'app.settings_api',
+}
+
+SCENARIOS = {
+    # Stops at authentication, no query: middlewares and DRF only
+    'anonymous': ('/api/recipe/recipes/', False),
+    # Token lookup plus one small row
+    'user_me': ('/api/user/me/', True),
+}
+
+
+class Command(BaseCommand):
+    """Time the same requests through both middleware stacks"""
+
+    help = (
+        'Run requests through a WSGI handler built with the middlewares '
+        'and URLconf of app.settings and of app.settings_api, report the '
+        'median time per request of each and the difference. Apps and '
+        'DRF renderers (bound to views at import) are not swapped in '
+        'process, run benchmark_startup with each settings module for '
+        'their cost.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument(
+            '--rounds', type=int, default=5,
+            help='Profiles take turns, so drift hits both the same',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint"""
+        if options['iterations'] < 1 or options['rounds'] < 1:
+            raise CommandError('--iterations and --rounds must be >= 1')
+
+        # Like the test client: the handler would close the connection
+        # of the transaction everything is rolled back with
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            timings = self._run(options)
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+
+        for scenario in SCENARIOS:
+            full = statistics.median(timings['full', scenario])
+            api = statistics.median(timings['api', scenario])
+            self.stdout.write(
+                f'{scenario:10} full {full:7.1f}us  api {api:7.1f}us  '
+                f'saved {full - api:6.1f}us ({(full - api) / full:.0%})'
+            )
+
+    def _run(self, options):
+        """{(profile, scenario): request timings}, data rolled back"""
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email=BENCH_EMAIL, password='benchmarkpassword123',
+            )
+            token = Token.objects.create(user=user)
+
+            timings = {
+                (profile, scenario): []
+                for profile in PROFILES for scenario in SCENARIOS
+            }
+            for _ in range(options['rounds']):
+                for profile, module in PROFILES.items():
+                    with self._profile(module):
+                        handler = WSGIHandler()
+                        for scenario, (path, auth) in SCENARIOS.items():
+                            timings[profile, scenario] += self._time(
+                                handler, path, auth and token.key,
+                                options['iterations'],
+                            )
+
+            transaction.set_rollback(True)
+
+        return timings
+
+    def _profile(self, module):
+        """Override what a handler is built from with a settings module"""
+        profile = importlib.import_module(module)
+        return override_settings(
+            MIDDLEWARE=profile.MIDDLEWARE,
+            ROOT_URLCONF=profile.ROOT_URLCONF,
+            ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['localhost'],
+            REST_FRAMEWORK={
+                **settings.REST_FRAMEWORK,
+                # Measure the stack, not the throttle
+                'DEFAULT_THROTTLE_RATES': {},
+            },
+        )
+
+    def _time(self, handler, path, token, iterations):
+        """Microseconds of each request"""
+        timings = []
+        for _ in range(iterations):
+            environ = _environ(path, 'localhost')
+            if token:
+                environ['HTTP_AUTHORIZATION'] = f'Token {token}'
+            environ['wsgi.errors'] = io.StringIO()
+
+            start = time.perf_counter()
+            response = handler(environ, lambda status, headers: None)
+            b''.join(response)
+            response.close()
+            timings.append((time.perf_counter() - start) * 1e6)
+
+        return timings
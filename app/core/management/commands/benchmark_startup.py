@@ -0,0 +1,97 @@
+"""
+Benchmark worker startup time and memory per startup mode
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+MODES = ['lazy', 'preload', 'warm']
+
+
+class Command(BaseCommand):
+    """Fork workers like uWSGI in each mode (core/warmup.py probe)"""
+
+    help = (
+        'Start a master and forked workers in a fresh process for each '
+        'mode (lazy apps, preloaded, preloaded + warm up + gc.freeze), '
+        'report time until a worker served its first requests and its '
+        'memory (PSS/USS split shared pages between the processes).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument(
+            '--requests', type=int, default=20,
+            help='Requests each worker serves before memory is read',
+        )
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--mode', action='append', choices=MODES)
+        parser.add_argument('--output', help='Write results as JSON')
+
+    def handle(self, *args, **options):
+        """Entrypoint"""
+        if options['workers'] < 1 or options['requests'] < 1:
+            raise CommandError('--workers and --requests must be >= 1')
+
+        results = {}
+        for mode in options['mode'] or MODES:
+            runs = [self._probe(mode, options)
+                    for _ in range(options['repeat'])]
+            results[mode] = self._summary(runs)
+            self._report(mode, results[mode])
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+    def _probe(self, mode, options):
+        """Run one master in a fresh interpreter, nothing is imported yet"""
+        process = subprocess.run(
+            [sys.executable, '-m', 'core.warmup', mode,
+             str(options['workers']), str(options['requests'])],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if process.returncode != 0:
+            raise CommandError(f'{mode} probe failed:\n{process.stderr}')
+
+        # Logs of the app (e.g slow requests) may come before
+        return json.loads(process.stdout.strip().splitlines()[-1])
+
+    def _summary(self, runs):
+        workers = [worker for run in runs for worker in run['workers']]
+
+        def median(key):
+            return statistics.median(worker[key] for worker in workers)
+
+        return {
+            'master_ms': statistics.median(run['master_ms'] for run in runs),
+            'ready_ms': median('ready_ms'),
+            'first_request_ms': median('first_request_ms'),
+            'request_ms': median('request_ms'),
+            # kB as read from /proc
+            'worker_rss_kb': median('rss'),
+            'worker_pss_kb': median('pss'),
+            'worker_uss_kb': median('uss'),
+            'total_pss_kb': statistics.median(
+                run['master']['pss'] + sum(
+                    worker['pss'] for worker in run['workers']
+                )
+                for run in runs
+            ),
+        }
+
+    def _report(self, mode, summary):
+        self.stdout.write(
+            f'{mode:8} master {summary["master_ms"]:7.1f}ms  '
+            f'worker ready {summary["ready_ms"]:7.1f}ms  '
+            f'first request {summary["first_request_ms"]:6.1f}ms  '
+            f'request {summary["request_ms"]:5.2f}ms  '
+            f'rss {summary["worker_rss_kb"] / 1024:5.1f}MB  '
+            f'pss {summary["worker_pss_kb"] / 1024:5.1f}MB  '
+            f'uss {summary["worker_uss_kb"] / 1024:5.1f}MB  '
+            f'total pss {summary["total_pss_kb"] / 1024:6.1f}MB'
+        )
@@ -0,0 +1,32 @@
+"""
+Generate the OpenAPI schema files served by /api/schema/
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import schema
+
+
+class Command(BaseCommand):
+    """Write the schema of the current code to SCHEMA_ROOT"""
+
+    help = (
+        'Generate the OpenAPI schema once for this version of the code, '
+        'skipped when the files of the same code already exist.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Generate even if the code did not change',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint"""
+        fingerprint = schema.fingerprint()
+        if schema.build(force=options['force']):
+            self.stdout.write(self.style.SUCCESS(
+                f'Schema {fingerprint} written to {settings.SCHEMA_ROOT}'
+            ))
+        else:
+            self.stdout.write(f'Schema {fingerprint} is up to date')
@@ -0,0 +1,116 @@
+"""
+Build the similar recipes index and measure its recall
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe, RecipeSignature
+from core.similarity import (
+    index_recipes,
+    jaccard,
+    recipe_tokens,
+    similar_recipes,
+)
+
+
+class Command(BaseCommand):
+    """(Re)compute MinHash signatures and LSH buckets of all recipes"""
+
+    help = (
+        'Index every recipe for the similar action (needed after '
+        'seed_data, COPY skips signals). With --recall, compare the '
+        'LSH top-k to the exact Jaccard top-k of sampled recipes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--skip-build', action='store_true',
+            help='Only measure recall of the existing index',
+        )
+        parser.add_argument(
+            '--recall', type=int, default=0,
+            help='Number of sampled query recipes (0: no measure)',
+        )
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        """Entrypoint"""
+        if not options['skip_build']:
+            self._build(options['batch_size'])
+        if options['recall']:
+            self._recall(options['recall'], options['k'], options['seed'])
+
+    def _build(self, batch_size):
+        start = time.perf_counter()
+        ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+        for index in range(0, len(ids), batch_size):
+            index_recipes(ids[index:index + batch_size])
+            self.stdout.write(f'{min(index + batch_size, len(ids))} indexed')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(ids)} recipes in '
+            f'{time.perf_counter() - start:.1f}s'
+        ))
+
+    def _recall(self, samples, k, seed):
+        indexed = list(
+            RecipeSignature.objects.values_list('recipe_id', flat=True)
+        )
+        queries = random.Random(seed).sample(
+            indexed, min(samples, len(indexed)),
+        )
+
+        recalls, lsh_ms, exact_ms = [], [], []
+        user_tokens = {}
+        for recipe in Recipe.objects.filter(id__in=queries):
+            start = time.perf_counter()
+            found = similar_recipes(recipe, k)
+            lsh_ms.append((time.perf_counter() - start) * 1000)
+
+            # Exact: Jaccard against every recipe of the user
+            start = time.perf_counter()
+            if recipe.user_id not in user_tokens:
+                user_tokens[recipe.user_id] = recipe_tokens(
+                    Recipe.objects.filter(
+                        user_id=recipe.user_id,
+                    ).values_list('id', flat=True)
+                )
+            tokens = user_tokens[recipe.user_id]
+            scores = {
+                other: jaccard(tokens[recipe.id], other_tokens)
+                for other, other_tokens in tokens.items()
+                if other != recipe.id
+            }
+            exact = sorted(
+                (score for score in scores.values() if score > 0),
+                reverse=True,
+            )[:k]
+            exact_ms.append((time.perf_counter() - start) * 1000)
+
+            if not exact:
+                continue
+
+            # Ties at the k-th score count as hits
+            hits = sum(
+                1 for other, _ in found if scores.get(other, 0) >= exact[-1]
+            )
+            recalls.append(min(hits, len(exact)) / len(exact))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'recall@{k}: {statistics.mean(recalls or [0]):.3f} over '
+            f'{len(recalls)} recipes, LSH query p50 '
+            f'{statistics.median(lsh_ms or [0]):.2f}ms p95 '
+            f'{_p95(lsh_ms):.2f}ms, exact p50 '
+            f'{statistics.median(exact_ms or [0]):.2f}ms'
+        ))
+
+
+def _p95(values):
+    if len(values) < 2:
+        return values[0] if values else 0
+    return statistics.quantiles(values, n=20)[-1]
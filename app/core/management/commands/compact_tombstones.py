@@ -0,0 +1,49 @@
+"""
+Delete tombstones older than the sync retention window
+"""
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from core.models import SyncWatermark, Tombstone
+
+
+class Command(BaseCommand):
+    """Compact tombstones and move the sync watermark"""
+
+    help = (
+        'Delete tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS. '
+        'Clients with an older cursor get 410 and sync from scratch.'
+    )
+
+    def handle(self, *args, **options):
+        """Entrypoint"""
+        cutoff = timezone.now() - datetime.timedelta(
+            days=settings.SYNC_TOMBSTONE_RETENTION_DAYS,
+        )
+        expired = Tombstone.objects.filter(deleted_at__lt=cutoff)
+
+        with transaction.atomic():
+            highest = expired.aggregate(seq=Max('sync_seq'))['seq']
+            if highest is None:
+                self.stdout.write('No tombstones to compact')
+                return
+
+            # Watermark first, a client can't sync past
+            # deletes that are no longer there
+            watermark, _ = SyncWatermark.objects.select_for_update(
+            ).get_or_create(pk=1)
+            watermark.compacted_seq = max(watermark.compacted_seq, highest)
+            watermark.save()
+
+            deleted, _ = Tombstone.objects.filter(
+                sync_seq__lte=highest,
+            ).delete()
+
+        self.stdout.write(
+            f'{deleted} tombstones deleted, watermark {highest}'
+        )
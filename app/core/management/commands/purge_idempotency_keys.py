@@ -0,0 +1,26 @@
+"""
+Delete expired Idempotency-Key responses
+"""
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    """Delete stored responses older than IDEMPOTENCY_KEY_TTL"""
+
+    help = 'Delete Idempotency-Key rows that can not be replayed anymore.'
+
+    def handle(self, *args, **options):
+        """Entrypoint"""
+        cutoff = timezone.now() - datetime.timedelta(
+            seconds=settings.IDEMPOTENCY_KEY_TTL,
+        )
+        deleted, _ = IdempotencyKey.objects.filter(
+            created_at__lt=cutoff,
+        ).delete()
+        self.stdout.write(f'{deleted} expired keys deleted')
@@ -0,0 +1,20 @@
+"""
+Fix drift of denormalized recipe counters
+"""
+from django.core.management.base import BaseCommand
+
+from core.counters import counted_relations, reconcile_recipe_counts
+
+
+class Command(BaseCommand):
+    """Recount recipes of every tag and ingredient"""
+
+    help = 'Set recipe_count of tags and ingredients to the real value.'
+
+    def handle(self, *args, **options):
+        """Entrypoint"""
+        for model, _, _ in counted_relations():
+            fixed = reconcile_recipe_counts(model)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {fixed} fixed'
+            )
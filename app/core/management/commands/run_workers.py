@@ -0,0 +1,151 @@
+"""
+Run background jobs (core/jobs.py)
+"""
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from prometheus_client import start_http_server
+
+from core import jobs
+from core.metrics import get_registry
+
+
+class Command(BaseCommand):
+    """Pool of worker threads (in one or more processes) running jobs"""
+
+    help = (
+        'Claim and run queued jobs until stopped (SIGTERM/SIGINT). '
+        'Threads suit jobs waiting on I/O, processes CPU bound ones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=settings.JOB_WORKER_THREADS,
+            help='Worker threads per process',
+        )
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once no job is ready instead of waiting for more',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.JOB_POLL_INTERVAL,
+            help='Seconds an idle worker waits before looking again',
+        )
+        parser.add_argument(
+            '--metrics-port', type=int,
+            help='Serve Prometheus metrics on this port (with several '
+                 'processes set PROMETHEUS_MULTIPROC_DIR)',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint"""
+        if options['threads'] < 1 or options['processes'] < 1:
+            raise CommandError('--threads and --processes must be >= 1')
+
+        if options['metrics_port']:
+            start_http_server(options['metrics_port'],
+                              registry=get_registry())
+
+        self.stdout.write(
+            f'Running jobs with {options["processes"]} process(es) x '
+            f'{options["threads"]} thread(s): {", ".join(jobs.registered())}'
+        )
+
+        if options['processes'] == 1:
+            self._run_process(threading.Event(), options)
+            return
+
+        # Forked children must not share the parent's connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        stop = context.Event()
+        processes = [
+            context.Process(target=self._run_process, args=(stop, options))
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+
+        previous = self._handle_signals(stop)
+        try:
+            for process in processes:
+                process.join()
+        finally:
+            self._restore_signals(previous)
+
+    def _handle_signals(self, stop):
+        """Stop on SIGTERM/SIGINT, running jobs are finished first"""
+        previous = {}
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            previous[signum] = signal.signal(
+                signum, lambda *args: stop.set(),
+            )
+        return previous
+
+    def _restore_signals(self, previous):
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+    def _run_process(self, stop, options):
+        """Worker threads of this process, plus upkeep in this thread"""
+        previous = self._handle_signals(stop)
+        prefix = f'{socket.gethostname()}:{os.getpid()}'
+        # Thread name is the worker id, locked_by of its jobs
+        workers = [
+            threading.Thread(
+                target=self._work,
+                args=(f'{prefix}:{index}', stop, options),
+                name=f'{prefix}:{index}',
+            )
+            for index in range(options['threads'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            # Keep locks of running jobs fresh, requeue jobs of dead
+            # workers, queue periodic jobs (not when only draining
+            # the queue) and publish the queue depth, waking up
+            # early when workers are done (stop or burst)
+            while True:
+                jobs.heartbeat([
+                    worker.name for worker in workers if worker.is_alive()
+                ])
+                jobs.reclaim_stale()
+                if not options['burst']:
+                    jobs.schedule_periodic()
+                jobs.ready_count()
+                alive = [worker for worker in workers if worker.is_alive()]
+                if not alive:
+                    break
+                alive[0].join(options['poll_interval'] * 10)
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+            connection.close()
+            self._restore_signals(previous)
+
+    def _work(self, worker_id, stop, options):
+        """Claim and run jobs until stopped"""
+        try:
+            while not stop.is_set():
+                job = jobs.claim(worker_id)
+                if job is None:
+                    if options['burst']:
+                        return
+                    stop.wait(options['poll_interval'])
+                    continue
+
+                jobs.run(job)
+        finally:
+            # Connections are per thread
+            connection.close()
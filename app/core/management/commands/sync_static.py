@@ -0,0 +1,59 @@
+"""
+Collect static files only when they changed
+"""
+import os
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from core.storage import FINGERPRINT_NAME, sources_fingerprint
+
+
+class Command(BaseCommand):
+    """Run collectstatic unless STATIC_ROOT has these files already"""
+
+    help = (
+        'Collect, hash and compress static files (core/storage.py), '
+        'skipped when the sources are the ones last collected.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Collect even if the sources did not change',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint"""
+        root = Path(settings.STATIC_ROOT)
+        stamp = root / FINGERPRINT_NAME
+        fingerprint = sources_fingerprint()
+
+        # The manifest is written last by collectstatic, both
+        # files exist only if the previous run completed
+        manifest = root / 'staticfiles.json'
+        current = (
+            stamp.exists() and manifest.exists()
+            and stamp.read_text() == fingerprint
+        )
+        if current and not options['force']:
+            self.stdout.write(f'Static files {fingerprint[:16]} up to date')
+            return
+
+        call_command(
+            'collectstatic', interactive=False,
+            verbosity=options['verbosity'] - 1, stdout=self.stdout,
+        )
+
+        # Written atomically after collecting, an interrupted
+        # run collects again on the next start
+        tmp = stamp.with_name(f'{stamp.name}.{os.getpid()}')
+        tmp.write_text(fingerprint)
+        os.replace(tmp, stamp)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Static files {fingerprint[:16]} collected to {root}'
+        ))
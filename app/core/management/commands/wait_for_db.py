@@ -1,28 +1,75 @@
+import random
 import time
 
 from psycopg2 import OperationalError as Psycopg2Error
 
 # Error Django throw when database not ready
+from django.db import connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
     """command to wait for DB"""
 
+    help = (
+        'Wait until the database accepts connections, retrying with '
+        'exponential backoff and jitter, fail after --timeout seconds.'
+    )
+
+    # Nothing to check before the database is up,
+    # migrate runs the system checks right after
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeout', type=float, default=120,
+            help='Seconds before giving up (0: wait forever)',
+        )
+        parser.add_argument(
+            '--initial-delay', type=float, default=0.05,
+            help='Seconds before the second attempt, doubled each time',
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=2,
+            help='Longest wait between attempts',
+        )
+
+    def probe(self):
+        """Open a connection to the database, nothing else"""
+        connections['default'].ensure_connection()
+
     def handle(self, *args, **options):
         """Entrypoint"""
         self.stdout.write('Waiting for database')
-        db_up = False
-        while db_up is False:
+        start = time.monotonic()
+        delay = options['initial_delay']
+        attempts = 0
+        while True:
+            attempts += 1
             try:
-                self.check(databases=['default'])
-                # if exception is raise, its not
-                # run the rest of code in try block
-                # base on self.check
-                db_up = True
+                self.probe()
+                break
             except (Psycopg2Error, OperationalError):
-                self.stdout.write('Database unavailable...')
-                time.sleep(1)
+                pass
+
+            # Between half and all of the delay, so containers
+            # started together don't all retry at once
+            wait = random.uniform(delay / 2, delay)
+            elapsed = time.monotonic() - start
+            if options['timeout'] and elapsed + wait > options['timeout']:
+                raise CommandError(
+                    f'Database unavailable after {attempts} attempts '
+                    f'({elapsed:.1f}s)'
+                )
+
+            self.stdout.write(
+                f'Database unavailable, retrying in {wait:.2f}s...'
+            )
+            time.sleep(wait)
+            delay = min(delay * 2, options['max_delay'])
 
-        self.stdout.write(self.style.SUCCESS('Database available!!!!!!!'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Database available after {attempts} attempts '
+            f'({time.monotonic() - start:.2f}s)'
+        ))
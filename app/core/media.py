@@ -0,0 +1,66 @@
+"""
+Uploaded files sent only to who may see them
+
+Media files are not public (proxy/default.conf.tpl makes MEDIA_URL
+an internal location): a view checks access, then answers with an
+X-Accel-Redirect header to the file URL and an empty body. nginx
+sends the file itself, with its own ETag/Last-Modified, conditional
+requests and Range support, so no worker is busy streaming bytes.
+"""
+import hashlib
+import mimetypes
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.static import serve
+
+from rest_framework.negotiation import DefaultContentNegotiation
+
+# Cached a year when asked with the current version (?v=)
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class FileContentNegotiation(DefaultContentNegotiation):
+    """Accept headers like image/* are fine, the body is a file
+
+    DRF would answer 406 as none of its renderers makes images,
+    errors still use the first renderer (JSON)
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
+
+
+def file_version(field_file):
+    """Short hash of the stored name, a new upload gets a new name"""
+    return hashlib.sha256(field_file.name.encode()).hexdigest()[:12]
+
+
+def file_response(request, field_file):
+    """Response sending field_file, access was checked by the caller"""
+    if settings.DEBUG:
+        # No nginx in front of runserver
+        response = serve(
+            request, field_file.name, document_root=settings.MEDIA_ROOT,
+        )
+    else:
+        content_type, _ = mimetypes.guess_type(field_file.name)
+        response = HttpResponse(
+            content_type=content_type or 'application/octet-stream',
+        )
+        response['X-Accel-Redirect'] = field_file.url
+
+    # Files of a version never change, older versions may
+    # have been replaced so they are checked every time
+    if request.GET.get('v') == file_version(field_file):
+        patch_cache_control(
+            response, private=True, max_age=IMMUTABLE_MAX_AGE,
+            immutable=True,
+        )
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+
+    # Private to the user of the token
+    patch_vary_headers(response, ['Authorization'])
+    return response
@@ -0,0 +1,149 @@
+"""
+Prometheus metrics for the API
+"""
+import atexit
+import os
+import time
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    multiprocess,
+)
+
+# uWSGI runs several worker processes, each with its own memory,
+# so every worker would only see its own numbers. When
+# PROMETHEUS_MULTIPROC_DIR is set, prometheus_client writes the
+# values to mmap'd files in that directory and the collector
+# below sums them up across all workers on scrape
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+# Label used when the request did not match any url pattern,
+# we dont label by raw path so random 404 urls can't
+# blow up the number of time series
+UNRESOLVED_ROUTE = '<unresolved>'
+
+REQUEST_LATENCY = Histogram(
+    'django_http_request_duration_seconds',
+    'Request latency by route',
+    ['route', 'method'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10),
+)
+
+RESPONSES = Counter(
+    'django_http_responses_total',
+    'Responses by route and status code',
+    ['route', 'method', 'status'],
+)
+
+DB_QUERIES = Histogram(
+    'django_http_db_queries',
+    'Number of database queries per request',
+    ['route', 'method'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200),
+)
+
+DB_QUERY_DURATION = Histogram(
+    'django_http_db_query_duration_seconds',
+    'Time spent in database queries per request',
+    ['route', 'method'],
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5),
+)
+
+RESPONSE_SIZE = Histogram(
+    'django_http_response_size_bytes',
+    'Response body size by route',
+    ['route', 'method'],
+    buckets=(100, 1000, 10000, 100000, 1000000, 10000000),
+)
+
+# livesum: only count processes that are still alive,
+# a worker recycled by uWSGI must not keep its requests
+# in flight forever
+REQUESTS_IN_FLIGHT = Gauge(
+    'django_http_requests_in_flight',
+    'Requests currently being processed',
+    ['route'],
+    multiprocess_mode='livesum',
+)
+
+# Background jobs (core/jobs.py), outcome is done, retry or failed
+JOBS_PROCESSED = Counter(
+    'jobs_processed_total',
+    'Jobs run by workers by outcome',
+    ['name', 'outcome'],
+)
+
+JOB_DURATION = Histogram(
+    'job_duration_seconds',
+    'Time to run a job',
+    ['name'],
+    buckets=(.01, .05, .1, .5, 1, 5, 10, 30, 60, 300),
+)
+
+# Delay between run_at and the job being picked up
+JOB_LAG = Histogram(
+    'job_start_lag_seconds',
+    'Time a ready job waited for a worker',
+    ['name'],
+    buckets=(.1, .5, 1, 5, 10, 30, 60, 300, 900),
+)
+
+JOBS_READY = Gauge(
+    'jobs_ready',
+    'Queued jobs ready to run, as last seen by a worker',
+    multiprocess_mode='max',
+)
+
+
+def get_registry():
+    """Return registry to collect metrics from"""
+
+    if not MULTIPROCESS:
+        return REGISTRY
+
+    # Build a fresh registry on every scrape, the
+    # collector reads all worker files each time
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+class QueryTimer:
+    """Database execute wrapper counting and timing queries"""
+
+    # Upper bound of statements kept when capturing,
+    # a request running thousands of queries must not
+    # keep all of them in memory
+    MAX_CAPTURED = 200
+
+    def __init__(self, capture=False):
+        self.count = 0
+        self.duration = 0.0
+        self.capture = capture
+        self.queries = []
+
+    # Signature required by connection.execute_wrapper
+    # https://docs.djangoproject.com/en/4.1/topics/db/instrumentation/
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if self.capture and len(self.queries) < self.MAX_CAPTURED:
+                self.queries.append((sql, params, many, duration))
+
+
+def _mark_process_dead():
+    """Remove live gauge files of the exiting worker"""
+    multiprocess.mark_process_dead(os.getpid())
+
+
+if MULTIPROCESS:
+    atexit.register(_mark_process_dead)
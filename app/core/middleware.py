@@ -0,0 +1,273 @@
+"""
+Custom middleware
+"""
+import itertools
+import json
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.http import HttpResponse
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import APIException
+
+from core import metrics, profiling, views
+from core.models import RequestProfile
+from core.timing import RequestTimings
+
+slow_request_logger = logging.getLogger('core.slow_requests')
+
+
+class HealthCheckMiddleware:
+    """Answer /healthz and /readyz before any other middleware
+
+    Probes come with the pod/container address as host, which
+    ALLOWED_HOSTS rejects, and would only add noise to metrics
+    """
+
+    PATHS = {
+        '/healthz': views.healthz,
+        '/readyz': views.readyz,
+    }
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        view = self.PATHS.get(request.path_info)
+        if view is not None:
+            return view(request)
+        return self.get_response(request)
+
+
+class MetricsMiddleware:
+    """Record latency, queries, size and in flight requests per route"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        timer = metrics.QueryTimer()
+
+        # Every query run by the rest of the stack
+        # goes through the timer while the block is open
+        with connection.execute_wrapper(timer):
+            try:
+                response = self.get_response(request)
+            finally:
+                route = getattr(request, '_metrics_route', None)
+                if route is not None:
+                    metrics.REQUESTS_IN_FLIGHT.labels(route).dec()
+
+        duration = time.perf_counter() - start
+        route = route or metrics.UNRESOLVED_ROUTE
+        method = request.method
+
+        metrics.REQUEST_LATENCY.labels(route, method).observe(duration)
+        metrics.RESPONSES.labels(route, method, response.status_code).inc()
+        metrics.DB_QUERIES.labels(route, method).observe(timer.count)
+        metrics.DB_QUERY_DURATION.labels(route, method).observe(
+            timer.duration
+        )
+
+        # Streaming responses has no content to measure
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.labels(route, method).observe(
+                len(response.content)
+            )
+
+        return response
+
+    # Called after url resolution, so the route name
+    # is known here (e.g recipe:recipe-list)
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route = request.resolver_match.view_name
+        request._metrics_route = route
+        metrics.REQUESTS_IN_FLIGHT.labels(route).inc()
+
+
+class ServerTimingMiddleware:
+    """Add Server-Timing header and log slow requests with their SQL"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        timer = metrics.QueryTimer(capture=True)
+        timings = RequestTimings(timer)
+
+        # Views reach timings through the request
+        # (see core.timing.ServerTimingMixin)
+        request._server_timing = timings
+
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+
+        total = time.perf_counter() - start
+        response['Server-Timing'] = timings.header(total)
+
+        resolver_match = request.resolver_match
+        route = resolver_match.view_name if resolver_match else None
+        if (total * 1000 >= settings.SLOW_REQUEST_THRESHOLD_MS
+                and route not in settings.SLOW_REQUEST_SKIP_ROUTES):
+            self._log_slow_request(request, response, timings, total)
+
+        return response
+
+    # Only called for responses rendered later (e.g DRF Response),
+    # time from here until rendering is done is the render phase
+    def process_template_response(self, request, response):
+        timings = request._server_timing
+        timings.start('render')
+
+        def stop_render(rendered):
+            timings.stop('render')
+
+        response.add_post_render_callback(stop_render)
+        return response
+
+    def _log_slow_request(self, request, response, timings, total):
+        """Write structured entry with the captured queries"""
+        queries = timings.query_timer.queries
+        resolver_match = request.resolver_match
+
+        entry = {
+            'method': request.method,
+            'path': request.path,
+            'route': resolver_match.view_name if resolver_match else None,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 2),
+            'phases_ms': {
+                name: round(seconds * 1000, 2)
+                for name, seconds in timings.phases.items()
+            },
+            'query_count': timings.query_timer.count,
+            'queries': [
+                {'sql': sql, 'duration_ms': round(duration * 1000, 2)}
+                for sql, _, _, duration in queries
+            ],
+        }
+
+        if queries:
+            slowest = max(queries, key=lambda query: query[3])
+            entry['slowest_query_plan'] = self._explain(slowest)
+
+        slow_request_logger.warning(json.dumps(entry, default=str))
+
+    def _explain(self, query):
+        """Return generic plan of a captured query, without its values
+
+        Bound values (emails, password hashes) must not end up in
+        the log, so the SQL template is explained with $n
+        parameters. GENERIC_PLAN needs PostgreSQL 16, older
+        servers get no plan.
+        """
+        sql, _, many, _ = query
+
+        # Only plain reads can be explained safely, EXPLAIN
+        # without ANALYZE does not execute the statement
+        if many or not sql.lstrip().upper().startswith('SELECT'):
+            return None
+        if (connection.vendor != 'postgresql'
+                or connection.pg_version < 160000):
+            return None
+
+        # %s -> $1, $2..., %% -> %
+        numbers = itertools.count(1)
+        template = re.sub(
+            r'%([s%])',
+            lambda match: (f'${next(numbers)}' if match.group(1) == 's'
+                           else '%'),
+            sql,
+        )
+
+        try:
+            # Savepoint so a failing EXPLAIN does not
+            # break a transaction still open
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (GENERIC_PLAN) {template}')
+                return [row[0] for row in cursor.fetchall()]
+        except DatabaseError as error:
+            return f'EXPLAIN failed: {error}'
+
+
+class ProfilerMiddleware:
+    """Profile a request on demand for staff users
+
+    Triggered by '?profile=<mode>' or 'X-Profile: <mode>' header,
+    mode is one of core.profiling.MODES
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Cheap checks first, requests without the flag
+        # dont parse the query string or touch the db
+        mode = request.META.get('HTTP_X_PROFILE')
+        if mode is None and 'profile=' in request.META.get(
+            'QUERY_STRING', ''
+        ):
+            mode = request.GET.get('profile')
+
+        if mode == '1':
+            mode = 'cprofile'
+
+        if mode not in profiling.MODES:
+            return self.get_response(request)
+
+        user = self._get_staff_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        response, data, extension = profiling.profile_call(
+            'cprofile' if mode == 'cprofile' else 'sample',
+            self.get_response,
+            request,
+        )
+        duration_ms = profiling.elapsed_ms(start)
+
+        file_name = profiling.save_profile(data, extension)
+        RequestProfile.objects.create(
+            user=user,
+            method=request.method,
+            path=request.path[:255],
+            mode=mode,
+            status_code=response.status_code,
+            duration_ms=duration_ms,
+            file_name=file_name,
+        )
+
+        if mode == 'flamegraph':
+            response = HttpResponse(data, content_type='text/plain')
+            response['Content-Disposition'] = (
+                f'attachment; filename="{file_name}"'
+            )
+
+        response['X-Profile'] = file_name
+        return response
+
+    def _get_staff_user(self, request):
+        """Return staff user of the request or None"""
+
+        # Session user (admin pages), API requests
+        # send a token instead
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return user
+
+        try:
+            result = TokenAuthentication().authenticate(request)
+        except APIException:
+            return None
+
+        if result is not None and result[0].is_staff:
+            return result[0]
+
+        return None
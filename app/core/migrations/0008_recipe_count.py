@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_requestprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count'], name='core_ingred_user_id_de1121_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count'], name='core_tag_user_id_699afc_idx'),
+        ),
+        # Fill counters of existing rows
+        migrations.RunSQL(
+            sql=[
+                'UPDATE core_tag SET recipe_count = ('
+                'SELECT COUNT(*) FROM core_recipe_tags '
+                'WHERE core_recipe_tags.tag_id = core_tag.id)',
+                'UPDATE core_ingredient SET recipe_count = ('
+                'SELECT COUNT(*) FROM core_recipe_ingredients '
+                'WHERE core_recipe_ingredients.ingredient_id = '
+                'core_ingredient.id)',
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
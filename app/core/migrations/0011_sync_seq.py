@@ -0,0 +1,113 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:25
+
+import core.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Advisory lock key shared by writers and readers of sync_seq
+SYNC_LOCK = 7_365_979
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_idempotencykey'),
+    ]
+
+    operations = [
+        # Writers take the lock shared until they commit, the
+        # horizon takes it exclusive, so every value it returns
+        # belongs to a committed (or rolled back) transaction
+        migrations.RunSQL(
+            sql=[
+                'CREATE SEQUENCE core_sync_seq',
+                f"""
+                CREATE FUNCTION core_next_sync_seq() RETURNS bigint
+                LANGUAGE plpgsql VOLATILE AS $$
+                BEGIN
+                    PERFORM pg_advisory_xact_lock_shared({SYNC_LOCK});
+                    RETURN nextval('core_sync_seq');
+                END
+                $$
+                """,
+                f"""
+                CREATE FUNCTION core_sync_horizon() RETURNS bigint
+                LANGUAGE plpgsql VOLATILE AS $$
+                DECLARE
+                    horizon bigint;
+                BEGIN
+                    PERFORM pg_advisory_lock({SYNC_LOCK});
+                    SELECT CASE WHEN is_called THEN last_value ELSE 0 END
+                        INTO horizon FROM core_sync_seq;
+                    PERFORM pg_advisory_unlock({SYNC_LOCK});
+                    RETURN horizon;
+                END
+                $$
+                """,
+            ],
+            reverse_sql=[
+                'DROP FUNCTION core_sync_horizon()',
+                'DROP FUNCTION core_next_sync_seq()',
+                'DROP SEQUENCE core_sync_seq',
+            ],
+        ),
+        migrations.CreateModel(
+            name='SyncWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('compacted_seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('recipe', 'Recipe'), ('tag', 'Tag'), ('ingredient', 'Ingredient')], max_length=20)),
+                ('object_id', models.IntegerField()),
+                ('sync_seq', models.BigIntegerField(db_default=core.models.NextSyncSeq())),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='ingredient',
+            name='sync_seq',
+            field=models.BigIntegerField(db_default=core.models.NextSyncSeq(), editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='sync_seq',
+            field=models.BigIntegerField(db_default=core.models.NextSyncSeq(), editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='sync_seq',
+            field=models.BigIntegerField(db_default=core.models.NextSyncSeq(), editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'sync_seq'], name='core_ingred_user_id_293b53_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'sync_seq'], name='recipe_user_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'sync_seq'], name='core_tag_user_id_017cab_idx'),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['user', 'sync_seq'], name='core_tombst_user_id_16a008_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted_at'], name='core_tombst_deleted_51085d_idx'),
+        ),
+    ]
@@ -0,0 +1,130 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:02
+
+from django.db import migrations, models
+
+
+# Same key as 0011, second key is the user (fits an int)
+SYNC_LOCK = 7_365_979
+USER_KEY = '(user_id % 2147483648)::int'
+
+SYNCED_TABLES = ['core_recipe', 'core_tag', 'core_ingredient', 'core_tombstone']
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_deletion_operation'),
+    ]
+
+    operations = [
+        # One lock per user instead of one for everything: a
+        # sync only waits for writers of its own user, and a
+        # long sync doesn't stall the writes of everyone else
+        migrations.RunSQL(
+            sql=[
+                f"""
+                CREATE FUNCTION core_next_sync_seq(user_id bigint)
+                RETURNS bigint LANGUAGE plpgsql VOLATILE AS $$
+                BEGIN
+                    PERFORM pg_advisory_xact_lock_shared(
+                        {SYNC_LOCK}, {USER_KEY}
+                    );
+                    RETURN nextval('core_sync_seq');
+                END
+                $$
+                """,
+                f"""
+                CREATE FUNCTION core_sync_horizon(user_id bigint)
+                RETURNS bigint LANGUAGE plpgsql VOLATILE AS $$
+                DECLARE
+                    horizon bigint;
+                BEGIN
+                    PERFORM pg_advisory_lock({SYNC_LOCK}, {USER_KEY});
+                    SELECT CASE WHEN is_called THEN last_value ELSE 0 END
+                        INTO horizon FROM core_sync_seq;
+                    PERFORM pg_advisory_unlock({SYNC_LOCK}, {USER_KEY});
+                    RETURN horizon;
+                END
+                $$
+                """,
+                # A column default can't read user_id, inserts
+                # get their value from a trigger instead
+                """
+                CREATE FUNCTION core_set_sync_seq() RETURNS trigger
+                LANGUAGE plpgsql AS $$
+                BEGIN
+                    NEW.sync_seq := core_next_sync_seq(NEW.user_id);
+                    RETURN NEW;
+                END
+                $$
+                """,
+                *(
+                    f'CREATE TRIGGER {table}_sync_seq BEFORE INSERT ON '
+                    f'{table} FOR EACH ROW EXECUTE FUNCTION '
+                    'core_set_sync_seq()'
+                    for table in SYNCED_TABLES
+                ),
+            ],
+            reverse_sql=[
+                *(
+                    f'DROP TRIGGER {table}_sync_seq ON {table}'
+                    for table in SYNCED_TABLES
+                ),
+                'DROP FUNCTION core_set_sync_seq()',
+                'DROP FUNCTION core_sync_horizon(bigint)',
+                'DROP FUNCTION core_next_sync_seq(bigint)',
+            ],
+        ),
+        migrations.AlterField(
+            model_name='ingredient',
+            name='sync_seq',
+            field=models.BigIntegerField(db_default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='sync_seq',
+            field=models.BigIntegerField(db_default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='sync_seq',
+            field=models.BigIntegerField(db_default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='tombstone',
+            name='sync_seq',
+            field=models.BigIntegerField(db_default=0),
+        ),
+        # Nothing uses the global lock anymore
+        migrations.RunSQL(
+            sql=[
+                'DROP FUNCTION core_sync_horizon()',
+                'DROP FUNCTION core_next_sync_seq()',
+            ],
+            reverse_sql=[
+                f"""
+                CREATE FUNCTION core_next_sync_seq() RETURNS bigint
+                LANGUAGE plpgsql VOLATILE AS $$
+                BEGIN
+                    PERFORM pg_advisory_xact_lock_shared({SYNC_LOCK});
+                    RETURN nextval('core_sync_seq');
+                END
+                $$
+                """,
+                f"""
+                CREATE FUNCTION core_sync_horizon() RETURNS bigint
+                LANGUAGE plpgsql VOLATILE AS $$
+                DECLARE
+                    horizon bigint;
+                BEGIN
+                    PERFORM pg_advisory_lock({SYNC_LOCK});
+                    SELECT CASE WHEN is_called THEN last_value ELSE 0 END
+                        INTO horizon FROM core_sync_seq;
+                    PERFORM pg_advisory_unlock({SYNC_LOCK});
+                    RETURN horizon;
+                END
+                $$
+                """,
+            ],
+        ),
+    ]
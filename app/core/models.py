@@ -10,6 +10,10 @@ from django.contrib.auth.models import (
 )
 
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.postgres.indexes import OpClass
+from django.db.models.functions import Upper
+from django.utils import timezone
 
 
 # Function recipe_image_file_path to generate
@@ -109,9 +113,78 @@ class User(AbstractBaseUser, PermissionsMixin):
     # Deffine field for authen later
     USERNAME_FIELD = 'email'
 
+    class Meta:
+        indexes = [
+            # Admin prefix search ('^email' is UPPER(email) LIKE 'X%')
+            models.Index(
+                OpClass(Upper('email'), name='text_pattern_ops'),
+                name='user_email_upper_idx',
+            ),
+        ]
+
+
+@models.IntegerField.register_lookup
+class AnyOf(models.Lookup):
+    """id__any_of=[...], bound as one array instead of IN (%s, ...)
+
+    For the long id lists of the bitmap index (core/bitmaps.py):
+    the statement stays small and is parsed the same for any
+    number of ids
+    """
+    lookup_name = 'any_of'
+    prepare_rhs = False
+
+    def get_db_prep_lookup(self, value, connection):
+        return '%s', ['{' + ','.join(str(int(id)) for id in value) + '}']
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} = ANY({rhs}::bigint[])', (*lhs_params, *rhs_params)
+
 
 # Use model base class for recipe
-class Recipe(models.Model):
+class NextSyncSeq(models.Func):
+    """Next value of the sync sequence (SQL function in migration 0016)
+
+    Takes the owner column, e.g. NextSyncSeq('user_id'): writers of
+    a user share a lock with core_sync_horizon() of that user only,
+    see recipe/sync.py
+    """
+    function = 'core_next_sync_seq'
+    output_field = models.BigIntegerField()
+
+
+class SyncTracked(models.Model):
+    """Model whose rows get a new sync_seq on every insert/save
+
+    sync_seq grows across all synced tables, clients ask for
+    the rows changed after the last value they have seen.
+    Inserts get it from a trigger (migration 0016), a column
+    default can't read user_id.
+    """
+    sync_seq = models.BigIntegerField(db_default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        # Insert gets its value from the trigger
+        if not self._state.adding:
+            self.sync_seq = NextSyncSeq('user_id')
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'sync_seq'}
+
+        super().save(*args, **kwargs)
+
+        # Value is only known by the database, drop the
+        # expression so it's loaded again if ever read
+        if isinstance(self.__dict__.get('sync_seq'), NextSyncSeq):
+            del self.__dict__['sync_seq']
+
+
+class Recipe(SyncTracked):
     """Recipe model"""
 
     # Foreign key is User (better is id)
@@ -136,12 +209,43 @@ class Recipe(models.Model):
     # base on the in4 passed in to recipe when upload
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
 
+    # One index per list ordering (recipe/views.py), id as
+    # tiebreak so keyset pagination seeks straight to a page
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'id'],
+                name='recipe_user_id_idx',
+            ),
+            models.Index(
+                fields=['user', 'price', 'id'],
+                name='recipe_user_price_idx',
+            ),
+            models.Index(
+                fields=['user', 'minute_to_make_recipe', 'id'],
+                name='recipe_user_minutes_idx',
+            ),
+            models.Index(
+                fields=['user', 'title', 'id'],
+                name='recipe_user_title_idx',
+            ),
+            models.Index(
+                fields=['user', 'sync_seq'],
+                name='recipe_user_sync_idx',
+            ),
+            # Admin prefix search ('^title' is UPPER(title) LIKE 'X%')
+            models.Index(
+                OpClass(Upper('title'), name='text_pattern_ops'),
+                name='recipe_title_upper_idx',
+            ),
+        ]
+
     # To string method to return title
     def __str__(self):
         return self.title
 
 
-class Tag(models.Model):
+class Tag(SyncTracked):
     """Tag for recipe"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
@@ -149,11 +253,27 @@ class Tag(models.Model):
         on_delete=models.CASCADE,
     )
 
+    # Number of recipes using it, kept up to date by
+    # signals in core/signals.py (fix drift with
+    # reconcile_recipe_counts command)
+    recipe_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'recipe_count']),
+            models.Index(fields=['user', 'sync_seq']),
+            # Admin prefix search ('^name' is UPPER(name) LIKE 'X%')
+            models.Index(
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='tag_name_upper_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(SyncTracked):
     """Ingredient for recipe"""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(
@@ -161,5 +281,280 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE,
     )
 
+    # Number of recipes using it, kept up to date by
+    # signals in core/signals.py (fix drift with
+    # reconcile_recipe_counts command)
+    recipe_count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'recipe_count']),
+            models.Index(fields=['user', 'sync_seq']),
+            # Admin prefix search ('^name' is UPPER(name) LIKE 'X%')
+            models.Index(
+                OpClass(Upper('name'), name='text_pattern_ops'),
+                name='ingredient_name_upper_idx',
+            ),
+        ]
+
     def __str__(self):
         return self.name
+
+
+class RequestProfile(models.Model):
+    """Profile of a single request taken by a staff user"""
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=255)
+    mode = models.CharField(max_length=20)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+
+    # File name inside settings.PROFILE_ROOT
+    file_name = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.mode})'
+
+
+class IdempotencyKey(models.Model):
+    """Stored response of a request sent with an Idempotency-Key
+
+    Used by core.idempotency, rows older than
+    settings.IDEMPOTENCY_KEY_TTL are ignored and
+    deleted by the purge_idempotency_keys command
+    """
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    key = models.CharField(max_length=255)
+
+    # Hash of method, path and body, the same key
+    # can't be reused for a different request
+    fingerprint = models.CharField(max_length=64)
+
+    # Empty until the first request has finished
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key'], name='idempotency_user_key_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.key} ({self.status_code})'
+
+
+class Tombstone(models.Model):
+    """Deleted recipe, tag or ingredient, for delta sync
+
+    Kept for settings.SYNC_TOMBSTONE_RETENTION_DAYS, then
+    removed by the compact_tombstones command
+    """
+    KINDS = [
+        ('recipe', 'Recipe'),
+        ('tag', 'Tag'),
+        ('ingredient', 'Ingredient'),
+    ]
+
+    # No constraint, tombstones of a deleted user
+    # are left for compaction
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.BigIntegerField()
+    # Set by the insert trigger, like SyncTracked
+    sync_seq = models.BigIntegerField(db_default=0)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'sync_seq']),
+            models.Index(fields=['deleted_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
+
+
+class SyncWatermark(models.Model):
+    """Highest sync_seq of tombstones removed by compaction
+
+    Single row, a client behind it may have missed deletes
+    and must sync from scratch
+    """
+    compacted_seq = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.compacted_seq)
+
+
+class Job(models.Model):
+    """Background job, run by the run_workers command (core/jobs.py)"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    # Registered name of the function to run, called with payload
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=QUEUED)
+
+    # Higher runs first, among ready jobs (run_at in the past)
+    priority = models.SmallIntegerField(default=0)
+    run_at = models.DateTimeField(default=timezone.now)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    last_error = models.TextField(blank=True)
+
+    # Set while running, a job locked for too long
+    # (worker died) is queued again
+    locked_at = models.DateTimeField(null=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            # Only queued rows are in it, it stays small
+            # however many jobs are done
+            models.Index(
+                fields=['-priority', 'run_at', 'id'],
+                condition=models.Q(status='queued'),
+                name='job_ready_idx',
+            ),
+            models.Index(
+                fields=['locked_at'],
+                condition=models.Q(status='running'),
+                name='job_running_idx',
+            ),
+            # Last run of a periodic job (jobs.schedule_periodic)
+            models.Index(fields=['name', '-run_at'], name='job_name_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
+
+
+class RecipeSignature(models.Model):
+    """MinHash signature of recipe tags/ingredients (core/similarity.py)"""
+    recipe = models.OneToOneField(
+        to=Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+    )
+
+    # NUM_PERM unsigned 32 bit integers, little endian
+    minhash = models.BinaryField()
+
+    def __str__(self):
+        return f'Signature of {self.recipe_id}'
+
+
+class RecipeBucket(models.Model):
+    """LSH bucket of one band of a recipe signature
+
+    Recipes sharing a key are candidates of each other,
+    user is copied from the recipe to look up within a user
+    """
+    recipe = models.ForeignKey(
+        to=Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+
+    # Hash of (band number, band values)
+    key = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'key']),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.key}'
+
+
+class DeletionOperation(models.Model):
+    """Account or recipes deleted in the background (core/deletion.py)
+
+    Deleted a batch per transaction by the core.run_deletion job,
+    deleted counts the rows gone so far out of total
+    """
+    ACCOUNT = 'account'
+    RECIPES = 'recipes'
+    KINDS = [
+        (ACCOUNT, 'Account'),
+        (RECIPES, 'Recipes'),
+    ]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    STATUSES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+    ]
+
+    # No constraint, the operation outlives a deleted account
+    user = models.ForeignKey(
+        to=settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+    )
+    kind = models.CharField(max_length=10, choices=KINDS)
+    status = models.CharField(max_length=10, choices=STATUSES,
+                              default=PENDING)
+
+    # Recipes to delete (RECIPES only)
+    recipe_ids = models.JSONField(default=list)
+
+    total = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+
+    # Images of deleted recipes, removed from storage once
+    # the batch deleting their recipes has committed
+    pending_files = models.JSONField(default=list)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f'{self.kind} of {self.user_id} ({self.status})'
@@ -0,0 +1,105 @@
+"""
+On demand request profiling
+"""
+import cProfile
+import marshal
+import os
+import sys
+import threading
+import time
+import uuid
+
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+# cprofile: deterministic profile, stored as pstats (.prof)
+# sample: sampling profiler, stored as collapsed stacks
+# flamegraph: like sample, but the stacks are returned
+# to the client instead of the response
+MODES = ('cprofile', 'sample', 'flamegraph')
+
+
+class SamplingProfiler:
+    """Sample stack of one thread from a background thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._stack(frame)] += 1
+
+    def _stack(self, frame):
+        """Return stack root first as 'a;b;c'"""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(
+                f'{code.co_name} ({code.co_filename}:{frame.f_lineno})'
+            )
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def collapsed(self):
+        """Stacks in collapsed format read by flamegraph.pl/speedscope"""
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.stacks.items()
+        ).encode()
+
+
+def profile_call(mode, func, *args):
+    """Run func under profiler, return (result, data, extension)"""
+
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        result = profiler.runcall(func, *args)
+
+        # pstats binary format, open with snakeviz,
+        # flameprof or pstats module
+        profiler.create_stats()
+        return result, marshal.dumps(profiler.stats), 'prof'
+
+    profiler = SamplingProfiler(
+        threading.get_ident(),
+        settings.PROFILE_SAMPLE_INTERVAL,
+    )
+    profiler.start()
+    try:
+        result = func(*args)
+    finally:
+        profiler.stop()
+
+    return result, profiler.collapsed(), 'collapsed'
+
+
+def save_profile(data, extension):
+    """Write profile to PROFILE_ROOT and return its file name"""
+    os.makedirs(settings.PROFILE_ROOT, exist_ok=True)
+
+    stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+    name = f'{stamp}-{uuid.uuid4().hex[:8]}.{extension}'
+
+    with open(os.path.join(settings.PROFILE_ROOT, name), 'wb') as file:
+        file.write(data)
+
+    return name
+
+
+def elapsed_ms(start):
+    """Milliseconds since perf_counter start"""
+    return (time.perf_counter() - start) * 1000
@@ -0,0 +1,153 @@
+"""
+OpenAPI schema generated once and served from memory
+
+Introspecting every viewset and serializer takes hundreds of ms,
+so the schema is generated once per version of the code (build_schema
+command at startup, or the first request) and written to SCHEMA_ROOT
+as YAML and JSON, plain and gzipped. Requests get those bytes from
+memory with a strong ETag.
+
+The files are named after a fingerprint of the Python sources and of
+the packages/settings generating the schema, a code change gives a
+new fingerprint and so a new schema.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from importlib.metadata import version
+from pathlib import Path
+
+from django.conf import settings
+
+FORMATS = {
+    'yaml': 'application/vnd.oai.openapi',
+    'json': 'application/vnd.oai.openapi+json',
+}
+
+# Packages whose version changes the generated schema
+PACKAGES = ['django', 'djangorestframework', 'drf-spectacular']
+
+_lock = threading.Lock()
+_fingerprint = None
+
+# format -> Document, of the current fingerprint
+_documents = {}
+
+
+class Document:
+    """Schema in one format, ready to be sent"""
+
+    def __init__(self, body):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        # Strong validators, one per encoding of the bytes
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+
+
+def fingerprint():
+    """Hash of everything the schema is generated from"""
+    global _fingerprint
+
+    # Code of a running process does not change
+    if _fingerprint is not None:
+        return _fingerprint
+
+    digest = hashlib.sha256()
+    base = Path(settings.BASE_DIR)
+    for path in sorted(base.rglob('*.py')):
+        parts = path.relative_to(base).parts
+        if 'tests' in parts or 'migrations' in parts:
+            continue
+        digest.update(str(path.relative_to(base)).encode())
+        digest.update(path.read_bytes())
+
+    for package in PACKAGES:
+        digest.update(f'{package}=={version(package)}'.encode())
+    digest.update(repr(sorted(settings.SPECTACULAR_SETTINGS.items())).encode())
+
+    _fingerprint = digest.hexdigest()[:16]
+    return _fingerprint
+
+
+def _path(fingerprint, schema_format):
+    return Path(settings.SCHEMA_ROOT) / f'schema-{fingerprint}.{schema_format}'
+
+
+def generate():
+    """{format: bytes} of a freshly generated schema"""
+    # Imported here, they pull in every view of the project
+    from drf_spectacular.renderers import (
+        OpenApiJsonRenderer,
+        OpenApiYamlRenderer,
+    )
+    from drf_spectacular.settings import spectacular_settings
+
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=True)
+
+    return {
+        'yaml': OpenApiYamlRenderer().render(schema, renderer_context={}),
+        'json': OpenApiJsonRenderer().render(schema, renderer_context={}),
+    }
+
+
+def _write(path, data):
+    """Write atomically, readers never see half a file"""
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def build(force=False):
+    """Write the schema files of the current code, True if (re)written"""
+    current = fingerprint()
+    paths = {name: _path(current, name) for name in FORMATS}
+    if not force and all(path.exists() for path in paths.values()):
+        return False
+
+    documents = generate()
+    Path(settings.SCHEMA_ROOT).mkdir(parents=True, exist_ok=True)
+    for name, path in paths.items():
+        _write(path, documents[name])
+
+    # Schemas of older code are never served again
+    for path in Path(settings.SCHEMA_ROOT).glob('schema-*'):
+        if path not in paths.values():
+            path.unlink(missing_ok=True)
+
+    return True
+
+
+def get_document(schema_format):
+    """Document of the current schema, loaded once per process"""
+    with _lock:
+        if not _documents:
+            current = fingerprint()
+            try:
+                build()
+                documents = {
+                    name: _path(current, name).read_bytes()
+                    for name in FORMATS
+                }
+            except OSError:
+                # SCHEMA_ROOT not writable (e.g local runs), keep
+                # the schema in memory only
+                documents = generate()
+
+            for name, body in documents.items():
+                _documents[name] = Document(body)
+
+        return _documents[schema_format]
+
+
+def reset():
+    """Forget loaded schema and fingerprint (tests)"""
+    global _fingerprint
+
+    with _lock:
+        _documents.clear()
+        _fingerprint = None
@@ -0,0 +1,221 @@
+"""
+Signal handlers of core models
+"""
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.core.cache import cache
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core import invalidation
+from core.cache import bump_user_generation
+from core.bitmaps import schedule_update
+from core.similarity import schedule_index
+from core.counters import change_recipe_counts, counted_relations
+from core.models import (
+    Ingredient,
+    NextSyncSeq,
+    Recipe,
+    Tag,
+    Tombstone,
+    User,
+)
+
+
+def _linked_ids(through, column, instance, reverse, pk_set=None):
+    """Ids on the other side currently linked to instance"""
+    if reverse:
+        # instance is a tag/ingredient, other side is recipes
+        links = through.objects.filter(**{column: instance.pk})
+        other = 'recipe_id'
+    else:
+        links = through.objects.filter(recipe_id=instance.pk)
+        other = column
+
+    if pk_set is not None:
+        links = links.filter(**{f'{other}__in': pk_set})
+
+    return list(links.values_list(other, flat=True))
+
+
+def _apply(model, instance, reverse, ids, delta):
+    """Change counters for ids linked or unlinked from instance"""
+    if reverse:
+        # One tag/ingredient gained or lost len(ids) recipes
+        change_recipe_counts(model, [instance.pk], delta * len(ids))
+    else:
+        change_recipe_counts(model, ids, delta)
+
+
+def _update_recipe_counts(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """Keep recipe_count in sync with recipe tags/ingredients"""
+    model, through, column = next(
+        relation for relation in counted_relations()
+        if relation[1] is sender
+    )
+
+    # pk_set of add only holds links that were really created
+    if action == 'post_add':
+        _apply(model, instance, reverse, pk_set, 1)
+
+    # remove and clear report what was asked, not what existed,
+    # so look up the real links before they are deleted
+    elif action in ('pre_remove', 'pre_clear'):
+        instance.__dict__.setdefault('_removed_links', {})[sender] = (
+            _linked_ids(
+                through, column, instance, reverse,
+                pk_set if action == 'pre_remove' else None,
+            )
+        )
+
+    elif action in ('post_remove', 'post_clear'):
+        ids = instance.__dict__.get('_removed_links', {}).pop(sender, [])
+        _apply(model, instance, reverse, ids, -1)
+
+
+m2m_changed.connect(_update_recipe_counts, sender=Recipe.tags.through)
+m2m_changed.connect(_update_recipe_counts, sender=Recipe.ingredients.through)
+
+
+# Deleting a recipe removes its links by cascade,
+# m2m_changed is not sent for those
+@receiver(pre_delete, sender=Recipe)
+def _recipe_deleted(sender, instance, **kwargs):
+    """Decrement counters of tags/ingredients of deleted recipe"""
+    for model, through, column in counted_relations():
+        change_recipe_counts(
+            model, _linked_ids(through, column, instance, False), -1,
+        )
+
+
+def _bump_generations(user_ids):
+    """Invalidation of 'recipes' messages, keys are user ids"""
+    if user_ids is None:
+        # Messages may have been missed, drop the whole
+        # local cache (generations included)
+        cache.clear()
+        return
+
+    for user_id in user_ids:
+        bump_user_generation(user_id)
+
+
+invalidation.subscribe('recipes', _bump_generations)
+
+
+# Cached recipe data (core/cache.py) of the owner is stale
+# after any change of recipes, tags or ingredients, in this
+# worker and the others (core/invalidation.py)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def _invalidate_user_cache(sender, instance, **kwargs):
+    """Bump cache generation of the owner"""
+    invalidation.publish('recipes', instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def _invalidate_user_cache_links(sender, instance, action, **kwargs):
+    """Bump cache generation when recipe links change"""
+    if action.startswith('post_'):
+        invalidation.publish('recipes', instance.user_id)
+
+
+# Nothing caches users or tokens in process yet, the
+# messages are there for whoever subscribes to them
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _invalidate_user(sender, instance, **kwargs):
+    """Publish change of a user"""
+    invalidation.publish('user', instance.pk)
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def _invalidate_token(sender, instance, **kwargs):
+    """Publish change of a user token, keyed by user not by secret"""
+    invalidation.publish('token', instance.user_id)
+
+
+# Deletes are sent to syncing clients as tombstones
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def _record_tombstone(sender, instance, **kwargs):
+    """Remember deleted object for delta sync"""
+    Tombstone.objects.create(
+        user_id=instance.user_id,
+        kind=sender._meta.model_name,
+        object_id=instance.pk,
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def _bump_recipe_sync_seq(sender, instance, action, reverse, pk_set,
+                          **kwargs):
+    """Recipe tags/ingredients are part of it, a link change is a change"""
+    if not reverse:
+        if not action.startswith('post_'):
+            return
+        recipes = Recipe.objects.filter(pk=instance.pk)
+
+    # instance is a tag/ingredient, before a clear the
+    # links still tell which recipes it's removed from
+    elif action in ('post_add', 'pre_remove') and pk_set:
+        recipes = Recipe.objects.filter(pk__in=pk_set)
+    elif action == 'pre_clear':
+        field = 'tags' if sender is Recipe.tags.through else 'ingredients'
+        recipes = Recipe.objects.filter(**{field: instance})
+    else:
+        return
+
+    recipes.update(sync_seq=NextSyncSeq('user_id'))
+
+
+# MinHash signatures (core/similarity.py) and bitmap
+# indexes (core/bitmaps.py) follow recipe links
+def _reindex(user_id, recipe_ids):
+    recipe_ids = set(recipe_ids)
+    schedule_index(recipe_ids)
+    schedule_update(user_id, recipe_ids)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def _reindex_links(sender, instance, action, reverse, pk_set, **kwargs):
+    """Recompute signatures and bitmaps of recipes whose links changed"""
+    if not reverse:
+        if action.startswith('post_'):
+            _reindex(instance.user_id, [instance.pk])
+    elif action in ('post_add', 'post_remove') and pk_set:
+        _reindex(instance.user_id, pk_set)
+    elif action == 'pre_clear':
+        field = 'tags' if sender is Recipe.tags.through else 'ingredients'
+        _reindex(instance.user_id, Recipe.objects.filter(
+            **{field: instance},
+        ).values_list('id', flat=True))
+
+
+# Deleting a tag/ingredient removes its links by cascade
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def _reindex_links_deleted(sender, instance, **kwargs):
+    """Recompute recipes losing a tag/ingredient"""
+    _reindex(instance.user_id,
+             instance.recipe_set.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Recipe)
+def _unindex_recipe(sender, instance, **kwargs):
+    """Drop bits of a deleted recipe (its signature goes by cascade)"""
+    schedule_update(instance.user_id, [instance.pk])
@@ -0,0 +1,115 @@
+"""
+Static files storage with hashed names and precompressed copies
+
+ManifestStaticFilesStorage names every collected file after its
+content (base.css -> base.5af66c1b1797.css), so nginx can let
+browsers cache them for good (proxy/default.conf.tpl). Text files
+also get .gz and .br siblings compressed once here, at the highest
+levels, nginx sends those instead of compressing per request.
+
+collectstatic is skipped at startup (sync_static command) when the
+sources fingerprinted below are the ones last collected.
+"""
+import gzip
+import hashlib
+
+import brotli
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+# Worth compressing, images and fonts like woff2 already are
+COMPRESSED_EXTENSIONS = (
+    '.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml',
+    '.ttf', '.eot', '.otf', '.ico',
+)
+
+# Smaller files fit in a packet anyway
+MIN_COMPRESS_SIZE = 256
+
+# Same as collectstatic, files it never collects
+IGNORE_PATTERNS = ['CVS', '.*', '*~']
+
+FINGERPRINT_NAME = '.fingerprint'
+
+
+def _compressors():
+    return [
+        ('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)),
+        ('.br', lambda data: brotli.compress(data, quality=11)),
+    ]
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed names, plus .gz/.br of every hashed text file"""
+
+    def stored_name(self, name):
+        # No manifest, collectstatic never ran (tests, local
+        # runs), refer to files by their plain names
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed_names = set()
+        for name, hashed_name, processed in super().post_process(
+            paths, dry_run, **options,
+        ):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed_names.add(hashed_name)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+
+        for hashed_name in sorted(hashed_names):
+            self.compress(hashed_name)
+
+    def compress(self, name):
+        """Write compressed siblings of name, True if any was written"""
+        if not name.endswith(COMPRESSED_EXTENSIONS):
+            return False
+
+        written = False
+        data = None
+        for suffix, compress in _compressors():
+            # A hashed name always holds the same content,
+            # siblings of previous runs are still right
+            if self.exists(name + suffix):
+                continue
+
+            if data is None:
+                with self.open(name) as original:
+                    data = original.read()
+                if len(data) < MIN_COMPRESS_SIZE:
+                    return False
+
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                self._save(name + suffix, ContentFile(compressed))
+                written = True
+
+        return written
+
+
+def sources_fingerprint():
+    """Hash of every file collectstatic would collect"""
+    digest = hashlib.sha256()
+    digest.update(settings.STORAGES['staticfiles']['BACKEND'].encode())
+
+    files = {}
+    for finder in get_finders():
+        for path, storage in finder.list(IGNORE_PATTERNS):
+            # First finder finding a path wins, as in collectstatic
+            prefix = getattr(storage, 'prefix', None) or ''
+            files.setdefault(f'{prefix}/{path}'.lstrip('/'), (storage, path))
+
+    for name in sorted(files):
+        storage, path = files[name]
+        digest.update(name.encode())
+        with storage.open(path) as source:
+            digest.update(hashlib.sha256(source.read()).digest())
+
+    return digest.hexdigest()
@@ -0,0 +1,30 @@
+"""
+Background jobs of core, see core/jobs.py
+"""
+from django.core.management import call_command
+
+from core import deletion
+from core.counters import counted_relations, reconcile_recipe_counts
+from core.jobs import register
+
+
+@register('core.reconcile_recipe_counts', priority=-10)
+def reconcile_counts():
+    """Fix drifted recipe counters (long, low priority)"""
+    for model, _, _ in counted_relations():
+        reconcile_recipe_counts(model)
+
+
+@register('core.purge_idempotency_keys', priority=-10)
+def purge_idempotency_keys():
+    call_command('purge_idempotency_keys')
+
+
+@register('core.compact_tombstones', priority=-10)
+def compact_tombstones():
+    call_command('compact_tombstones')
+
+
+@register(deletion.JOB_NAME, priority=-5)
+def run_deletion(operation_id):
+    deletion.run(operation_id)
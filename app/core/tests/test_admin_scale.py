@@ -0,0 +1,164 @@
+"""
+Tests for admin of big tables (core/admin.py)
+"""
+from django.contrib.admin.models import DELETION, LogEntry
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.admin import EstimatedCountPaginator, batched_ids, estimated_count
+from core.models import Recipe, Tag
+from recipe.tests.test_recipe_api import create_recipe
+
+
+class AdminScaleTests(TestCase):
+    """Changelists, forms and actions of recipes, tags, ingredients"""
+
+    def setUp(self):
+        self.admin = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='iloveyou<3admin',
+        )
+        self.client.force_login(self.admin)
+        self.user = get_user_model().objects.create_user(
+            email='someone@example.com',
+            password='testpassword',
+        )
+
+    def test_recipe_search_prefix(self):
+        """Test searching recipes matches the start of titles"""
+        create_recipe(self.user, title='Pancakes')
+        create_recipe(self.user, title='Banana pancakes')
+
+        res = self.client.get(
+            reverse('admin:core_recipe_changelist'), {'q': 'pan'},
+        )
+
+        self.assertContains(res, 'Pancakes')
+        self.assertNotContains(res, 'Banana pancakes')
+
+    def test_user_search(self):
+        """Test user changelist search (no username field)"""
+        res = self.client.get(
+            reverse('admin:core_user_changelist'), {'q': 'someone'},
+        )
+
+        self.assertContains(res, 'someone@example.com')
+
+    def test_recipe_change_form(self):
+        """Test tags are ids, not a <select> of every tag"""
+        tag = Tag.objects.create(user=self.user, name='Unlisted tag')
+        recipe = create_recipe(self.user)
+        recipe.tags.add(tag)
+
+        res = self.client.get(
+            reverse('admin:core_recipe_change', args=[recipe.id]),
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, 'vManyToManyRawIdAdminField')
+        self.assertNotContains(res, '<option value="%d"' % tag.id)
+
+    def test_delete_in_batches(self):
+        """Test delete action removes selection batch by batch"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipes = [create_recipe(self.user) for _ in range(5)]
+        for recipe in recipes:
+            recipe.tags.add(tag)
+        kept = create_recipe(self.user)
+
+        with override_settings(ADMIN_BATCH_SIZE=2):
+            res = self.client.post(
+                reverse('admin:core_recipe_changelist'),
+                {
+                    'action': 'delete_in_batches',
+                    '_selected_action': [recipe.id for recipe in recipes],
+                },
+            )
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(list(Recipe.objects.all()), [kept])
+        # Signals still ran for every deleted recipe
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 0)
+        # And the deletions are in the admin history
+        self.assertEqual(
+            LogEntry.objects.filter(action_flag=DELETION).count(), 5,
+        )
+
+    def test_delete_selected_replaced(self):
+        """Test the default delete action is not offered"""
+        res = self.client.get(reverse('admin:core_tag_changelist'))
+
+        self.assertContains(res, 'delete_in_batches')
+        self.assertNotContains(res, 'value="delete_selected"')
+
+    def test_recount_recipes(self):
+        """Test recount action fixes drifted recipe counts"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        create_recipe(self.user).tags.add(tag)
+        Tag.objects.filter(id=tag.id).update(recipe_count=7)
+
+        self.client.post(
+            reverse('admin:core_tag_changelist'),
+            {'action': 'recount_recipes', '_selected_action': [tag.id]},
+        )
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+
+
+class EstimatedCountTests(TestCase):
+    """Tests for estimated_count and EstimatedCountPaginator"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='someone@example.com',
+            password='testpassword',
+        )
+        for index in range(3):
+            Tag.objects.create(user=self.user, name=f'Tag {index}')
+
+    def test_estimate_from_statistics(self):
+        """Test whole table estimate comes from pg_class"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_tag')
+
+        self.assertEqual(estimated_count(Tag.objects.all()), 3)
+
+    def test_estimate_of_filtered(self):
+        """Test filtered querysets are estimated by the planner"""
+        estimate = estimated_count(Tag.objects.filter(name='Tag 1'))
+
+        self.assertIsInstance(estimate, int)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=0)
+    def test_big_table_not_counted(self):
+        """Test no COUNT(*) runs above ADMIN_EXACT_COUNT_LIMIT"""
+        paginator = EstimatedCountPaginator(
+            Tag.objects.filter(user=self.user).order_by('id'), 2,
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            paginator.count
+
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries),
+        )
+
+    def test_small_table_counted(self):
+        """Test exact count below ADMIN_EXACT_COUNT_LIMIT"""
+        paginator = EstimatedCountPaginator(Tag.objects.order_by('id'), 2)
+
+        self.assertEqual(paginator.count, 3)
+        self.assertEqual(paginator.num_pages, 2)
+
+    def test_batched_ids(self):
+        """Test ids come in batches of the given size"""
+        ids = list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+        batches = list(batched_ids(Tag.objects.all(), 2))
+
+        self.assertEqual(batches, [ids[:2], ids[2:]])
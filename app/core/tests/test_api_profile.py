@@ -0,0 +1,70 @@
+"""
+Tests for the API-only settings profile
+"""
+import io
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+# Run with app.settings_api in a fresh interpreter, the
+# test process already loaded every app
+PROBE = '''
+import json, sys
+import django
+django.setup()
+from django.conf import settings
+from django.test import Client
+
+client = Client()
+print(json.dumps({
+    'apps': settings.INSTALLED_APPS,
+    'sessions': any(name.startswith('django.contrib.sessions')
+                    for name in sys.modules),
+    'admin': client.get('/admin/').status_code,
+    'docs': client.get('/api/docs/').status_code,
+    'api': client.get('/api/recipe/recipes/', HTTP_ACCEPT='text/html')[
+        'Content-Type'],
+}))
+'''
+
+
+class APIProfileTests(SimpleTestCase):
+    """Test what app.settings_api loads and serves"""
+
+    def test_lean_profile(self):
+        """Test no admin/sessions, API answers JSON only"""
+        process = subprocess.run(
+            [sys.executable, '-c', PROBE],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={
+                **os.environ,
+                'DJANGO_SETTINGS_MODULE': 'app.settings_api',
+                'ALLOWED_HOSTS': 'testserver',
+            },
+        )
+        self.assertEqual(process.returncode, 0, process.stderr)
+        result = json.loads(process.stdout)
+
+        self.assertNotIn('django.contrib.sessions', result['apps'])
+        self.assertFalse(result['sessions'])
+        self.assertEqual(result['admin'], 404)
+        self.assertEqual(result['docs'], 404)
+        self.assertEqual(result['api'], 'application/json')
+
+
+class BenchmarkMiddlewareTests(TestCase):
+    """Test benchmark_middleware command"""
+
+    def test_reports_both_scenarios(self):
+        """Test each scenario is timed, data is rolled back"""
+        out = io.StringIO()
+        call_command('benchmark_middleware', iterations=2, rounds=1,
+                     stdout=out)
+
+        self.assertIn('anonymous', out.getvalue())
+        self.assertIn('user_me', out.getvalue())
@@ -0,0 +1,85 @@
+"""
+Tests for benchmark command
+"""
+import io
+import json
+import os
+import tempfile
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from core.management.commands.benchmark import BENCH_EMAIL, BENCH_PASSWORD
+from core.models import Recipe, Tag
+
+
+# Fast hasher, token login runs several times
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class BenchmarkCommandTests(TestCase):
+    """Test benchmark command"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.tmp_dir.name, 'results.json')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_benchmark(self, **options):
+        call_command(
+            'benchmark', iterations=3, warmup=0, recipes=5,
+            output=self.output, stdout=io.StringIO(), **options,
+        )
+        with open(self.output) as file:
+            return json.load(file)
+
+    def test_benchmark_writes_results(self):
+        """Test every scenario is reported and data deleted"""
+        report = self.run_benchmark()
+
+        self.assertEqual(len(report['scenarios']), 5)
+        for result in report['scenarios'].values():
+            self.assertEqual(result['requests'], 3)
+            self.assertGreater(result['throughput_rps'], 0)
+            self.assertGreater(result['queries'], 0)
+            for key in ['p50', 'p95', 'p99']:
+                self.assertIn(key, result['latency_ms'])
+
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_benchmark_keeps_existing_rows(self):
+        """Test only rows of the run are deleted for an existing user"""
+        user = get_user_model().objects.create_user(
+            email=BENCH_EMAIL, password=BENCH_PASSWORD,
+        )
+        recipe = Recipe.objects.create(
+            user=user, title='Kept', minute_to_make_recipe=1,
+            price=Decimal('1.00'),
+        )
+
+        self.run_benchmark(scenario=['recipe_create_with_tags'])
+
+        self.assertEqual(list(Recipe.objects.all()), [recipe])
+        self.assertFalse(Tag.objects.exists())
+
+    def test_benchmark_fails_on_regression(self):
+        """Test command fails when baseline is regressed"""
+        report = self.run_benchmark(scenario=['recipe_detail'])
+
+        # Baseline much faster with fewer queries than now
+        result = report['scenarios']['recipe_detail']
+        result['latency_ms']['p95'] /= 1000
+        result['queries'] = 0.5
+        baseline = os.path.join(self.tmp_dir.name, 'baseline.json')
+        with open(baseline, 'w') as file:
+            json.dump(report, file)
+
+        with self.assertRaises(CommandError):
+            self.run_benchmark(scenario=['recipe_detail'], baseline=baseline)
@@ -0,0 +1,117 @@
+"""
+Tests for the bitmap index
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from core import bitmaps, invalidation
+from core.models import Ingredient, Recipe, Tag
+
+
+class UserIndexTests(TestCase):
+    """Test bitset operations"""
+
+    def setUp(self):
+        self.index = bitmaps.UserIndex()
+        self.index.set_recipe(10, {1, 2}, {5, 6})
+        self.index.set_recipe(11, {2}, {5})
+        self.index.set_recipe(12, {3}, {6, 7})
+
+    def ids(self, bitset):
+        return sorted(self.index.to_ids(bitset))
+
+    def test_any_all(self):
+        """Test OR and AND of tag bitsets"""
+        tags = self.index.tags
+
+        self.assertEqual(self.ids(self.index.match(tags, [1, 3])), [10, 12])
+        self.assertEqual(
+            self.ids(self.index.match(tags, [1, 2], bitmaps.ALL)), [10],
+        )
+        self.assertEqual(
+            self.ids(self.index.match(tags, [1, 99], bitmaps.ALL)), [],
+        )
+
+    def test_pantry(self):
+        """Test recipes made only of pantry ingredients"""
+        self.assertEqual(self.ids(self.index.pantry([5])), [11])
+        self.assertEqual(self.ids(self.index.pantry([5, 6])), [10, 11])
+        self.assertEqual(self.ids(self.index.pantry([7])), [])
+
+    def test_relink_and_remove(self):
+        """Test replaced links unset old bits, removed recipe is gone"""
+        self.index.set_recipe(10, {3}, {7})
+        self.index.remove_recipe(12)
+
+        self.assertNotIn(1, self.index.tags)
+        self.assertEqual(self.ids(self.index.tags[3]), [10])
+        self.assertEqual(self.ids(self.index.pantry([7])), [10])
+
+    def test_compact(self):
+        """Test positions of deleted recipes are given back"""
+        self.index.remove_recipe(10)
+        self.assertAlmostEqual(self.index.dead_share(), 1 / 3)
+
+        self.index.compact()
+
+        self.assertEqual(self.index.dead_share(), 0)
+        self.assertEqual(self.index.recipe_ids, [11, 12])
+        self.assertEqual(self.ids(self.index.tags[2]), [11])
+        self.assertEqual(self.index.tags[3].bit_length(), 2)
+        self.assertEqual(self.ids(self.index.pantry([5])), [11])
+
+
+class MaintenanceTests(TestCase):
+    """Test the index follows database changes"""
+
+    def setUp(self):
+        bitmaps.clear()
+        self.addCleanup(bitmaps.clear)
+        self.user = get_user_model().objects.create_user(
+            email='bitmap@example.com', password='testpassword123',
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Soup')
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Soup', minute_to_make_recipe=1,
+            price=Decimal('1.00'), description='Bitmap',
+        )
+
+    def test_patched_on_commit(self):
+        """Test link changes and deletes update a built index"""
+        self.assertEqual(
+            bitmaps.filter_recipe_ids(self.user.id, tags=[self.tag.id]), [],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.tags.add(self.tag)
+        self.assertEqual(
+            bitmaps.filter_recipe_ids(self.user.id, tags=[self.tag.id]),
+            [self.recipe.id],
+        )
+
+        ingredient = Ingredient.objects.create(user=self.user, name='Leek')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.recipe_set.add(Recipe.objects.create(
+                user=self.user, title='Leek soup', minute_to_make_recipe=1,
+                price=Decimal('1.00'), description='Bitmap',
+            ))
+            self.recipe.ingredients.add(ingredient)
+            self.recipe.delete()
+        self.assertEqual(
+            len(bitmaps.filter_recipe_ids(self.user.id, tags=[self.tag.id])),
+            1,
+        )
+        self.assertEqual(
+            bitmaps.filter_recipe_ids(self.user.id, pantry=[ingredient.id]),
+            [],
+        )
+
+    def test_dropped_by_other_workers(self):
+        """Test a change from another worker drops the index"""
+        bitmaps.get_index(self.user.id)
+
+        invalidation.apply({'recipes': {str(self.user.id)}}, remote=True)
+
+        self.assertNotIn(self.user.id, bitmaps._indexes)
@@ -4,6 +4,7 @@ Test custom command Django managment
 
 # to mock behavior of database (simulate, not actual database)
 # to return response or not
+from io import StringIO
 from unittest.mock import patch
 
 # possibilities errors might get when try to connect database b4 ready
@@ -15,15 +16,18 @@ from django.core.management import call_command
 # get operation error to throw exception from database
 from django.db.utils import OperationalError
 
+# raised by the command when it gives up
+from django.core.management.base import CommandError
+
 # for simple testing
 from django.test import SimpleTestCase
 
 # Command going tobe mocking wait_for_db (in commands folder)
-# ".check" base on BaseCommand (check wait_for_db.py file, class Command)
+# ".probe" opens a connection (check wait_for_db.py file, class Command)
 # for return exception, value,.. also simulate
 
 
-@patch('core.management.commands.wait_for_db.Command.check')
+@patch('core.management.commands.wait_for_db.Command.probe')
 class CommandTests(SimpleTestCase):
     """Test commands."""
 
@@ -33,11 +37,11 @@ class CommandTests(SimpleTestCase):
         """Test waiting database if it ready"""
         patched_check.return_value = True
 
-        call_command('wait_for_db')
+        call_command('wait_for_db', stdout=StringIO())
 
-        # Check if check method is called with "database=['default']"
+        # Check if probe method is called once only
         # docker-compose run --rm app sh -c "python manage.py test" to test
-        patched_check.assert_called_once_with(databases=['default'])
+        patched_check.assert_called_once_with()
 
     @patch('time.sleep')
     def test_wait_for_database_delay(self, patched_sleep, patched_check):
@@ -52,8 +56,46 @@ class CommandTests(SimpleTestCase):
         patched_check.side_effect = [Psycopg2Error] * 2 \
             + [OperationalError] * 3 + [True]
 
-        call_command('wait_for_db')
+        call_command('wait_for_db', stdout=StringIO())
 
         # Check
         self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=['default'])
+
+    @patch('time.sleep')
+    def test_wait_for_database_backoff(self, patched_sleep, patched_check):
+        """Test delays double up to --max-delay, with jitter"""
+        patched_check.side_effect = [OperationalError] * 8 + [True]
+
+        call_command(
+            'wait_for_db', '--initial-delay', '0.1', '--max-delay', '1',
+            stdout=StringIO(),
+        )
+
+        # Each wait is between half and all of its delay
+        delays = [0.1, 0.2, 0.4, 0.8, 1, 1, 1, 1]
+        waits = [call.args[0] for call in patched_sleep.call_args_list]
+        self.assertEqual(len(waits), len(delays))
+        for wait, delay in zip(waits, delays):
+            self.assertTrue(delay / 2 <= wait <= delay)
+
+    @patch('core.management.commands.wait_for_db.time')
+    def test_wait_for_database_timeout(self, patched_time, patched_check):
+        """Test command fails once --timeout would be passed"""
+        patched_check.side_effect = OperationalError
+
+        # Fake clock, moved on by the (mocked) sleeps
+        clock = [0]
+        patched_time.monotonic.side_effect = lambda: clock[0]
+        patched_time.sleep.side_effect = lambda wait: clock.__setitem__(
+            0, clock[0] + wait,
+        )
+
+        with self.assertRaises(CommandError):
+            call_command(
+                'wait_for_db', '--timeout', '3', '--max-delay', '1',
+                stdout=StringIO(),
+            )
+
+        # Gave up before sleeping past the timeout
+        self.assertLessEqual(clock[0], 3)
+        self.assertGreater(patched_check.call_count, 3)
@@ -0,0 +1,88 @@
+"""
+Tests for denormalized recipe counters
+"""
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.tests.test_recipe_api import create_recipe
+
+
+class RecipeCountTests(TestCase):
+    """Test recipe_count follows recipe links"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='counter@example.com',
+            password='testpassword123',
+        )
+        self.tag1 = Tag.objects.create(user=self.user, name='Tag1')
+        self.tag2 = Tag.objects.create(user=self.user, name='Tag2')
+        self.recipe = create_recipe(self.user)
+
+    def assertCounts(self, *expected):
+        counts = [Tag.objects.get(id=tag.id).recipe_count
+                  for tag in [self.tag1, self.tag2]]
+        self.assertEqual(counts, list(expected))
+
+    def test_add_and_remove(self):
+        """Test add, add again and remove update counts"""
+        self.recipe.tags.add(self.tag1, self.tag2)
+        self.recipe.tags.add(self.tag1)
+        self.assertCounts(1, 1)
+
+        self.recipe.tags.remove(self.tag1)
+        self.recipe.tags.remove(self.tag1)
+        self.assertCounts(0, 1)
+
+    def test_clear(self):
+        """Test clear decrements linked tags only"""
+        other = create_recipe(self.user)
+        other.tags.add(self.tag2)
+        self.recipe.tags.add(self.tag1, self.tag2)
+
+        self.recipe.tags.clear()
+
+        self.assertCounts(0, 1)
+
+    def test_reverse_side(self):
+        """Test changes made from the tag side"""
+        other = create_recipe(self.user)
+
+        self.tag1.recipe_set.add(self.recipe, other)
+        self.assertCounts(2, 0)
+
+        self.tag1.recipe_set.remove(other)
+        self.assertCounts(1, 0)
+
+        self.tag1.recipe_set.clear()
+        self.assertCounts(0, 0)
+
+    def test_recipe_delete(self):
+        """Test deleting recipes decrements counts"""
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        other = create_recipe(self.user)
+        for recipe in [self.recipe, other]:
+            recipe.tags.add(self.tag1)
+            recipe.ingredients.add(ingredient)
+
+        self.recipe.delete()
+        self.assertCounts(1, 0)
+
+        Recipe.objects.all().delete()
+        self.assertCounts(0, 0)
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.recipe_count, 0)
+
+    def test_reconcile_command(self):
+        """Test reconcile command fixes drifted counts"""
+        self.recipe.tags.add(self.tag1)
+        Tag.objects.filter(id=self.tag1.id).update(recipe_count=7)
+        Tag.objects.filter(id=self.tag2.id).update(recipe_count=3)
+
+        call_command('reconcile_recipe_counts', stdout=open(os.devnull, 'w'))
+
+        self.assertCounts(1, 0)
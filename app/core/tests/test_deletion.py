@@ -0,0 +1,153 @@
+"""
+Tests for batched background deletion (core/deletion.py)
+"""
+import os
+import tempfile
+
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from core import deletion
+from core.models import (
+    DeletionOperation,
+    Ingredient,
+    Job,
+    Recipe,
+    Tag,
+    Tombstone,
+)
+from recipe.tests.test_recipe_api import create_recipe
+
+
+@override_settings(DELETION_BATCH_SIZE=2, DELETION_BATCH_PAUSE=0)
+class DeletionTests(TestCase):
+    """Tests for account and recipes deletion"""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123',
+        )
+        self.other = get_user_model().objects.create_user(
+            email='other@example.com', password='testpass123',
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        Ingredient.objects.create(user=self.user, name='Salt')
+        self.recipes = [create_recipe(self.user) for _ in range(5)]
+        for recipe in self.recipes:
+            recipe.tags.add(self.tag)
+
+        self.recipes[0].image.save(
+            'photo.jpg', SimpleUploadedFile('photo.jpg', b'image'),
+        )
+        self.image_path = self.recipes[0].image.path
+        self.kept = create_recipe(self.other)
+
+    def test_delete_account(self):
+        """Test account and all it owns deleted batch by batch"""
+        operation = deletion.delete_account(self.user)
+
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        # 5 recipes, 1 tag, 1 ingredient and the user
+        self.assertEqual(operation.total, 8)
+
+        deletion.run(operation.id)
+
+        operation.refresh_from_db()
+        self.assertEqual(operation.status, DeletionOperation.DONE)
+        self.assertEqual(operation.deleted, operation.total)
+        self.assertIsNotNone(operation.finished_at)
+        self.assertFalse(
+            get_user_model().objects.filter(id=self.user.id).exists()
+        )
+        self.assertFalse(Tag.objects.filter(user_id=self.user.id).exists())
+        self.assertFalse(os.path.exists(self.image_path))
+        self.assertEqual(list(Recipe.objects.all()), [self.kept])
+
+    def test_delete_recipes(self):
+        """Test only listed recipes of the user are deleted"""
+        ids = [recipe.id for recipe in self.recipes[:3]] + [self.kept.id]
+
+        operation = deletion.delete_recipes(self.user, ids)
+        self.assertEqual(operation.total, 3)
+        deletion.run(operation.id)
+
+        operation.refresh_from_db()
+        self.assertEqual(operation.deleted, 3)
+        self.assertEqual(
+            set(Recipe.objects.values_list('id', flat=True)),
+            {recipe.id for recipe in self.recipes[3:]} | {self.kept.id},
+        )
+        # Signals ran: counters and tombstones are right
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.recipe_count, 2)
+        self.assertEqual(
+            Tombstone.objects.filter(kind='recipe').count(), 3,
+        )
+        self.assertFalse(os.path.exists(self.image_path))
+
+    @override_settings(DELETION_TIME_BUDGET=0)
+    def test_time_budget(self):
+        """Test a job stops after its budget and queues the rest"""
+        operation = deletion.delete_recipes(
+            self.user, [recipe.id for recipe in self.recipes],
+        )
+
+        deletion.run(operation.id)
+
+        operation.refresh_from_db()
+        self.assertEqual(operation.status, DeletionOperation.RUNNING)
+        self.assertEqual(operation.deleted, 2)
+        self.assertEqual(
+            Job.objects.filter(name=deletion.JOB_NAME).count(), 2,
+        )
+
+    def test_leftover_files_removed(self):
+        """Test files of a run that stopped early are removed"""
+        operation = DeletionOperation.objects.create(
+            user=self.user, kind=DeletionOperation.RECIPES,
+            pending_files=[self.recipes[0].image.name],
+        )
+
+        deletion.run(operation.id)
+
+        operation.refresh_from_db()
+        self.assertEqual(operation.pending_files, [])
+        self.assertFalse(os.path.exists(self.image_path))
+
+    def test_replication_lag_without_replicas(self):
+        """Test no replica means no lag"""
+        self.assertEqual(deletion.replication_lag(), 0)
+
+    @patch('core.deletion.time.sleep')
+    @patch('core.deletion.replication_lag', side_effect=[10, 10, 0])
+    def test_wait_for_replicas(self, patched_lag, patched_sleep):
+        """Test batches wait while replicas lag behind"""
+        self.assertTrue(deletion._wait_for_replicas(float('inf')))
+
+        self.assertEqual(patched_lag.call_count, 3)
+        self.assertEqual(patched_sleep.call_count, 2)
+
+    @override_settings(DELETION_TIME_BUDGET=0)
+    @patch('core.deletion.replication_lag', return_value=10)
+    def test_lagging_replicas_delay_job(self, patched_lag):
+        """Test no batch is deleted while replicas lag, job comes later"""
+        operation = deletion.delete_recipes(
+            self.user, [recipe.id for recipe in self.recipes],
+        )
+
+        deletion.run(operation.id)
+
+        operation.refresh_from_db()
+        self.assertEqual(operation.deleted, 0)
+        later = Job.objects.filter(name=deletion.JOB_NAME).latest('id')
+        self.assertGreater(later.run_at, later.created_at)
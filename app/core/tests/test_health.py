@@ -0,0 +1,77 @@
+"""
+Tests for liveness/readiness probes (core/health.py)
+"""
+from unittest.mock import patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import health
+
+
+class HealthTests(TestCase):
+    """Tests for /healthz and /readyz"""
+
+    def setUp(self):
+        health.reset()
+        self.addCleanup(health.reset)
+
+    def test_healthz(self):
+        """Test liveness answers without touching the database"""
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse('healthz'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Cache-Control'], 'no-store')
+
+    def test_probe_any_host(self):
+        """Test probes from hosts not in ALLOWED_HOSTS are answered"""
+        res = self.client.get('/healthz', HTTP_HOST='10.1.2.3')
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_readyz(self):
+        """Test ready once database is up and migrated"""
+        res = self.client.get(reverse('readyz'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, b'ready')
+
+    def test_readyz_cached(self):
+        """Test a ready result is reused for a few seconds"""
+        self.client.get(reverse('readyz'))
+
+        with self.assertNumQueries(0):
+            res = self.client.get(reverse('readyz'))
+
+        self.assertEqual(res.status_code, 200)
+
+    @override_settings(READYZ_CACHE_SECONDS=0)
+    def test_readyz_migrations_once(self):
+        """Test migrations are not looked up again once applied"""
+        self.client.get(reverse('readyz'))
+
+        # Only the database is checked again
+        with self.assertNumQueries(1):
+            self.client.get(reverse('readyz'))
+
+    @patch('core.health.database_ok', return_value=False)
+    def test_readyz_database_down(self, patched_database_ok):
+        """Test not ready while the database is unavailable"""
+        res = self.client.get(reverse('readyz'))
+
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.content, b'database unavailable')
+
+    @patch('core.health.MigrationExecutor.migration_plan')
+    def test_readyz_migrations_pending(self, patched_plan):
+        """Test not ready until every migration is applied"""
+        patched_plan.return_value = [('core', False)]
+
+        res = self.client.get(reverse('readyz'))
+        self.assertEqual(res.status_code, 503)
+
+        # Failures are not cached
+        patched_plan.return_value = []
+        res = self.client.get(reverse('readyz'))
+        self.assertEqual(res.status_code, 200)
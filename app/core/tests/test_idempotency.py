@@ -0,0 +1,227 @@
+"""
+Tests for Idempotency-Key handling
+"""
+import datetime
+import os
+import tempfile
+import threading
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.idempotency import REPLAYED_HEADER
+from core.models import IdempotencyKey, Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def payload(**params):
+    """Recipe create payload"""
+    defaults = {
+        'title': 'Retried recipe',
+        'minute_to_make_recipe': 10,
+        'price': Decimal('4.50'),
+        'description': 'Sent twice',
+    }
+    defaults.update(params)
+    return defaults
+
+
+def create_user(email='idem@example.com'):
+    return get_user_model().objects.create_user(
+        email=email, password='testpassword123',
+    )
+
+
+class IdempotencyKeyTests(TestCase):
+    """Test replay of requests with an Idempotency-Key"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, data, key='key-1'):
+        return self.client.post(
+            RECIPES_URL, data, format='json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_duplicate_create_replayed(self):
+        """Test same key creates one recipe and replays the response"""
+        first = self.post(payload())
+        second = self.post(payload())
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second[REPLAYED_HEADER], 'true')
+        self.assertNotIn(REPLAYED_HEADER, first)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_without_key_not_deduplicated(self):
+        """Test requests without the header run every time"""
+        self.client.post(RECIPES_URL, payload(), format='json')
+        self.client.post(RECIPES_URL, payload(), format='json')
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_key_reused_for_other_request(self):
+        """Test same key with a different body is rejected"""
+        self.post(payload())
+        res = self.post(payload(title='Something else'))
+
+        self.assertEqual(res.status_code,
+                         status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+
+    def test_error_response_not_stored(self):
+        """Test a failed request releases the key"""
+        res = self.post(payload(title=''))
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        res = self.post(payload())
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_keys_scoped_per_user(self):
+        """Test other user can use the same key"""
+        self.post(payload())
+
+        other = APIClient()
+        other.force_authenticate(create_user('other@example.com'))
+        res = other.post(RECIPES_URL, payload(), format='json',
+                         HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertNotIn(REPLAYED_HEADER, res)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    @override_settings(IDEMPOTENCY_KEY_TTL=60)
+    def test_expired_key_runs_again(self):
+        """Test key older than the TTL is not replayed"""
+        self.post(payload())
+        IdempotencyKey.objects.update(
+            created_at=timezone.now() - datetime.timedelta(seconds=120),
+        )
+
+        res = self.post(payload())
+
+        self.assertNotIn(REPLAYED_HEADER, res)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_KEY_TTL=60)
+    def test_purge_command(self):
+        """Test purge deletes only expired keys"""
+        self.post(payload(), key='old')
+        IdempotencyKey.objects.update(
+            created_at=timezone.now() - datetime.timedelta(seconds=120),
+        )
+        self.post(payload(), key='new')
+
+        call_command('purge_idempotency_keys', stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list('key', flat=True)),
+            ['new'],
+        )
+
+    def test_upload_image_replayed(self):
+        """Test retried upload does not store the image again"""
+        recipe = Recipe.objects.create(user=self.user, **payload())
+        url = reverse('recipe:recipe-upload-image', args=[recipe.id])
+
+        with tempfile.TemporaryDirectory() as media, \
+                override_settings(MEDIA_ROOT=media):
+            responses = []
+            for _ in range(2):
+                with tempfile.NamedTemporaryFile(suffix='.jpg') as image:
+                    Image.new('RGB', (10, 10)).save(image, format='JPEG')
+                    image.seek(0)
+                    responses.append(self.client.post(
+                        url, {'image': image}, format='multipart',
+                        HTTP_IDEMPOTENCY_KEY='upload-1',
+                    ))
+
+            files = [name for _, _, names in os.walk(media) for name in names]
+
+        self.assertEqual(responses[0].status_code, status.HTTP_200_OK)
+        self.assertEqual(responses[1][REPLAYED_HEADER], 'true')
+        self.assertEqual(responses[1].json(), responses[0].json())
+        self.assertEqual(len(files), 1)
+
+
+class ConcurrentIdempotencyKeyTests(TransactionTestCase):
+    """Test duplicate sent while the first request is running"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _hold_key(self, claimed, release, digest='x', data=None):
+        """Claim the key like a first request still in progress"""
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=self.user, key='slow', fingerprint=digest,
+                )
+                claimed.set()
+                release.wait(10)
+                record.status_code = 201
+                record.response = data
+                record.save()
+        finally:
+            connection.close()
+
+    def _post_while_held(self, release_after=None, **hold):
+        """POST with the held key, release the holder after a delay"""
+        claimed, release = threading.Event(), threading.Event()
+        thread = threading.Thread(
+            target=self._hold_key, args=(claimed, release), kwargs=hold,
+        )
+        thread.start()
+        claimed.wait(10)
+
+        if release_after is not None:
+            threading.Timer(release_after, release.set).start()
+        try:
+            return self.client.post(RECIPES_URL, payload(), format='json',
+                                    HTTP_IDEMPOTENCY_KEY='slow')
+        finally:
+            release.set()
+            thread.join()
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0.2)
+    def test_duplicate_waits_then_conflicts(self):
+        """Test duplicate gets 409 when the first one takes too long"""
+        res = self._post_while_held()
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_duplicate_waits_for_result(self):
+        """Test duplicate blocks until the first commits, then replays"""
+
+        # Same request under another key, to get its fingerprint
+        self.client.post(RECIPES_URL, payload(), format='json',
+                         HTTP_IDEMPOTENCY_KEY='probe')
+        digest = IdempotencyKey.objects.get(key='probe').fingerprint
+
+        res = self._post_while_held(
+            release_after=0.3, digest=digest, data={'id': 'first'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res[REPLAYED_HEADER], 'true')
+        self.assertEqual(res.json(), {'id': 'first'})
+        self.assertEqual(Recipe.objects.count(), 1)
@@ -0,0 +1,143 @@
+"""
+Tests for the invalidation bus
+"""
+import threading
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from core import invalidation
+from core.models import Recipe
+
+
+def notify(payload):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)',
+                       [invalidation.CHANNEL, payload])
+
+
+class ParseTests(TestCase):
+    """Test decoding NOTIFY payloads"""
+
+    def test_merges_and_skips_own(self):
+        """Test payloads are merged, own messages skipped"""
+        messages = invalidation.parse(
+            ['1|recipes:4,user:4', '2|recipes:5', '3|recipes:4'],
+            own_pid=2,
+        )
+
+        self.assertEqual(messages, {'recipes': {'4'}, 'user': {'4'}})
+
+    def test_flush_all(self):
+        """Test a flush payload drops everything"""
+        self.assertIsNone(invalidation.parse(['1|recipes:4', '2|*']))
+
+
+class PublishTests(TestCase):
+    """Test publishing of changes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='bus@example.com', password='testpassword123',
+        )
+
+    def test_one_notify_per_transaction(self):
+        """Test changes of one transaction are sent together"""
+        with CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                recipe = Recipe.objects.create(
+                    user=self.user, title='Bus', minute_to_make_recipe=1,
+                    price=Decimal('1.00'), description='Bus',
+                )
+                recipe.title = 'Bus 2'
+                recipe.save()
+
+        notifies = [query['sql'] for query in queries
+                    if 'pg_notify' in query['sql']]
+        self.assertEqual(len(notifies), 1)
+        self.assertIn(f'recipes:{self.user.id}', notifies[0])
+
+    def test_applied_locally_at_once(self):
+        """Test subscribers of this worker run before commit"""
+        received = []
+        invalidation.subscribe('test-local', received.append)
+        self.addCleanup(invalidation._subscribers.pop, 'test-local')
+
+        invalidation.publish('test-local', 7)
+
+        self.assertEqual(received, [{'7'}])
+
+    def test_remote_only_skipped_locally(self):
+        """Test remote only subscribers just get other workers messages"""
+        received = []
+        invalidation.subscribe('test-remote', received.append,
+                               remote_only=True)
+        self.addCleanup(invalidation._subscribers.pop, 'test-remote')
+
+        invalidation.publish('test-remote', 7)
+        self.assertEqual(received, [])
+
+        invalidation.apply({'test-remote': {'8'}}, remote=True)
+        self.assertEqual(received, [{'8'}])
+
+
+class ListenerTests(TransactionTestCase):
+    """Test the listener thread against the database"""
+
+    def setUp(self):
+        self.received = []
+        self.event = threading.Event()
+        invalidation.subscribe('test', self._received)
+        self.addCleanup(invalidation._subscribers.pop, 'test')
+
+        self.listener = invalidation.Listener(
+            connection.settings_dict, coalesce=0.2, keepalive=0.1,
+            retry=0.05,
+        )
+        # Messages of this test are sent from this process
+        self.listener.pid = -1
+        self.listener.start()
+        self.addCleanup(self.listener.join)
+        self.addCleanup(self.listener.stop)
+        self.assertTrue(self.listener.listening.wait(5))
+
+        # Forget the flush done when it connected
+        self.event.clear()
+        self.received.clear()
+
+    def _received(self, keys):
+        self.received.append(keys)
+        self.event.set()
+
+    def _wait(self):
+        self.assertTrue(self.event.wait(5))
+        self.event.clear()
+
+    def test_burst_applied_once(self):
+        """Test messages arriving together are applied together"""
+        for key in ['1', '2', '1']:
+            notify(f'99|test:{key}')
+
+        self._wait()
+
+        self.assertEqual(self.received, [{'1', '2'}])
+
+    def test_reconnect_flushes(self):
+        """Test everything is dropped after the connection is lost"""
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)',
+                           [self.listener.backend_pid])
+
+        self._wait()
+        self.assertEqual(self.received, [None])
+
+        # Listening again
+        self.assertTrue(self.listener.listening.wait(5))
+        notify('99|test:3')
+        self._wait()
+        self.assertEqual(self.received[-1], {'3'})
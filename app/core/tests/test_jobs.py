@@ -0,0 +1,202 @@
+"""
+Tests for the background job queue
+"""
+import datetime
+import os
+import threading
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job, Tag
+
+
+@jobs.register('test.create_tag')
+def create_tag(user_id, name):
+    Tag.objects.create(user_id=user_id, name=name)
+
+
+@jobs.register('test.fail', max_attempts=2)
+def fail():
+    raise ValueError('Job failed')
+
+
+class JobQueueTests(TestCase):
+    """Test enqueue, claim and run"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='jobs@example.com', password='testpassword123',
+        )
+
+    def test_enqueue_unknown_job(self):
+        """Test only registered jobs can be queued"""
+        with self.assertRaises(KeyError):
+            jobs.enqueue('test.missing')
+
+    def test_claim_order(self):
+        """Test higher priority first, then oldest, later ones wait"""
+        low = jobs.enqueue('test.fail', priority=0)
+        high = jobs.enqueue('test.fail', priority=5)
+        jobs.enqueue('test.fail', priority=10, delay=60)
+
+        self.assertEqual(jobs.claim('w').id, high.id)
+        self.assertEqual(jobs.claim('w').id, low.id)
+        self.assertIsNone(jobs.claim('w'))
+
+    def test_run_success(self):
+        """Test job function gets the payload, job is done"""
+        jobs.enqueue('test.create_tag',
+                     {'user_id': self.user.id, 'name': 'From job'})
+
+        job = jobs.claim('w')
+        outcome = jobs.run(job)
+
+        job.refresh_from_db()
+        self.assertEqual(outcome, 'done')
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertTrue(Tag.objects.filter(name='From job').exists())
+
+    @override_settings(JOB_RETRY_BASE_DELAY=10)
+    def test_retry_then_fail(self):
+        """Test failing job is retried later, then marked failed"""
+        jobs.enqueue('test.fail')
+
+        job = jobs.claim('w')
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(jobs.run(job), 'retry')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('Job failed', job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIsNone(jobs.claim('w'))
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.assertEqual(jobs.run(jobs.claim('w')), 'failed')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    @override_settings(JOB_RETRY_BASE_DELAY=10, JOB_RETRY_MAX_DELAY=60)
+    def test_backoff(self):
+        """Test delay doubles with jitter and is capped"""
+        self.assertTrue(5 <= jobs.backoff(1) <= 10)
+        self.assertTrue(20 <= jobs.backoff(3) <= 40)
+        self.assertTrue(30 <= jobs.backoff(10) <= 60)
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_reclaim_stale(self):
+        """Test job of a dead worker is queued again"""
+        jobs.enqueue('test.fail')
+        job = jobs.claim('dead')
+        Job.objects.update(
+            locked_at=timezone.now() - datetime.timedelta(seconds=120),
+        )
+
+        self.assertEqual(jobs.reclaim_stale(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('dead', job.last_error)
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_reclaimed_job_not_overwritten(self):
+        """Test a worker finishing a reclaimed job leaves it alone"""
+        jobs.enqueue('test.create_tag',
+                     {'user_id': self.user.id, 'name': 'Slow'})
+        slow = jobs.claim('slow')
+        Job.objects.update(
+            locked_at=timezone.now() - datetime.timedelta(seconds=120),
+        )
+        jobs.reclaim_stale()
+        Job.objects.update(run_at=timezone.now())
+        again = jobs.claim('other')
+
+        with self.assertLogs('core.jobs', 'WARNING'):
+            self.assertEqual(jobs.run(slow), 'lost')
+
+        again.refresh_from_db()
+        self.assertEqual(again.status, Job.RUNNING)
+        self.assertEqual(again.locked_by, 'other')
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_heartbeat_keeps_job(self):
+        """Test a job of a live worker is not reclaimed"""
+        jobs.enqueue('test.fail')
+        jobs.claim('alive')
+        Job.objects.update(
+            locked_at=timezone.now() - datetime.timedelta(seconds=120),
+        )
+
+        self.assertEqual(jobs.heartbeat(['alive']), 1)
+        self.assertEqual(jobs.reclaim_stale(), 0)
+
+    @override_settings(PERIODIC_JOBS={'test.fail': 3600})
+    def test_schedule_periodic(self):
+        """Test periodic job queued once, next one an interval later"""
+        self.assertEqual(len(jobs.schedule_periodic()), 1)
+        self.assertEqual(jobs.schedule_periodic(), [])
+
+        job = jobs.claim('w')
+        Job.objects.update(status=Job.DONE)
+        queued = jobs.schedule_periodic()
+
+        self.assertEqual(len(queued), 1)
+        self.assertEqual(
+            queued[0].run_at, job.run_at + datetime.timedelta(hours=1),
+        )
+
+
+class JobWorkerTests(TransactionTestCase):
+    """Test concurrent workers"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='workers@example.com', password='testpassword123',
+        )
+
+    def test_claim_skips_locked(self):
+        """Test a job locked by another worker is skipped, not waited on"""
+        first = jobs.enqueue('test.fail', priority=1)
+        second = jobs.enqueue('test.fail')
+        locked, release = threading.Event(), threading.Event()
+
+        def hold():
+            with transaction.atomic():
+                Job.objects.select_for_update().get(id=first.id)
+                locked.set()
+                release.wait(10)
+            connection.close()
+
+        thread = threading.Thread(target=hold)
+        thread.start()
+        locked.wait(10)
+        try:
+            self.assertEqual(jobs.claim('w').id, second.id)
+        finally:
+            release.set()
+            thread.join()
+
+    def _run_workers(self, **options):
+        for index in range(6):
+            jobs.enqueue('test.create_tag',
+                         {'user_id': self.user.id, 'name': f'Tag {index}'})
+
+        call_command('run_workers', burst=True, poll_interval=0.1,
+                     stdout=open(os.devnull, 'w'), **options)
+
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 6)
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 6)
+
+    def test_run_workers_threads(self):
+        """Test thread pool runs every job once"""
+        self._run_workers(threads=3)
+
+    def test_run_workers_processes(self):
+        """Test process pool runs every job once"""
+        self._run_workers(threads=2, processes=2)
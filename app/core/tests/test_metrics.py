@@ -0,0 +1,55 @@
+"""
+Tests for metrics middleware and endpoint
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+URL_METRICS = reverse('metrics')
+URL_RECIPE = reverse('recipe:recipe-list')
+
+
+class MetricsTests(TestCase):
+    """Test metrics collected per route"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='metrics@example.com',
+            password='testpassword123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_metrics_endpoint(self):
+        """Test metrics are exposed in prometheus format"""
+        res = self.client.get(URL_METRICS)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'django_http_request_duration_seconds', res.content)
+
+    def test_request_labeled_by_route(self):
+        """Test request metrics use resolved route name as label"""
+        self.client.get(URL_RECIPE)
+
+        res = self.client.get(URL_METRICS)
+        lines = res.content.decode().splitlines()
+
+        # Label order in output depends on client version
+        route = 'route="recipe:recipe-list"'
+        for name in ['django_http_db_queries_count',
+                     'django_http_response_size_bytes_count',
+                     'django_http_responses_total']:
+            self.assertTrue(any(
+                line.startswith(name) and route in line for line in lines
+            ), name)
+
+    def test_unresolved_route(self):
+        """Test unknown urls are grouped under one label"""
+        self.client.get('/does-not-exist/')
+
+        res = self.client.get(URL_METRICS)
+
+        self.assertIn('route="<unresolved>"', res.content.decode())
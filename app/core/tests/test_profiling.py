@@ -0,0 +1,112 @@
+"""
+Tests for on demand request profiler
+"""
+import os
+import pstats
+import tempfile
+import shutil
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import RequestProfile
+
+URL_RECIPE = reverse('recipe:recipe-list')
+
+
+class ProfilerMiddlewareTests(TestCase):
+    """Test profiling requests"""
+
+    def setUp(self):
+        self.profile_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            PROFILE_ROOT=self.profile_root,
+        )
+        self.settings_override.enable()
+
+        self.staff = get_user_model().objects.create_user(
+            email='staff@example.com',
+            password='testpassword123',
+            is_staff=True,
+        )
+        token = Token.objects.create(user=self.staff)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.profile_root)
+
+    def test_profile_with_query_flag(self):
+        """Test staff request is profiled and stored as pstats"""
+        res = self.client.get(URL_RECIPE, {'profile': '1'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(res['X-Profile'], profile.file_name)
+        self.assertEqual(profile.user, self.staff)
+        self.assertEqual(profile.mode, 'cprofile')
+
+        # File can be loaded by pstats
+        path = os.path.join(self.profile_root, profile.file_name)
+        self.assertGreater(pstats.Stats(path).total_calls, 0)
+
+    def test_profile_with_header_flamegraph(self):
+        """Test flamegraph mode returns collapsed stacks"""
+        res = self.client.get(URL_RECIPE, HTTP_X_PROFILE='flamegraph')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('attachment', res['Content-Disposition'])
+        self.assertTrue(res['X-Profile'].endswith('.collapsed'))
+        self.assertEqual(RequestProfile.objects.get().mode, 'flamegraph')
+
+    def test_non_staff_not_profiled(self):
+        """Test flag is ignored for normal users"""
+        user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpassword123',
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+
+        res = client.get(URL_RECIPE, {'profile': '1'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('X-Profile', res)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_admin_download_profile(self):
+        """Test admin lists and downloads profiles"""
+        self.client.get(URL_RECIPE, {'profile': '1'})
+        profile = RequestProfile.objects.get()
+
+        admin_client = APIClient()
+        admin_client.force_login(get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testpassword123',
+        ))
+
+        res = admin_client.get(reverse('admin:core_requestprofile_changelist'))
+        self.assertContains(res, profile.file_name)
+
+        res = admin_client.get(reverse(
+            'admin:core_requestprofile_download', args=[profile.id]
+        ))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_admin_download_needs_view_permission(self):
+        """Test staff without permission can't download profiles"""
+        self.client.get(URL_RECIPE, {'profile': '1'})
+        profile = RequestProfile.objects.get()
+
+        admin_client = APIClient()
+        admin_client.force_login(self.staff)
+
+        res = admin_client.get(reverse(
+            'admin:core_requestprofile_download', args=[profile.id]
+        ))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,81 @@
+"""
+Tests for the precomputed OpenAPI schema
+"""
+import gzip
+import io
+import json
+import tempfile
+
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core import schema
+
+SCHEMA_URL = reverse('api-schema')
+
+
+class SchemaTests(SimpleTestCase):
+    """Test schema files and the schema endpoint"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+
+        override = override_settings(SCHEMA_ROOT=tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        schema.reset()
+        self.addCleanup(schema.reset)
+
+    def test_build_once_per_code(self):
+        """Test files are written once, again when the code changes"""
+        out = io.StringIO()
+        call_command('build_schema', stdout=out)
+        call_command('build_schema', stdout=out)
+
+        self.assertIn('written', out.getvalue())
+        self.assertIn('up to date', out.getvalue())
+        first = sorted(path.name for path in self.root.iterdir())
+        self.assertEqual(len(first), 2)
+
+        # Settings are part of the fingerprint, like the code
+        schema.reset()
+        with override_settings(SPECTACULAR_SETTINGS={
+            **settings.SPECTACULAR_SETTINGS, 'TITLE': 'Changed',
+        }):
+            call_command('build_schema', stdout=out)
+
+        second = sorted(path.name for path in self.root.iterdir())
+        self.assertEqual(len(second), 2)
+        self.assertNotEqual(first, second)
+
+    def test_served_with_etag(self):
+        """Test schema formats, ETag and 304"""
+        res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], schema.FORMATS['yaml'])
+        self.assertTrue(res.content.startswith(b'openapi:'))
+
+        res = self.client.get(SCHEMA_URL, {'format': 'json'})
+        self.assertIn('/api/recipe/recipes/', json.loads(res.content)['paths'])
+
+        res = self.client.get(SCHEMA_URL, {'format': 'json'},
+                              HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(res.status_code, 304)
+
+    def test_gzip(self):
+        """Test gzipped schema has its own ETag"""
+        plain = self.client.get(SCHEMA_URL)
+        res = self.client.get(SCHEMA_URL, HTTP_ACCEPT_ENCODING='gzip, br')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+        self.assertNotEqual(res['ETag'], plain['ETag'])
+        self.assertIn('Accept-Encoding', res['Vary'])
@@ -0,0 +1,92 @@
+"""
+Tests for seed_data command
+"""
+import io
+
+from collections import Counter
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+
+from core.management.commands.seed_data import Command
+from core.models import User, Recipe, Tag, Ingredient
+
+
+def seed(**options):
+    """Run seed_data with small defaults"""
+    defaults = {
+        'users': 5, 'recipes': 120, 'tags': 10, 'ingredients': 20,
+        'batch_size': 50, 'stdout': io.StringIO(),
+    }
+    defaults.update(options)
+    call_command('seed_data', **defaults)
+
+
+def snapshot(prefix):
+    """Generated recipe content of users with prefix"""
+    recipes = Recipe.objects.filter(
+        user__email__startswith=f'{prefix}-',
+    ).prefetch_related('tags', 'ingredients')
+
+    return Counter(
+        (
+            recipe.user.email.split('@')[0].split('-')[1],
+            recipe.title,
+            recipe.minute_to_make_recipe,
+            recipe.price,
+            tuple(sorted(tag.name for tag in recipe.tags.all())),
+            tuple(sorted(item.name for item in recipe.ingredients.all())),
+        )
+        for recipe in recipes.select_related('user')
+    )
+
+
+class SeedDataTests(TestCase):
+    """Test synthetic data generation"""
+
+    def test_seed_counts(self):
+        """Test configured cardinalities are created"""
+        seed()
+
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Recipe.objects.count(), 120)
+        self.assertEqual(Tag.objects.count(), 5 * 10)
+        self.assertEqual(Ingredient.objects.count(), 5 * 20)
+        self.assertTrue(Recipe.tags.through.objects.exists())
+
+    def test_seed_is_deterministic(self):
+        """Test same seed generates same data"""
+        seed(email_prefix='first')
+        seed(email_prefix='second')
+
+        self.assertEqual(snapshot('first'), snapshot('second'))
+
+    def test_popularity_is_skewed(self):
+        """Test most popular tag is used more than least popular"""
+        seed(users=1, recipes=300)
+
+        usage = Counter(
+            Recipe.tags.through.objects.values_list('tag__name', flat=True)
+        )
+
+        self.assertGreater(usage['tag-0'], usage['tag-9'] * 2)
+
+    def test_existing_prefix_rejected(self):
+        """Test seeding twice with same prefix fails"""
+        seed()
+
+        with self.assertRaises(CommandError):
+            seed()
+
+    def test_copy_escapes_values(self):
+        """Test COPY keeps special characters and NULL as they are"""
+        rows = [('a\tb\nc\rd\\e', None), ('plain', 'N')]
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE TEMP TABLE copy_test (a text, b text)')
+
+            Command()._copy('copy_test', ['a', 'b'], rows)
+
+            cursor.execute('SELECT a, b FROM copy_test ORDER BY b')
+            self.assertEqual(cursor.fetchall(), [rows[1], rows[0]])
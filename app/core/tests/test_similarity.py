@@ -0,0 +1,72 @@
+"""
+Tests for MinHash/LSH similarity
+"""
+import io
+import random
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from core import similarity
+from core.models import Recipe, RecipeBucket, RecipeSignature, Tag
+
+
+class MinHashTests(TestCase):
+    """Test signatures estimate Jaccard similarity"""
+
+    def test_estimate_close_to_exact(self):
+        """Test estimate error stays small on random sets"""
+        rng = random.Random(1)
+        for _ in range(20):
+            universe = [f't{index}' for index in range(40)]
+            first = set(rng.sample(universe, 15))
+            second = set(rng.sample(universe, 15))
+
+            estimated = similarity.estimate(
+                similarity.minhash(first), similarity.minhash(second),
+            )
+            self.assertAlmostEqual(
+                estimated, similarity.jaccard(first, second), delta=0.2,
+            )
+
+    def test_identical_sets_share_every_band(self):
+        """Test same set gives same signature and buckets"""
+        signature = similarity.minhash({'t1', 'i2', 'i3'})
+
+        self.assertEqual(signature, similarity.minhash({'i3', 't1', 'i2'}))
+        self.assertEqual(len(set(similarity.band_keys(signature))),
+                         similarity.BANDS)
+
+
+class BuildIndexCommandTests(TestCase):
+    """Test build_similarity_index command"""
+
+    def test_build_and_recall(self):
+        """Test every recipe with links is indexed, recall reported"""
+        user = get_user_model().objects.create_user(
+            email='similar@example.com', password='testpassword123',
+        )
+        tags = [Tag.objects.create(user=user, name=f'Tag {index}')
+                for index in range(6)]
+        for index in range(5):
+            recipe = Recipe.objects.create(
+                user=user, title=f'Recipe {index}', minute_to_make_recipe=1,
+                price=Decimal('1.00'), description='Similar',
+            )
+            recipe.tags.add(*tags[index:index + 3])
+        Recipe.objects.create(
+            user=user, title='No links', minute_to_make_recipe=1,
+            price=Decimal('1.00'), description='Similar',
+        )
+        RecipeSignature.objects.all().delete()
+        RecipeBucket.objects.all().delete()
+
+        out = io.StringIO()
+        call_command('build_similarity_index', recall=5, stdout=out)
+
+        self.assertEqual(RecipeSignature.objects.count(), 5)
+        self.assertEqual(RecipeBucket.objects.count(), 5 * similarity.BANDS)
+        self.assertIn('recall@10', out.getvalue())
@@ -0,0 +1,111 @@
+"""
+Tests for static files storage and sync_static command
+"""
+import gzip
+import json
+import tempfile
+
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+import brotli
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from core.storage import CompressedManifestStaticFilesStorage
+
+CSS = 'body { color: #333; }\n' * 50
+
+
+class StaticStorageTests(SimpleTestCase):
+    """Tests for hashed and compressed static files"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.sources = Path(tmp.name) / 'sources'
+        self.root = Path(tmp.name) / 'static'
+        (self.sources / 'site').mkdir(parents=True)
+        (self.sources / 'site' / 'site.css').write_text(CSS)
+        (self.sources / 'site' / 'tiny.js').write_text('var a = 1;\n')
+
+        settings = override_settings(
+            STATIC_ROOT=str(self.root),
+            STATICFILES_DIRS=[str(self.sources)],
+            # App files (admin, DRF) would make every test slow
+            STATICFILES_FINDERS=[
+                'django.contrib.staticfiles.finders.FileSystemFinder',
+            ],
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def sync(self, *args):
+        out = StringIO()
+        call_command('sync_static', *args, stdout=out)
+        return out.getvalue()
+
+    def test_hashed_and_compressed(self):
+        """Test files get hashed names, .gz and .br siblings"""
+        self.sync()
+
+        manifest = json.loads((self.root / 'staticfiles.json').read_text())
+        hashed = self.root / manifest['paths']['site/site.css']
+        self.assertNotEqual(hashed.name, 'site.css')
+        self.assertEqual(
+            gzip.decompress(Path(f'{hashed}.gz').read_bytes()).decode(), CSS,
+        )
+        self.assertEqual(
+            brotli.decompress(Path(f'{hashed}.br').read_bytes()).decode(),
+            CSS,
+        )
+
+    def test_small_files_not_compressed(self):
+        """Test files too small to benefit are left alone"""
+        self.sync()
+
+        manifest = json.loads((self.root / 'staticfiles.json').read_text())
+        hashed = self.root / manifest['paths']['site/tiny.js']
+        self.assertTrue(hashed.exists())
+        self.assertFalse(Path(f'{hashed}.gz').exists())
+
+    def test_skipped_when_current(self):
+        """Test collectstatic does not run again for the same sources"""
+        self.sync()
+
+        with patch('core.management.commands.sync_static.call_command') \
+                as patched_collect:
+            out = self.sync()
+
+        patched_collect.assert_not_called()
+        self.assertIn('up to date', out)
+
+    def test_collected_when_changed(self):
+        """Test a changed source is collected again"""
+        self.sync()
+        (self.sources / 'site' / 'site.css').write_text(CSS + 'p {}\n')
+
+        self.sync()
+
+        manifest = json.loads((self.root / 'staticfiles.json').read_text())
+        hashed = self.root / manifest['paths']['site/site.css']
+        self.assertTrue(hashed.read_text().endswith('p {}\n'))
+        self.assertTrue(Path(f'{hashed}.gz').exists())
+
+    def test_url_hashed(self):
+        """Test URLs point to hashed names once collected"""
+        self.sync()
+
+        # As a worker started after collecting
+        url = CompressedManifestStaticFilesStorage().url('site/site.css')
+
+        self.assertRegex(url, r'/site/site\.[0-9a-f]{12}\.css$')
+
+    def test_url_without_manifest(self):
+        """Test plain names are used when nothing was collected"""
+        url = staticfiles_storage.url('site/site.css')
+
+        self.assertTrue(url.endswith('/site/site.css'))
@@ -0,0 +1,179 @@
+"""
+Tests for the shared memory throttle
+"""
+import multiprocessing
+import os
+import tempfile
+
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.throttling import BucketTable, SharedMemoryThrottle
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TOKEN_URL = reverse('user:token')
+
+RATES = {'read': '2/min', 'write': '1/min', 'upload': '1/min'}
+
+
+def _drain(path, key):
+    """Take tokens from another process"""
+    table = BucketTable(path, 64)
+    table.take(key, 2, 0.001)
+    table.take(key, 2, 0.001)
+
+
+class BucketTableTests(TestCase):
+    """Test token buckets of the shared table"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'buckets')
+        self.table = BucketTable(self.path, 64)
+        self.addCleanup(self.table.close)
+
+    @patch('core.throttling.time.time')
+    def test_refill(self, patched_time):
+        """Test empty bucket refills with time"""
+        patched_time.return_value = 1000.0
+        self.assertEqual(self.table.take('key', 1, 0.5), 0)
+
+        # Empty, one token comes back in 2 seconds
+        self.assertEqual(self.table.take('key', 1, 0.5), 2)
+
+        patched_time.return_value = 1002.0
+        self.assertEqual(self.table.take('key', 1, 0.5), 0)
+
+    def test_shared_between_processes(self):
+        """Test tokens taken by another process are gone here"""
+        process = multiprocessing.get_context('fork').Process(
+            target=_drain, args=(self.path, 'key'),
+        )
+        process.start()
+        process.join()
+
+        self.assertGreater(self.table.take('key', 2, 0.001), 0)
+
+    def test_full_group_evicts_oldest(self):
+        """Test a new key takes over the least recently used slot"""
+        table = BucketTable(self.path + '-small', 4)
+        self.addCleanup(table.close)
+
+        for index in range(5):
+            table.take(f'key-{index}', 1, 0.001)
+
+        # key-0 was evicted and starts with a full bucket
+        self.assertEqual(table.take('key-0', 1, 0.001), 0)
+
+
+class ThrottleAPITests(TestCase):
+    """Test throttling of API requests"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        overrides = override_settings(
+            THROTTLE_TABLE_PATH=os.path.join(directory.name, 'buckets'),
+            REST_FRAMEWORK={
+                **settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': RATES,
+            },
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.user = get_user_model().objects.create_user(
+            email='throttle@example.com', password='testpassword123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_read_limit(self):
+        """Test reads over the budget get 429 with Retry-After"""
+        for _ in range(2):
+            res = self.client.get(RECIPES_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertGreater(int(res['Retry-After']), 0)
+
+    def test_scopes_have_own_budget(self):
+        """Test reads, writes and uploads are counted separately"""
+        recipe = Recipe.objects.create(
+            user=self.user, title='Throttled', minute_to_make_recipe=1,
+            price=Decimal('1.00'), description='Throttled',
+        )
+        self.client.get(RECIPES_URL)
+        self.client.get(RECIPES_URL)
+
+        res = self.client.patch(
+            reverse('recipe:recipe-detail', args=[recipe.id]),
+            {'title': 'Changed'},
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.post(
+            reverse('recipe:recipe-upload-image', args=[recipe.id]),
+            {'image': 'notimage'}, format='multipart',
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.post(
+            reverse('recipe:recipe-upload-image', args=[recipe.id]),
+            {'image': 'notimage'}, format='multipart',
+        )
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_users_have_own_budget(self):
+        """Test one user using the budget does not limit another"""
+        for _ in range(3):
+            self.client.get(RECIPES_URL)
+
+        other = APIClient()
+        other.force_authenticate(get_user_model().objects.create_user(
+            email='other@example.com', password='testpassword123',
+        ))
+
+        self.assertEqual(other.get(RECIPES_URL).status_code,
+                         status.HTTP_200_OK)
+
+    def test_anonymous_limited_per_ip(self):
+        """Test anonymous requests are counted per client IP"""
+        client = APIClient()
+        payload = {'email': 'nobody@example.com', 'password': 'wrong'}
+
+        res = client.post(TOKEN_URL, payload, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = client.post(TOKEN_URL, payload, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        res = client.post(TOKEN_URL, payload, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_forwarded_for_ignored(self):
+        """Test a forged X-Forwarded-For doesn't reset the budget"""
+        client = APIClient()
+        payload = {'email': 'nobody@example.com', 'password': 'wrong'}
+
+        client.post(TOKEN_URL, payload, REMOTE_ADDR='10.0.0.1',
+                    HTTP_X_FORWARDED_FOR='1.1.1.1')
+        res = client.post(TOKEN_URL, payload, REMOTE_ADDR='10.0.0.1',
+                          HTTP_X_FORWARDED_FOR='2.2.2.2')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_zero_rate_rejected(self):
+        """Test a rate of 0 requests is a configuration error"""
+        with self.assertRaises(ImproperlyConfigured):
+            SharedMemoryThrottle().parse_rate('0/min')
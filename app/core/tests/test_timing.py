@@ -0,0 +1,109 @@
+"""
+Tests for Server-Timing middleware and slow request log
+"""
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.metrics import QueryTimer
+from core.timing import RequestTimings
+
+URL_RECIPE = reverse('recipe:recipe-list')
+
+
+def parse_server_timing(value):
+    """Return dict of phase name to duration"""
+    phases = {}
+    for item in value.split(','):
+        name, duration = item.strip().split(';dur=')
+        phases[name] = float(duration)
+    return phases
+
+
+class ServerTimingTests(TestCase):
+    """Test timing header and slow request log"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email='timing@example.com',
+            password='testpassword123',
+        )
+        token = Token.objects.create(user=user)
+
+        # Real token so authentication runs its query
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_server_timing_phases(self):
+        """Test header contains every phase of a DRF request"""
+        res = self.client.get(URL_RECIPE)
+
+        phases = parse_server_timing(res['Server-Timing'])
+
+        for name in ['auth', 'db', 'serialize', 'render', 'total']:
+            self.assertIn(name, phases)
+        self.assertLessEqual(
+            phases['auth'] + phases['db'] + phases['serialize']
+            + phases['render'],
+            phases['total'] + 0.1,
+        )
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_slow_request_logged(self):
+        """Test slow request is logged with queries and plan"""
+        with self.assertLogs('core.slow_requests', 'WARNING') as logs:
+            self.client.get(URL_RECIPE, {'tags': '1,2'})
+
+        entry = json.loads(logs.records[0].getMessage())
+
+        self.assertEqual(entry['route'], 'recipe:recipe-list')
+        self.assertEqual(entry['query_count'], len(entry['queries']))
+        self.assertGreater(entry['query_count'], 0)
+        self.assertIn('sql', entry['queries'][0])
+        self.assertIn('duration_ms', entry['queries'][0])
+        self.assertIsInstance(entry['slowest_query_plan'], list)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_plan_without_values(self):
+        """Test the logged plan has placeholders, not request values"""
+        with self.assertLogs('core.slow_requests', 'WARNING') as logs:
+            self.client.get(URL_RECIPE, {'price_min': '12345.67'})
+
+        entry = json.loads(logs.records[0].getMessage())
+
+        self.assertNotIn('12345.67', logs.records[0].getMessage())
+        self.assertIn('$', ' '.join(entry['slowest_query_plan']))
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_login_not_logged(self):
+        """Test password hashing routes are not logged as slow"""
+        with self.assertNoLogs('core.slow_requests', 'WARNING'):
+            APIClient().post(reverse('user:token'), {
+                'email': 'timing@example.com',
+                'password': 'testpassword123',
+            })
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=60000)
+    def test_fast_request_not_logged(self):
+        """Test request under threshold is not logged"""
+        with self.assertNoLogs('core.slow_requests', 'WARNING'):
+            self.client.get(URL_RECIPE)
+
+
+class RequestTimingsTests(SimpleTestCase):
+    """Test phase accounting"""
+
+    def test_nested_phase_not_counted_twice(self):
+        """Test time of nested phase is taken out of the outer one"""
+        timings = RequestTimings(QueryTimer())
+
+        with timings.phase('outer'):
+            with timings.phase('inner'):
+                sum(range(100000))
+
+        self.assertIn('inner', timings.phases)
+        self.assertLess(timings.phases['outer'], timings.phases['inner'])
@@ -0,0 +1,53 @@
+"""
+Tests for worker warm up and lazily loaded parts
+"""
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from core import warmup
+
+
+class WarmUpTests(SimpleTestCase):
+    """Test warm up of the master"""
+
+    def test_warm_up_without_database(self):
+        """Test views are run, stopping at authentication"""
+        statuses = warmup.warm_up()
+
+        self.assertEqual(set(statuses), set(warmup.WARMUP_PATHS))
+        self.assertEqual(set(statuses.values()), {401})
+
+    def test_benchmark_startup(self):
+        """Test benchmark reports every mode"""
+        out = io.StringIO()
+        call_command('benchmark_startup', workers=2, requests=2, repeat=1,
+                     stdout=out)
+
+        for mode in ('lazy', 'preload', 'warm'):
+            self.assertIn(mode, out.getvalue())
+
+
+class LazyViewsTests(TestCase):
+    """Test parts loaded on first use still work"""
+
+    def test_admin(self):
+        """Test admin URLs resolve and serve"""
+        admin = get_user_model().objects.create_superuser(
+            email='admin@example.com', password='testpassword123',
+        )
+        self.client.force_login(admin)
+
+        res = self.client.get(reverse('admin:core_recipe_changelist'))
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_docs(self):
+        """Test Swagger UI page"""
+        res = self.client.get(reverse('api-doc'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(reverse('api-schema'), res.content.decode())
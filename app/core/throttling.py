@@ -0,0 +1,174 @@
+"""
+Token bucket throttle shared by all workers of a node
+
+Buckets live in a memory mapped file, every uWSGI worker maps
+the same file so a client is limited across workers without a
+cache round trip. A check hashes the client to a group of slots
+and locks just that group, the cost does not depend on the
+number of clients.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Slot: key hash, tokens left, time of last update
+SLOT = struct.Struct('<Qdd')
+
+# Slots of a group share a lock, a client not found in its
+# group takes over the slot updated the longest time ago
+GROUP_SIZE = 4
+
+_table = None
+_table_lock = threading.Lock()
+
+
+class BucketTable:
+    """Fixed size table of token buckets in a shared file"""
+
+    def __init__(self, path, slots):
+        self.path = path
+        self.groups = max(slots // GROUP_SIZE, 1)
+        size = self.groups * GROUP_SIZE * SLOT.size
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size != size:
+            os.ftruncate(self.fd, size)
+        self.map = mmap.mmap(self.fd, size)
+
+        # fcntl locks only exclude other processes,
+        # threads of this process take this one too
+        self.thread_lock = threading.Lock()
+
+    def close(self):
+        self.map.close()
+        os.close(self.fd)
+
+    def take(self, key, capacity, refill):
+        """Take a token for key, return seconds to wait (0 if allowed)
+
+        capacity: size of the bucket
+        refill: tokens added per second
+        """
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        key_hash = int.from_bytes(digest, 'little') or 1
+        group = key_hash % self.groups
+        start = group * GROUP_SIZE * SLOT.size
+
+        with self.thread_lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, GROUP_SIZE * SLOT.size,
+                        start)
+            try:
+                offset, tokens, updated = self._find(start, key_hash)
+                now = time.time()
+
+                if tokens is None:
+                    tokens = capacity
+                else:
+                    tokens = min(
+                        capacity, tokens + (now - updated) * refill,
+                    )
+
+                if tokens >= 1:
+                    tokens -= 1
+                    wait = 0
+                else:
+                    wait = (1 - tokens) / refill
+
+                SLOT.pack_into(self.map, offset, key_hash, tokens, now)
+                return wait
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, GROUP_SIZE * SLOT.size,
+                            start)
+
+    def _find(self, start, key_hash):
+        """Slot of key in the group, (offset, None, None) if new"""
+        oldest = None
+        for index in range(GROUP_SIZE):
+            offset = start + index * SLOT.size
+            slot_hash, tokens, updated = SLOT.unpack_from(self.map, offset)
+
+            if slot_hash == key_hash:
+                return offset, tokens, updated
+            if oldest is None or updated < oldest[1]:
+                oldest = (offset, updated)
+
+        return oldest[0], None, None
+
+
+def get_table():
+    """Table of this process, mapped on first use"""
+    global _table
+
+    path = settings.THROTTLE_TABLE_PATH
+    groups = max(settings.THROTTLE_TABLE_SLOTS // GROUP_SIZE, 1)
+
+    with _table_lock:
+        # Settings changed (tests), map the new table
+        if _table is None or (_table.path, _table.groups) != (path, groups):
+            if _table is not None:
+                _table.close()
+            _table = BucketTable(path, groups * GROUP_SIZE)
+
+        return _table
+
+
+class SharedMemoryThrottle(BaseThrottle):
+    """Throttle per user (or per IP when anonymous) and scope
+
+    The scope is the view throttle_scope if set (e.g 'upload'),
+    else 'read' for safe methods and 'write' for the others.
+    Rates come from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'],
+    a scope without a rate is not throttled.
+    """
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope:
+            return scope
+
+        return 'read' if request.method in SAFE_METHODS else 'write'
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+
+        return f'ip:{self.get_ident(request)}'
+
+    def parse_rate(self, rate):
+        """'100/min' -> (100, seconds of period)"""
+        count, period = rate.split('/')
+        seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+        # A bucket without tokens never refills, leave the
+        # scope out of the rates to turn throttling off
+        if int(count) < 1:
+            raise ImproperlyConfigured(
+                f'Throttle rate {rate!r} must allow at least 1 request'
+            )
+        return int(count), seconds
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+
+        count, period = self.parse_rate(rate)
+        self.wait_seconds = get_table().take(
+            f'{scope}:{self.get_ident_key(request)}', count, count / period,
+        )
+
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,90 @@
+"""
+Per request phase timing (Server-Timing header)
+"""
+import time
+
+from contextlib import contextmanager
+
+
+class RequestTimings:
+    """Collect time spent in each phase of a request"""
+
+    def __init__(self, query_timer):
+        # Time of the query timer is reported as its own
+        # "db" phase and taken out of the other phases
+        self.query_timer = query_timer
+        self.phases = {}
+        self._stack = []
+
+    def start(self, name):
+        """Start measuring a phase"""
+        # [name, start, db time at start, time of nested phases]
+        self._stack.append(
+            [name, time.perf_counter(), self.query_timer.duration, 0.0]
+        )
+
+    def stop(self, name):
+        """Stop measuring the phase started last"""
+        if not self._stack or self._stack[-1][0] != name:
+            return
+
+        _, start, db_start, children = self._stack.pop()
+        elapsed = time.perf_counter() - start
+        db = self.query_timer.duration - db_start
+
+        # Phases dont overlap, a nested phase (auth inside
+        # serialize) and queries are only counted once
+        own = max(elapsed - db - children, 0.0)
+        self.phases[name] = self.phases.get(name, 0.0) + own
+
+        if self._stack:
+            self._stack[-1][3] += own
+
+    @contextmanager
+    def phase(self, name):
+        """Measure the phase around a block"""
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name)
+
+    def header(self, total):
+        """Build Server-Timing header value"""
+        phases = dict(self.phases, db=self.query_timer.duration, total=total)
+
+        return ', '.join(
+            f'{name};dur={seconds * 1000:.2f}'
+            for name, seconds in phases.items()
+        )
+
+
+@contextmanager
+def phase(request, name):
+    """Measure a phase if the request is being timed"""
+
+    # DRF wraps django request, timings live on
+    # the original one set by the middleware
+    request = getattr(request, '_request', request)
+    timings = getattr(request, '_server_timing', None)
+
+    if timings is None:
+        yield
+        return
+
+    with timings.phase(name):
+        yield
+
+
+class ServerTimingMixin:
+    """Time authentication and serialization of a DRF view"""
+
+    def dispatch(self, request, *args, **kwargs):
+        # Everything the view does that is not auth or db
+        # is building and serializing the data
+        with phase(request, 'serialize'):
+            return super().dispatch(request, *args, **kwargs)
+
+    def perform_authentication(self, request):
+        with phase(request, 'auth'):
+            super().perform_authentication(request)
@@ -0,0 +1,105 @@
+"""
+Views for core (operational endpoints)
+"""
+import re
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_GET
+
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from core import health
+from core import metrics as core_metrics
+from core import schema as core_schema
+
+# Same check as django.middleware.gzip
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+@require_GET
+def metrics(request):
+    """Expose collected metrics in Prometheus text format"""
+    registry = core_metrics.get_registry()
+
+    return HttpResponse(
+        generate_latest(registry),
+        content_type=CONTENT_TYPE_LATEST,
+    )
+
+
+@require_GET
+def healthz(request):
+    """Liveness, the process answers (no database involved)"""
+    response = HttpResponse('ok', content_type='text/plain')
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@require_GET
+def readyz(request):
+    """Readiness, database up and migrations applied (core/health.py)"""
+    reason = health.check_ready()
+    if reason is None:
+        response = HttpResponse('ready', content_type='text/plain')
+    else:
+        response = HttpResponse(
+            reason, content_type='text/plain', status=503,
+        )
+
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@require_GET
+def schema(request):
+    """OpenAPI schema precomputed by core/schema.py
+
+    YAML by default, JSON with ?format=json or a JSON Accept header
+    """
+    schema_format = request.GET.get('format')
+    if schema_format not in core_schema.FORMATS:
+        accept = request.headers.get('Accept', '')
+        schema_format = 'json' if 'json' in accept else 'yaml'
+
+    document = core_schema.get_document(schema_format)
+    gzipped = ACCEPTS_GZIP.search(request.headers.get('Accept-Encoding', ''))
+    etag = document.gzip_etag if gzipped else document.etag
+
+    # Proxies may weaken the ETag of what they pass on
+    if_none_match = request.headers.get('If-None-Match', '')
+    sent = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    if etag in sent or '*' in sent:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(
+            document.gzipped if gzipped else document.body,
+            content_type=core_schema.FORMATS[schema_format],
+        )
+        if gzipped:
+            response['Content-Encoding'] = 'gzip'
+
+    response['ETag'] = etag
+    # Clients keep it but check it's still current (a cheap 304)
+    response['Cache-Control'] = 'public, no-cache'
+    patch_vary_headers(response, ['Accept', 'Accept-Encoding'])
+    return response
+
+
+_docs_view = None
+
+
+def docs(request):
+    """Swagger UI of the schema above
+
+    drf_spectacular.views pulls in the schema generator,
+    imported on first use only (core/warmup.py)
+    """
+    global _docs_view
+
+    if _docs_view is None:
+        from drf_spectacular.views import SpectacularSwaggerView
+
+        _docs_view = SpectacularSwaggerView.as_view(url_name='api-schema')
+
+    return _docs_view(request)
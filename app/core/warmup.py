@@ -0,0 +1,225 @@
+"""
+Warm up the app in the uWSGI master before workers are forked
+
+uWSGI imports app.wsgi once in the master and forks the workers
+from it, so whatever is imported and built there is shared by every
+worker (copy on write) instead of being done again by each worker on
+its first requests. gc.freeze() then moves those objects out of the
+garbage collector's reach: collections in the workers would otherwise
+write to them (reference counts and gc flags) and copy their pages.
+
+Rarely used parts stay lazy and are only loaded by the worker that
+needs them: the admin (app/urls_admin.py), schema generation and
+Swagger UI (core/schema.py, core/views.py) and Pillow (only imported
+by Django when an uploaded image is validated).
+
+Run as a script this module is the probe of the benchmark_startup
+command, Django is imported inside functions for that reason.
+"""
+import gc
+import io
+import json
+import os
+import sys
+import time
+
+# Requests run through the views during warm up, unauthenticated
+# so they stop at authentication without touching the database
+WARMUP_PATHS = [
+    '/api/recipe/recipes/',
+    '/api/recipe/tags/',
+    '/api/user/me/',
+]
+
+
+def _environ(path, host):
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'HTTP_HOST': host,
+        'wsgi.input': io.BytesIO(b''),
+        'wsgi.url_scheme': 'http',
+    }
+
+
+def _host():
+    from django.conf import settings
+
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def _url_patterns(patterns):
+    """Patterns of the URLconf, lazy ones (admin) are not loaded"""
+    from django.urls import URLResolver
+
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.app_name != 'admin':
+                yield from _url_patterns(pattern.url_patterns)
+        else:
+            yield pattern
+
+
+def warm_up():
+    """Import and build what the first request of a worker would
+
+    Returns status codes of the warm up requests by path
+    """
+    from django.apps import apps
+    from django.core.handlers.wsgi import WSGIRequest
+    from django.db import connections
+    from django.urls import get_resolver
+
+    # Field caches of every model
+    for model in apps.get_models():
+        model._meta.get_fields()
+
+    # URLconf with every view module, reverse lookup tables
+    resolver = get_resolver()
+    resolver.reverse_dict
+
+    # Serializer fields, DRF imports some field classes lazily
+    for pattern in _url_patterns(resolver.url_patterns):
+        view_class = getattr(pattern.callback, 'cls', None)
+        serializer_class = getattr(view_class, 'serializer_class', None)
+        if serializer_class is not None:
+            serializer_class().fields
+
+    # Views are called without the middlewares (already built when
+    # the WSGI handler was), so no metrics are recorded by the master
+    statuses = {}
+    for path in WARMUP_PATHS:
+        request = WSGIRequest(_environ(path, _host()))
+        match = resolver.resolve(path)
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        statuses[path] = response.status_code
+
+    # Connections must not be shared with forked workers
+    connections.close_all()
+    return statuses
+
+
+def freeze():
+    """Keep objects of the master out of the workers' collections"""
+    gc.collect()
+    gc.freeze()
+
+
+def _memory():
+    """Rss, proportional and unique memory of this process in kB"""
+    memory = {}
+    with open('/proc/self/smaps_rollup') as smaps:
+        for line in smaps:
+            name, _, value = line.partition(':')
+            if name in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                memory[name] = int(value.split()[0])
+
+    return {
+        'rss': memory['Rss'],
+        'pss': memory['Pss'],
+        'uss': memory['Private_Clean'] + memory['Private_Dirty'],
+    }
+
+
+def _load(warm):
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+    if warm:
+        warm_up()
+        freeze()
+    return application
+
+
+def _worker(application, requests, done, go):
+    """Serve requests in a forked worker, report timings and memory"""
+    start = time.perf_counter()
+    if application is None:
+        application = _load(warm=False)
+
+    timings = []
+    for index in range(requests):
+        path = WARMUP_PATHS[index % len(WARMUP_PATHS)]
+        request_start = time.perf_counter()
+        response = application(
+            _environ(path, _host()), lambda status, headers: None,
+        )
+        b''.join(response)
+        response.close()
+        timings.append((time.perf_counter() - request_start) * 1000)
+    ready = (time.perf_counter() - start) * 1000
+
+    # Memory is read once every worker exists, so shared
+    # pages are split between all of them
+    os.write(done, b'x')
+    os.read(go, 1)
+
+    return {
+        'ready_ms': ready,
+        'first_request_ms': timings[0],
+        'request_ms': sorted(timings)[len(timings) // 2],
+        **_memory(),
+    }
+
+
+def probe(mode, workers, requests):
+    """Start a master and workers like uWSGI does, in one of the modes
+
+    lazy: every worker loads the app itself (uWSGI --lazy-apps)
+    preload: the master loads the app, workers fork from it
+    warm: preload, plus warm_up() and freeze() in the master
+    """
+    start = time.perf_counter()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    if not os.environ.get('ALLOWED_HOSTS'):
+        os.environ['ALLOWED_HOSTS'] = 'localhost'
+    application = None if mode == 'lazy' else _load(warm=(mode == 'warm'))
+    master_ms = (time.perf_counter() - start) * 1000
+
+    done_read, done_write = os.pipe()
+    go_read, go_write = os.pipe()
+    children = []
+    for _ in range(workers):
+        result_read, result_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                result = _worker(application, requests,
+                                 done_write, go_read)
+                os.write(result_write, json.dumps(result).encode())
+            finally:
+                os._exit(0)
+
+        os.close(result_write)
+        children.append((pid, result_read))
+
+    for _ in range(workers):
+        os.read(done_read, 1)
+    master_memory = _memory()
+    os.write(go_write, b'x' * workers)
+
+    results = []
+    for pid, result_read in children:
+        with os.fdopen(result_read) as result:
+            results.append(json.loads(result.read()))
+        os.waitpid(pid, 0)
+
+    return {
+        'mode': mode,
+        'master_ms': master_ms,
+        'master': master_memory,
+        'workers': results,
+    }
+
+
+if __name__ == '__main__':
+    print(json.dumps(probe(sys.argv[1], int(sys.argv[2]),
+                           int(sys.argv[3]))))
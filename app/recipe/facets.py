@@ -0,0 +1,82 @@
+"""
+Facet counts for recipe filters
+"""
+from django.db.models import Count, Q
+
+from core.models import Recipe
+
+# Histogram bucket lower bounds, the last bucket is open ended
+PRICE_BUCKETS = [0, 5, 10, 20, 50]
+MINUTE_BUCKETS = [0, 15, 30, 60, 120]
+
+
+def _relation_counts(through, column, name_field, recipe_ids):
+    """Matching recipes per tag/ingredient, one grouped query"""
+    rows = (
+        through.objects
+        .filter(recipe_id__in=recipe_ids)
+        .values(column, name_field)
+        .annotate(count=Count('recipe_id'))
+        .order_by('-count', name_field)
+    )
+    return [
+        {'id': row[column], 'name': row[name_field], 'count': row['count']}
+        for row in rows
+    ]
+
+
+def _bucket_filters(field, bounds):
+    """(label, Q) of each histogram bucket of field"""
+    buckets = []
+    for i, low in enumerate(bounds):
+        high = bounds[i + 1] if i + 1 < len(bounds) else None
+        condition = Q(**{f'{field}__gte': low})
+        if high is not None:
+            condition &= Q(**{f'{field}__lt': high})
+        buckets.append(((low, high), condition))
+    return buckets
+
+
+def recipe_facets(queryset):
+    """Counts of tags, ingredients, price and time for recipes
+
+    queryset: filtered recipes (as in the list endpoint)
+    """
+
+    # Ids of matching recipes, used as subquery in
+    # every facet query (no ordering needed)
+    recipe_ids = queryset.order_by().values('id')
+
+    histograms = {
+        'price': _bucket_filters('price', PRICE_BUCKETS),
+        'minute_to_make_recipe': _bucket_filters(
+            'minute_to_make_recipe', MINUTE_BUCKETS,
+        ),
+    }
+
+    # Total and every histogram bucket as conditional
+    # counts of a single aggregate query
+    aggregates = {'count': Count('id')}
+    for field, buckets in histograms.items():
+        for i, (_, condition) in enumerate(buckets):
+            aggregates[f'{field}_{i}'] = Count('id', filter=condition)
+
+    totals = Recipe.objects.filter(id__in=recipe_ids).aggregate(**aggregates)
+
+    facets = {
+        'count': totals['count'],
+        'tags': _relation_counts(
+            Recipe.tags.through, 'tag_id', 'tag__name', recipe_ids,
+        ),
+        'ingredients': _relation_counts(
+            Recipe.ingredients.through, 'ingredient_id',
+            'ingredient__name', recipe_ids,
+        ),
+    }
+    for field, buckets in histograms.items():
+        facets[field] = [
+            {'min': low, 'max': high, 'count': totals[f'{field}_{i}']}
+            for i, ((low, high), _) in enumerate(buckets)
+        ]
+
+    return facets
@@ -0,0 +1,137 @@
+"""
+Keyset (seek) pagination for recipe lists
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(pagination.BasePagination):
+    """Paginate on (ordering column, id) instead of OFFSET
+
+    The next page starts right after the last row seen, so a
+    deep page costs the same as the first one when a matching
+    (user, column, id) index exists. Only used when the client
+    asks for it with ?page_size=N, otherwise the list is
+    returned unpaginated as before.
+    """
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = request.query_params.get(self.page_size_query_param)
+        if page_size is None:
+            return None
+
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            raise ValidationError({'page_size': 'Must be an integer'})
+        page_size = min(max(page_size, 1), self.max_page_size)
+
+        # (column, descending) the view orders by, id is the tiebreak
+        self.field, self.descending = view.get_ordering()
+        self.request = request
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = self._after(
+                queryset, *self._decode(cursor, queryset.model),
+            )
+
+        # One extra row tells if there is a next page
+        items = list(queryset[:page_size + 1])
+        self.has_next = len(items) > page_size
+        items = items[:page_size]
+        self.last = items[-1] if items else None
+
+        return items
+
+    def _after(self, queryset, value, last_id):
+        """Rows after (value, last_id) in the ordering"""
+        op = 'lt' if self.descending else 'gt'
+
+        if self.field == 'id':
+            return queryset.filter(**{f'id__{op}': last_id})
+
+        # The first filter is implied by the second, it lets
+        # the planner use the index as a range scan
+        return queryset.filter(
+            **{f'{self.field}__{op}e': value}
+        ).filter(
+            Q(**{f'{self.field}__{op}': value})
+            | Q(**{self.field: value, f'id__{op}': last_id})
+        )
+
+    def _encode(self, obj):
+        value = getattr(obj, self.field)
+        data = json.dumps([self.field, str(value), obj.id]).encode()
+        return base64.urlsafe_b64encode(data).decode()
+
+    def _decode(self, cursor, model):
+        """(value, last_id) of a cursor made for the current ordering
+
+        The value is converted by the model field, a cursor of
+        another ordering or an edited one is a 400, not a 500
+        """
+        try:
+            field, value, last_id = json.loads(
+                base64.urlsafe_b64decode(cursor)
+            )
+            if field != self.field:
+                raise ValidationError({
+                    'cursor': 'Cursor is for another ordering',
+                })
+            value = model._meta.get_field(field).to_python(value)
+            return value, int(last_id)
+        except (binascii.Error, ValueError, TypeError,
+                DjangoValidationError):
+            raise ValidationError({'cursor': 'Invalid cursor'})
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self._encode(self.last),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True,
+                         'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Enables keyset pagination with this size',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cursor from the "next" link',
+                'schema': {'type': 'string'},
+            },
+        ]
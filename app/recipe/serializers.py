@@ -2,7 +2,11 @@
 Serializers for recipe API
 """
 from rest_framework import serializers
-from core.models import Recipe, Tag, Ingredient
+from core.media import file_version
+from core.models import DeletionOperation, Recipe, Tag, Ingredient
+
+from django.db import models
+from django.urls import reverse
 
 from django.utils.translation import gettext # noqa
 
@@ -27,9 +31,52 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+# Tag/ingredient with number of recipes using it
+# (for most used endpoint)
+class IngredientCountSerializer(IngredientSerializer):
+    """Serializer for ingredient with recipe count"""
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ['recipe_count']
+        read_only_fields = fields
+
+
+class TagCountSerializer(TagSerializer):
+    """Serializer for tag with recipe count"""
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ['recipe_count']
+        read_only_fields = fields
+
+
+# Images are only sent to the owner of the recipe (image
+# action, core/media.py), their URL is the one of the action
+# with a version so clients may cache them for good
+class RecipeImageField(serializers.ImageField):
+    """Image upload, shown as the URL of the image action"""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+
+        url = reverse('recipe:recipe-image', args=[value.instance.pk])
+        url = f'{url}?v={file_version(value)}'
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+# Image fields of recipe serializers use the field above
+IMAGE_FIELD_MAPPING = {
+    **serializers.ModelSerializer.serializer_field_mapping,
+    models.ImageField: RecipeImageField,
+}
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer for recipe"""
 
+    serializer_field_mapping = IMAGE_FIELD_MAPPING
+
     # This will becom nested serializer
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
@@ -43,8 +90,8 @@ class RecipeSerializer(serializers.ModelSerializer):
     # Helper function for get_or_create
     # Single underscore for internal user (Pep 8)
     # use by other method in this class
-    def _get_or_create_tags(self, tags, recipe):
-        """Getting or creating tags as a method"""
+    def _get_or_create(self, model, items):
+        """Getting or creating tags/ingredients by name as a method"""
 
         # Get authenticated user, because we are
         # using a serializer not the views so we use
@@ -55,28 +102,46 @@ class RecipeSerializer(serializers.ModelSerializer):
         # code ?
         authen_user = self.context['request'].user
 
-        # Create each tag object base on tags in validated_data
-        for tag in tags:
-
-            # get_or_create: if exist = get, if not = get
-            # this is for not create duplicate tag in system
-            obj, _ = Tag.objects.get_or_create(
-                user=authen_user,
-                **tag,  # add the rest of atri in tag
-            )
-            recipe.tags.add(obj)
-
-    def _get_or_create_ingredients(self, ingredients, recipe):
-        """Getting or creating ingredients as a method"""
-
-        authen_user = self.context['request'].user
-
-        for ingredient in ingredients:
-            obj, _ = Ingredient.objects.get_or_create(
-                user=authen_user,
-                **ingredient
-            )
-            recipe.ingredients.add(obj)
+        # Unique names, keep the order they were sent
+        names = list(dict.fromkeys(item['name'] for item in items))
+
+        # One query for the existing ones (first one wins
+        # if the user has duplicated names) and one insert
+        # for the missing ones, instead of get_or_create
+        # for each item
+        found = {}
+        for obj in model.objects.filter(
+            user=authen_user, name__in=names,
+        ).order_by('id'):
+            found.setdefault(obj.name, obj)
+
+        created = model.objects.bulk_create(
+            model(user=authen_user, name=name)
+            for name in names if name not in found
+        )
+        for obj in created:
+            found[obj.name] = obj
+
+        return [found[name] for name in names]
+
+    def _set_related(self, recipe, field, objects, current=None):
+        """Link recipe to exactly these objects, writing only the changes"""
+        manager = getattr(recipe, field)
+        wanted = {obj.id for obj in objects}
+
+        # current=set() for a new recipe, saves the lookup
+        if current is None:
+            current = set(manager.values_list('id', flat=True))
+
+        # Only the difference is written: one DELETE for links
+        # to drop, one INSERT for new links, nothing (and no
+        # m2m_changed signal) when the set is unchanged
+        removed = current - wanted
+        added = wanted - current
+        if removed:
+            manager.remove(*removed)
+        if added:
+            manager.add(*added)
 
     # Override to allow to change tag
     # bc nested serializer default is read_only_field
@@ -98,8 +163,13 @@ class RecipeSerializer(serializers.ModelSerializer):
         # defined ?
         recipe = Recipe.objects.create(**validated_data)
 
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        self._set_related(
+            recipe, 'tags', self._get_or_create(Tag, tags), current=set(),
+        )
+        self._set_related(
+            recipe, 'ingredients',
+            self._get_or_create(Ingredient, ingredients), current=set(),
+        )
 
         return recipe
 
@@ -115,19 +185,30 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop('ingredients', None)
 
         if tags is not None:
-            # clear all tags and replace with
-            # validated_data tag (bc its just update)
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            # Replace tags with validated_data tags
+            # (bc its just update), only changed links
+            # are written
+            self._set_related(
+                instance, 'tags', self._get_or_create(Tag, tags),
+            )
 
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            self._set_related(
+                instance, 'ingredients',
+                self._get_or_create(Ingredient, ingredients),
+            )
 
+        # Only assign and save the columns that really changed,
+        # save(update_fields=...) writes just those, and a PATCH
+        # changing nothing skips the UPDATE
+        changed = []
         for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+            if getattr(instance, attr) != value:
+                setattr(instance, attr, value)
+                changed.append(attr)
 
-        instance.save()
+        if changed:
+            instance.save(update_fields=changed)
         return instance
 
 
@@ -142,10 +223,22 @@ class RecipeDetailSerializer(RecipeSerializer):
         fields = RecipeSerializer.Meta.fields + ['description', 'image']
 
 
+# Recipe in the similar recipes list, similarity is the
+# estimated Jaccard similarity of tags/ingredients (0 to 1)
+class SimilarRecipeSerializer(RecipeSerializer):
+    """Serializer for similar recipe"""
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['similarity']
+
+
 # For a specific seperate API just for handling the image upload
 class RecipeDetailImageSerializer(serializers.ModelSerializer):
     """Serializer for upload image to recipe"""
 
+    serializer_field_mapping = IMAGE_FIELD_MAPPING
+
     class Meta:
         model = Recipe
         fields = ['id', 'image']
@@ -153,3 +246,24 @@ class RecipeDetailImageSerializer(serializers.ModelSerializer):
 
         # purpose of this serializer is upload image
         extra_kwargs = {'image': {'required': 'True'}}
+
+
+# Recipes to delete in the background (core/deletion.py)
+class RecipeBulkDeleteSerializer(serializers.Serializer):
+    """Serializer for bulk delete of recipes"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100000,
+    )
+
+
+# Progress of a background deletion, deleted out of total rows
+class DeletionOperationSerializer(serializers.ModelSerializer):
+    """Serializer for deletion operation"""
+
+    class Meta:
+        model = DeletionOperation
+        fields = ['id', 'kind', 'status', 'total', 'deleted',
+                  'created_at', 'finished_at']
+        read_only_fields = fields
@@ -0,0 +1,96 @@
+"""
+Delta sync of recipes, tags and ingredients
+"""
+from django.db import connection
+
+from core.models import (
+    Ingredient,
+    Recipe,
+    SyncWatermark,
+    Tag,
+    Tombstone,
+)
+from recipe import serializers
+
+# (response key, model, serializer) of synced collections,
+# response key is also the tombstone kind + 's'
+COLLECTIONS = [
+    ('recipes', Recipe, serializers.RecipeDetailSerializer),
+    ('tags', Tag, serializers.TagSerializer),
+    ('ingredients', Ingredient, serializers.IngredientSerializer),
+]
+
+
+class SyncExpired(Exception):
+    """Tombstones after the cursor were already compacted"""
+
+
+def sync_horizon(user):
+    """Highest sync_seq whose transaction has finished, for user
+
+    Waits for transactions still writing synced rows of user, a
+    row of user with a lower number can't show up after the
+    horizon. Writers of other users don't hold it up.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT core_sync_horizon(%s)', [user.id])
+        return cursor.fetchone()[0]
+
+
+def compacted_seq():
+    """sync_seq up to which tombstones were removed"""
+    return SyncWatermark.objects.filter(pk=1).values_list(
+        'compacted_seq', flat=True,
+    ).first() or 0
+
+
+def changes_since(user, since, limit, context):
+    """Rows of user changed or deleted after since, oldest first
+
+    Returns the serialized changes, the cursor of the next
+    call and if more changes are left. since=0 is a full sync
+    (no tombstones needed). Recipes list their tags and
+    ingredients by id, a deleted tag is only sent as its own
+    tombstone.
+    """
+    if since and since < compacted_seq():
+        raise SyncExpired
+
+    horizon = sync_horizon(user)
+    window = {'user': user, 'sync_seq__gt': since, 'sync_seq__lte': horizon}
+
+    # limit + 1 of every source is enough to fill the page
+    # and tell if there is more
+    rows = []
+    for name, model, _ in COLLECTIONS:
+        queryset = model.objects.filter(**window).order_by('sync_seq')
+        if model is Recipe:
+            queryset = queryset.prefetch_related('tags', 'ingredients')
+        rows += [(obj.sync_seq, name, obj) for obj in queryset[:limit + 1]]
+
+    if since:
+        tombstones = Tombstone.objects.filter(**window).order_by('sync_seq')
+        rows += [(obj.sync_seq, 'deleted', obj)
+                 for obj in tombstones[:limit + 1]]
+
+    rows.sort(key=lambda row: row[0])
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    data = {
+        'cursor': rows[-1][0] if more else max(since, horizon),
+        'more': more,
+        'deleted': {name: [] for name, _, _ in COLLECTIONS},
+    }
+    for name, _, serializer_class in COLLECTIONS:
+        data[name] = serializer_class(
+            [obj for _, kind, obj in rows if kind == name],
+            many=True,
+            context=context,
+        ).data
+
+    for _, kind, obj in rows:
+        if kind == 'deleted':
+            data['deleted'][f'{obj.kind}s'].append(obj.object_id)
+
+    return data
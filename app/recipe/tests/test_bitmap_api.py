@@ -0,0 +1,121 @@
+"""
+Tests recipe filtering through the bitmap index
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import bitmaps
+from core.models import Recipe, Tag, Ingredient
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class BitmapFilterAPITests(TestCase):
+    """Test match, pantry and index params of the list"""
+
+    def setUp(self):
+        bitmaps.clear()
+        self.addCleanup(bitmaps.clear)
+        self.user = get_user_model().objects.create_user(
+            email='bitmap@example.com', password='testpassword123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.tags = {
+            name: Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Quick')
+        }
+        self.ingredients = {
+            name: Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Rice', 'Beans', 'Beef')
+        }
+        self.rice = self.create_recipe('Rice', ['Vegan', 'Quick'], ['Rice'])
+        self.beans = self.create_recipe('Beans', ['Vegan'],
+                                        ['Rice', 'Beans'])
+        self.chili = self.create_recipe('Chili', ['Quick'],
+                                        ['Beans', 'Beef'])
+
+    def create_recipe(self, title, tags, ingredients):
+        recipe = Recipe.objects.create(
+            user=self.user, title=title, minute_to_make_recipe=1,
+            price=Decimal('1.00'), description='Bitmap',
+        )
+        recipe.tags.add(*[self.tags[name] for name in tags])
+        recipe.ingredients.add(*[self.ingredients[name]
+                                 for name in ingredients])
+        return recipe
+
+    def ids(self, *names, kind='tags'):
+        objects = getattr(self, kind)
+        return ','.join(str(objects[name].id) for name in names)
+
+    def titles(self, params):
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return sorted(recipe['title'] for recipe in res.data)
+
+    def test_index_matches_sql(self):
+        """Test ?index=bitmap gives the same recipes as SQL"""
+        params = {
+            'tags': self.ids('Vegan', 'Quick'),
+            'ingredients': self.ids('Beans', kind='ingredients'),
+        }
+
+        self.assertEqual(self.titles({**params, 'index': 'bitmap'}),
+                         self.titles(params))
+        self.assertEqual(self.titles(params), ['Beans', 'Chili'])
+
+    def test_match_all(self):
+        """Test recipes with every given tag"""
+        titles = self.titles({
+            'tags': self.ids('Vegan', 'Quick'), 'match': 'all',
+        })
+
+        self.assertEqual(titles, ['Rice'])
+
+    def test_pantry(self):
+        """Test recipes made only of the given ingredients"""
+        titles = self.titles({
+            'pantry': self.ids('Rice', 'Beans', kind='ingredients'),
+        })
+
+        self.assertEqual(titles, ['Beans', 'Rice'])
+
+    def test_pantry_with_other_filters(self):
+        """Test pantry combines with tags and range filters"""
+        Recipe.objects.filter(id=self.rice.id).update(
+            minute_to_make_recipe=60,
+        )
+
+        titles = self.titles({
+            'pantry': self.ids('Rice', 'Beans', kind='ingredients'),
+            'tags': self.ids('Vegan'),
+            'minutes_max': 10,
+        })
+
+        self.assertEqual(titles, ['Beans'])
+
+    def test_invalid_params(self):
+        """Test unknown match/index values are rejected"""
+        for params in ({'match': 'some'}, {'index': 'btree'}):
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ids_bound_as_one_array(self):
+        """Test matched ids are sent as one parameter, even none"""
+        queryset = Recipe.objects.filter(
+            id__any_of=[self.rice.id, self.beans.id],
+        )
+
+        sql, params = queryset.query.sql_with_params()
+        self.assertIn('ANY(', sql)
+        self.assertEqual(len(params), 1)
+        self.assertEqual(set(queryset), {self.rice, self.beans})
+        self.assertFalse(Recipe.objects.filter(id__any_of=[]).exists())
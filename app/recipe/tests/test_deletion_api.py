@@ -0,0 +1,76 @@
+"""
+Tests for bulk recipe deletion API
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import DeletionOperation, Recipe
+from recipe.tests.test_recipe_api import create_recipe
+
+BULK_DELETE_URL = reverse('recipe:recipe-bulk-delete')
+
+
+def deletion_url(operation_id):
+    return reverse('recipe:deletionoperation-detail', args=[operation_id])
+
+
+@override_settings(DELETION_BATCH_PAUSE=0)
+class BulkDeleteApiTests(TestCase):
+    """Tests for POST recipes/bulk-delete/ and deletions/<id>/"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_delete(self):
+        """Test deletion is accepted, then done by the job"""
+        recipes = [create_recipe(self.user) for _ in range(3)]
+
+        res = self.client.post(
+            BULK_DELETE_URL, {'ids': [recipe.id for recipe in recipes]},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['total'], 3)
+        self.assertEqual(res.data['deleted'], 0)
+        self.assertTrue(res['Location'].endswith(
+            deletion_url(res.data['id'])
+        ))
+        # Nothing deleted within the request
+        self.assertEqual(Recipe.objects.count(), 3)
+
+        job = jobs.claim('test-worker')
+        self.assertEqual(jobs.run(job), 'done')
+
+        res = self.client.get(deletion_url(res.data['id']))
+        self.assertEqual(res.data['status'], DeletionOperation.DONE)
+        self.assertEqual(res.data['deleted'], 3)
+        self.assertEqual(Recipe.objects.count(), 0)
+
+    def test_bulk_delete_invalid(self):
+        """Test ids are required"""
+        res = self.client.post(BULK_DELETE_URL, {'ids': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deletion_of_other_user(self):
+        """Test deletions of other users are not visible"""
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='testpass123',
+        )
+        operation = DeletionOperation.objects.create(
+            user=other, kind=DeletionOperation.RECIPES,
+        )
+
+        res = self.client.get(deletion_url(operation.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,119 @@
+"""
+Tests for the recipe image endpoint (core/media.py)
+"""
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.media import file_version
+from recipe.tests.test_recipe_api import create_recipe
+
+IMAGE_BYTES = b'\xff\xd8\xff\xe0 not really a jpeg'
+
+
+def image_url(recipe_id):
+    return reverse('recipe:recipe-image', args=[recipe_id])
+
+
+class RecipeImageApiTests(TestCase):
+    """Tests for GET /api/recipe/recipes/<id>/image/"""
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings = override_settings(MEDIA_ROOT=media_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.recipe = create_recipe(self.user)
+        self.recipe.image.save(
+            'photo.jpg', SimpleUploadedFile('photo.jpg', IMAGE_BYTES),
+        )
+
+    def test_image_redirected_to_nginx(self):
+        """Test owner gets an X-Accel-Redirect, not the bytes"""
+        res = self.client.get(image_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'], self.recipe.image.url)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res.content, b'')
+        self.assertIn('private', res['Cache-Control'])
+        self.assertIn('no-cache', res['Cache-Control'])
+        self.assertIn('Authorization', res['Vary'])
+
+    def test_current_version_immutable(self):
+        """Test URL with the current version is cached for good"""
+        res = self.client.get(
+            image_url(self.recipe.id),
+            {'v': file_version(self.recipe.image)},
+        )
+
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertIn('max-age=31536000', res['Cache-Control'])
+
+    def test_image_accept_header(self):
+        """Test image Accept headers are not refused"""
+        res = self.client.get(
+            image_url(self.recipe.id), HTTP_ACCEPT='image/webp,image/*',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_image_of_other_user(self):
+        """Test images of other users are not sent"""
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='testpass123',
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(image_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('X-Accel-Redirect', res)
+
+    def test_image_unauthenticated(self):
+        """Test authentication is required"""
+        res = APIClient().get(image_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_recipe_without_image(self):
+        """Test 404 for a recipe without image"""
+        recipe = create_recipe(self.user)
+
+        res = self.client.get(image_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(DEBUG=True)
+    def test_image_served_in_debug(self):
+        """Test runserver (no nginx) gets the file itself"""
+        res = self.client.get(image_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), IMAGE_BYTES)
+
+    def test_detail_image_url(self):
+        """Test recipe detail links to the image endpoint"""
+        res = self.client.get(
+            reverse('recipe:recipe-detail', args=[self.recipe.id]),
+        )
+
+        self.assertEqual(
+            res.data['image'],
+            'http://testserver' + image_url(self.recipe.id)
+            + f'?v={file_version(self.recipe.image)}',
+        )
@@ -4,7 +4,9 @@ Tests recipe APIs
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -13,6 +15,8 @@ from core.models import Recipe, Tag, Ingredient
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 # For image test
+import base64
+import json
 import tempfile
 import os
 
@@ -454,6 +458,218 @@ class PrivateAPIRecipeTest(TestCase):
         self.assertIn(serializer2.data, res.data)
         self.assertNotIn(serializer3.data, res.data)
 
+    def test_recipe_facets(self):
+        """Test facet counts of recipes matching the filters"""
+        tag1 = Tag.objects.create(user=self.user, name='Dinner')
+        tag2 = Tag.objects.create(user=self.user, name='Quick')
+        ingredient = Ingredient.objects.create(user=self.user, name='Egg')
+
+        r1 = create_recipe(user=self.user, price=Decimal('3.00'),
+                           minute_to_make_recipe=10)
+        r2 = create_recipe(user=self.user, price=Decimal('12.00'),
+                           minute_to_make_recipe=45)
+        r3 = create_recipe(user=self.user, price=Decimal('60.00'),
+                           minute_to_make_recipe=200)
+        r1.tags.add(tag1, tag2)
+        r2.tags.add(tag1)
+        r3.tags.add(tag2)
+        r1.ingredients.add(ingredient)
+
+        # Tags, ingredients and histograms, one query each
+        with self.assertNumQueries(3):
+            res = self.client.get(
+                reverse('recipe:recipe-facets'), {'tags': f'{tag1.id}'},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 2)
+        self.assertEqual(
+            [(tag['name'], tag['count']) for tag in res.data['tags']],
+            [('Dinner', 2), ('Quick', 1)],
+        )
+        self.assertEqual(res.data['ingredients'][0]['count'], 1)
+        self.assertEqual(
+            [bucket['count'] for bucket in res.data['price']],
+            [1, 0, 1, 0, 0],
+        )
+        self.assertEqual(
+            [bucket['count'] for bucket in res.data['minute_to_make_recipe']],
+            [1, 0, 1, 0, 0],
+        )
+
+    def test_recipe_facets_cached_until_change(self):
+        """Test facets are served from cache until recipes change"""
+        create_recipe(user=self.user)
+        url = reverse('recipe:recipe-facets')
+
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            res = self.client.get(url)
+        self.assertEqual(res.data['count'], 1)
+
+        create_recipe(user=self.user)
+
+        res = self.client.get(url)
+        self.assertEqual(res.data['count'], 2)
+
+    def test_filter_by_price_and_minutes(self):
+        """Test range filters on price and time"""
+        create_recipe(user=self.user, title='Cheap quick',
+                      price=Decimal('4.00'), minute_to_make_recipe=20)
+        create_recipe(user=self.user, title='Cheap slow',
+                      price=Decimal('5.00'), minute_to_make_recipe=90)
+        create_recipe(user=self.user, title='Expensive quick',
+                      price=Decimal('40.00'), minute_to_make_recipe=10)
+
+        res = self.client.get(URL_RECIPE, {
+            'price_min': '4.50',
+            'price_max': '50',
+            'minutes_max': 30,
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['title'] for r in res.data], ['Expensive quick'])
+
+    def test_invalid_range_filter(self):
+        """Test invalid filter value returns bad request"""
+        res = self.client.get(URL_RECIPE, {'price_max': 'cheap'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ordering(self):
+        """Test ordering by price descending then id"""
+        r1 = create_recipe(user=self.user, price=Decimal('2.00'))
+        r2 = create_recipe(user=self.user, price=Decimal('9.00'))
+        r3 = create_recipe(user=self.user, price=Decimal('2.00'))
+
+        res = self.client.get(URL_RECIPE, {'ordering': '-price'})
+
+        self.assertEqual([r['id'] for r in res.data], [r2.id, r3.id, r1.id])
+
+        res = self.client.get(URL_RECIPE, {'ordering': 'link'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_keyset_pagination(self):
+        """Test pages follow ordering without gaps or duplicates"""
+        ids = [
+            create_recipe(user=self.user, price=Decimal(price)).id
+            for price in ['3.00', '1.00', '3.00', '2.00', '3.00', '1.00']
+        ]
+
+        seen = []
+        params = {'ordering': 'price', 'page_size': 2}
+        url = URL_RECIPE
+        while url:
+            res = self.client.get(url, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            seen += [(r['price'], r['id']) for r in res.data['results']]
+            url, params = res.data['next'], None
+
+        expected = sorted(
+            (str(Recipe.objects.get(id=id).price), id) for id in ids
+        )
+        self.assertEqual(seen, expected)
+
+    def test_keyset_pagination_invalid_cursor(self):
+        """Test cursors of another ordering or edited ones get 400"""
+        recipe = create_recipe(user=self.user)
+
+        def make_cursor(data):
+            data = json.dumps(data).encode()
+            return base64.urlsafe_b64encode(data).decode()
+
+        title_cursor = make_cursor(['title', recipe.title, recipe.id])
+        edited = make_cursor(['price', 'abc', recipe.id])
+
+        for cursor in [title_cursor, edited, 'notbase64']:
+            res = self.client.get(URL_RECIPE, {
+                'ordering': 'price', 'page_size': 1, 'cursor': cursor,
+            })
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_update_unchanged_tags_no_writes(self):
+        """Test re-saving same tags does not touch link tables"""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Lunch'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Rice')
+        )
+        payload = {
+            'tags': [{'name': 'Lunch'}],
+            'ingredients': [{'name': 'Rice'}],
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(recipe.id), payload,
+                                    format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        link_writes = [
+            query['sql'] for query in queries
+            if query['sql'].startswith(('INSERT', 'DELETE'))
+            and '"core_recipe_' in query['sql']
+        ]
+        self.assertEqual(link_writes, [])
+
+    def test_update_tags_writes_only_difference(self):
+        """Test changing tags issues one delete and one insert"""
+        recipe = create_recipe(user=self.user)
+        keep = Tag.objects.create(user=self.user, name='Keep')
+        drop1 = Tag.objects.create(user=self.user, name='Drop1')
+        drop2 = Tag.objects.create(user=self.user, name='Drop2')
+        recipe.tags.add(keep, drop1, drop2)
+        payload = {'tags': [{'name': 'Keep'}, {'name': 'New1'},
+                            {'name': 'New2'}]}
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(recipe.id), payload,
+                                    format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        link_writes = [
+            query['sql'].split()[0] for query in queries
+            if query['sql'].startswith(('INSERT', 'DELETE'))
+            and '"core_recipe_tags"' in query['sql']
+        ]
+        self.assertEqual(link_writes, ['DELETE', 'INSERT'])
+        self.assertEqual(
+            sorted(recipe.tags.values_list('name', flat=True)),
+            ['Keep', 'New1', 'New2'],
+        )
+
+    def test_patch_updates_only_changed_columns(self):
+        """Test PATCH writes only the changed column of recipe"""
+        recipe = create_recipe(user=self.user, title='Old title')
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(recipe.id),
+                                    {'title': 'New title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        updates = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE "core_recipe" ')
+        ]
+        self.assertEqual(len(updates), 1)
+        set_clause = updates[0].split(' WHERE ')[0]
+        self.assertIn('"title"', set_clause)
+        self.assertNotIn('"description"', set_clause)
+        self.assertNotIn('"price"', set_clause)
+
+    def test_patch_unchanged_values_no_update(self):
+        """Test PATCH with same values does not issue UPDATE"""
+        recipe = create_recipe(user=self.user, title='Same title')
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(recipe.id),
+                                    {'title': 'Same title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse([
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE "core_recipe" ')
+        ])
+
 
 # For test upload images
 class ImageUploadTests(TestCase):
@@ -0,0 +1,98 @@
+"""
+Tests similar recipes API
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+def similar_url(recipe_id):
+    """Create similar recipes URL"""
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+class SimilarAPITests(TestCase):
+    """Test the similar action"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='similar@example.com', password='testpassword123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipe(self, user, tags, ingredients, title='Recipe'):
+        """Recipe linked to tags/ingredients by name, indexed on commit"""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                user=user, title=title, minute_to_make_recipe=1,
+                price=Decimal('1.00'), description='Similar',
+            )
+            recipe.tags.add(*[
+                Tag.objects.get_or_create(user=user, name=name)[0]
+                for name in tags
+            ])
+            recipe.ingredients.add(*[
+                Ingredient.objects.get_or_create(user=user, name=name)[0]
+                for name in ingredients
+            ])
+        return recipe
+
+    def test_similar_ranked(self):
+        """Test most similar first, unrelated and self left out"""
+        ingredients = ['Garlic', 'Tomato', 'Basil', 'Oil', 'Salt', 'Onion']
+        recipe = self.create_recipe(
+            self.user, ['Dinner', 'Pasta'], ingredients,
+        )
+        same = self.create_recipe(
+            self.user, ['Dinner', 'Pasta'], ingredients,
+        )
+        # Jaccard 8/9, almost surely shares a band with recipe
+        close = self.create_recipe(
+            self.user, ['Dinner', 'Pasta'], ingredients[:-1],
+        )
+        self.create_recipe(self.user, ['Dessert'], ['Sugar', 'Flour'])
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data],
+                         [same.id, close.id])
+        self.assertEqual(res.data[0]['similarity'], 1.0)
+        self.assertLess(res.data[1]['similarity'], 1.0)
+
+    def test_other_user_recipes_excluded(self):
+        """Test recipes of other users are never suggested"""
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='testpassword123',
+        )
+        recipe = self.create_recipe(self.user, ['Dinner'], ['Rice'])
+        self.create_recipe(other, ['Dinner'], ['Rice'])
+
+        res = self.client.get(similar_url(recipe.id))
+
+        self.assertEqual(res.data, [])
+
+    def test_index_follows_link_changes(self):
+        """Test changing tags/ingredients updates suggestions"""
+        recipe = self.create_recipe(self.user, ['Soup'], ['Leek', 'Potato'])
+        other = self.create_recipe(self.user, ['Cake'], ['Sugar'])
+        self.assertEqual(self.client.get(similar_url(recipe.id)).data, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.patch(
+                reverse('recipe:recipe-detail', args=[other.id]),
+                {'tags': [{'name': 'Soup'}],
+                 'ingredients': [{'name': 'Leek'}, {'name': 'Potato'}]},
+                format='json',
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(similar_url(recipe.id))
+        self.assertEqual([item['id'] for item in res.data], [other.id])
@@ -0,0 +1,172 @@
+"""
+Tests delta sync API
+"""
+import datetime
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag, Ingredient, Tombstone
+from recipe.tests.test_recipe_api import create_recipe
+
+CHANGES_URL = reverse('recipe:recipe-changes')
+
+
+class SyncAPITests(TestCase):
+    """Test the changes endpoint"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='sync@example.com', password='testpassword123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def changes(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        res = self.client.get(CHANGES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def ids(self, items):
+        return sorted(item['id'] for item in items)
+
+    def test_full_sync(self):
+        """Test since=0 returns every object of the user only"""
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='testpassword123',
+        )
+        create_recipe(other)
+
+        data = self.changes()
+
+        self.assertEqual(self.ids(data['recipes']), [recipe.id])
+        self.assertEqual(self.ids(data['tags']), [tag.id])
+        self.assertEqual(self.ids(data['ingredients']), [ingredient.id])
+        self.assertFalse(data['more'])
+        self.assertGreater(data['cursor'], 0)
+
+    def test_only_changes_after_cursor(self):
+        """Test unchanged rows are not sent again"""
+        recipe = create_recipe(self.user)
+        create_recipe(self.user, title='Untouched')
+        cursor = self.changes()['cursor']
+
+        self.client.patch(reverse('recipe:recipe-detail', args=[recipe.id]),
+                          {'title': 'Changed'})
+        data = self.changes(cursor)
+
+        self.assertEqual(self.ids(data['recipes']), [recipe.id])
+        self.assertEqual(data['recipes'][0]['title'], 'Changed')
+        self.assertEqual(self.changes(data['cursor'])['recipes'], [])
+
+    def test_unchanged_patch_not_synced(self):
+        """Test PATCH that changes nothing keeps sync_seq"""
+        recipe = create_recipe(self.user, title='Same')
+        cursor = self.changes()['cursor']
+
+        self.client.patch(reverse('recipe:recipe-detail', args=[recipe.id]),
+                          {'title': 'Same'})
+
+        self.assertEqual(self.changes(cursor)['recipes'], [])
+
+    def test_update_fields_save_synced(self):
+        """Test save(update_fields=...) also moves sync_seq"""
+        recipe = create_recipe(self.user)
+        cursor = self.changes()['cursor']
+
+        recipe.title = 'Renamed'
+        recipe.save(update_fields=['title'])
+
+        self.assertEqual(self.ids(self.changes(cursor)['recipes']),
+                         [recipe.id])
+        self.assertGreater(recipe.sync_seq, cursor)
+
+    def test_link_change_synced(self):
+        """Test linking a tag, from either side, syncs the recipe"""
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Lunch')
+        cursor = self.changes()['cursor']
+
+        tag.recipe_set.add(recipe)
+        data = self.changes(cursor)
+        self.assertEqual(self.ids(data['recipes']), [recipe.id])
+        self.assertEqual(data['recipes'][0]['tags'][0]['id'], tag.id)
+
+        tag.recipe_set.clear()
+        self.assertEqual(self.ids(self.changes(data['cursor'])['recipes']),
+                         [recipe.id])
+
+    def test_deletes_sent_as_tombstones(self):
+        """Test deleted objects are listed by id"""
+        recipe = create_recipe(self.user)
+        tag_id = Tag.objects.create(user=self.user, name='Old').id
+        cursor = self.changes()['cursor']
+
+        self.client.delete(reverse('recipe:recipe-detail', args=[recipe.id]))
+        Tag.objects.filter(id=tag_id).delete()
+        data = self.changes(cursor)
+
+        self.assertEqual(data['deleted']['recipes'], [recipe.id])
+        self.assertEqual(data['deleted']['tags'], [tag_id])
+        self.assertEqual(data['recipes'], [])
+
+    def test_paging_with_limit(self):
+        """Test changes are returned in pages of limit"""
+        recipes = [create_recipe(self.user) for _ in range(3)]
+
+        first = self.changes(0, limit=2)
+        second = self.changes(first['cursor'], limit=2)
+
+        self.assertTrue(first['more'])
+        self.assertFalse(second['more'])
+        self.assertEqual(
+            self.ids(first['recipes'] + second['recipes']),
+            sorted(recipe.id for recipe in recipes),
+        )
+
+    def test_cursor_before_compaction_gone(self):
+        """Test cursor older than compacted tombstones gets 410"""
+        recipe = create_recipe(self.user)
+        cursor = self.changes()['cursor']
+        recipe.delete()
+        Tombstone.objects.update(
+            deleted_at=datetime.datetime(2000, 1, 1, tzinfo=datetime.UTC),
+        )
+
+        call_command('compact_tombstones', stdout=io.StringIO())
+        res = self.client.get(CHANGES_URL, {'since': cursor})
+
+        self.assertEqual(res.status_code, status.HTTP_410_GONE)
+        self.assertFalse(Tombstone.objects.exists())
+        self.assertEqual(self.changes(0)['recipes'], [])
+
+    def test_horizon_waits_for_own_user_only(self):
+        """Test an open write holds up the sync of its user only"""
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='testpassword123',
+        )
+        # Test transaction stays open, its writer lock too
+        create_recipe(self.user)
+
+        reader = connection.copy()
+        self.addCleanup(reader.close)
+        with reader.cursor() as cursor:
+            cursor.execute("SET lock_timeout = '200ms'")
+            cursor.execute('SELECT core_sync_horizon(%s)', [other.id])
+            self.assertGreater(cursor.fetchone()[0], 0)
+
+            with self.assertRaises(OperationalError):
+                cursor.execute(
+                    'SELECT core_sync_horizon(%s)', [self.user.id],
+                )
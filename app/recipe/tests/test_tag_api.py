@@ -155,3 +155,28 @@ class PrivateAPITagTest(TestCase):
         res = self.client.get(URL_TAGS, {'ids_assigned': tag.id})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_popular_tags(self):
+        """Test most used tags ordered by recipe count"""
+        tag1 = Tag.objects.create(user=self.user, name='Rare')
+        tag2 = Tag.objects.create(user=self.user, name='Common')
+        Tag.objects.create(user=self.user, name='Unused')
+
+        for i in range(2):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                minute_to_make_recipe=1,
+                price=Decimal('1.0'),
+                description='Recipe description',
+            )
+            recipe.tags.add(tag2)
+        recipe.tags.add(tag1)
+
+        res = self.client.get(reverse('recipe:tag-popular'), {'limit': 5})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(tag['name'], tag['recipe_count']) for tag in res.data],
+            [('Common', 2), ('Rare', 1)],
+        )
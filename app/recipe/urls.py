@@ -23,6 +23,7 @@ router = DefaultRouter()
 router.register('recipes', views.RecipeAPIViewSet)
 router.register('tags', views.TagViewSet)
 router.register('igredients', views.IngredientViewSet)
+router.register('deletions', views.DeletionViewSet)
 # Name for reverse lookup
 app_name = 'recipe'
 
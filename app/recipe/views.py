@@ -2,12 +2,29 @@
 Views for recipe API
 """
 
+from decimal import Decimal, InvalidOperation
+
 from rest_framework import viewsets, mixins, status
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import Recipe, Tag, Ingredient
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+from core import bitmaps
+from core.cache import recipe_cache_key
+from core.deletion import delete_recipes
+from core.idempotency import idempotent
+from core.media import FileContentNegotiation, file_response
+from core.similarity import similar_recipes
+from core.models import DeletionOperation, Recipe, Tag, Ingredient
+from core.timing import ServerTimingMixin
 from recipe import serializers
+from recipe.facets import recipe_facets
+from recipe.pagination import KeysetPagination
+from recipe.sync import SyncExpired, changes_since
 
 # For custom action
 from rest_framework.decorators import action
@@ -22,6 +39,73 @@ from drf_spectacular.utils import (
 )
 
 
+# Filters of the recipe list, facets take the same ones
+RECIPE_FILTER_PARAMETERS = [
+    OpenApiParameter(
+
+        # Define name to to pass in to filter
+        name='tags',
+        # Accept params as string (IDs string) bc we
+        # want to seperated to list of intergers (we
+        # convert in this view class)
+        type=OpenApiTypes.STR,
+        # For documentation
+        description='Seperated by comma list of tag IDS to filter',
+    ),
+    OpenApiParameter(
+        'ingredients',
+        OpenApiTypes.STR,
+        description='Seperated comma list of ingredient IDS to filter',
+    ),
+    OpenApiParameter(
+        'match',
+        OpenApiTypes.STR,
+        enum=['any', 'all'],
+        description='Recipes with any (default) or all of the '
+                    'tags/ingredients, "all" uses the bitmap index',
+    ),
+    OpenApiParameter(
+        'pantry',
+        OpenApiTypes.STR,
+        description='Seperated comma list of ingredient IDS, '
+                    'recipes made only of these (bitmap index)',
+    ),
+    OpenApiParameter(
+        'index',
+        OpenApiTypes.STR,
+        enum=['sql', 'bitmap'],
+        description='Filter tags/ingredients with SQL joins '
+                    '(default) or the in memory bitmap index',
+    ),
+    OpenApiParameter(
+        'price_min',
+        OpenApiTypes.DECIMAL,
+        description='Only recipes costing at least this',
+    ),
+    OpenApiParameter(
+        'price_max',
+        OpenApiTypes.DECIMAL,
+        description='Only recipes costing at most this',
+    ),
+    OpenApiParameter(
+        'minutes_max',
+        OpenApiTypes.INT,
+        description='Only recipes made in at most this many minutes',
+    ),
+    OpenApiParameter(
+        'ordering',
+        OpenApiTypes.STR,
+        enum=[
+            prefix + field
+            for field in ('price', 'minute_to_make_recipe',
+                          'title', 'id')
+            for prefix in ('', '-')
+        ],
+        description='Sort column, "-" prefix for descending',
+    ),
+]
+
+
 # Decorated to extend the auto generated
 # schema that created by Django rest spectacular ?
 @extend_schema_view(
@@ -34,27 +118,10 @@ from drf_spectacular.utils import (
         # to the list API for this view, we using OpenAPI paramters provided
         # by drf sepctacular allow us to specify details of a paramter
         # accepted in API request ?
-        parameters=[
-            OpenApiParameter(
-
-                # Define name to to pass in to filter
-                name='tags',
-                # Accept params as string (IDs string) bc we
-                # want to seperated to list of intergers (we
-                # convert in this view class)
-                type=OpenApiTypes.STR,
-                # For documentation
-                description='Seperated by comma list of tag IDS to filter',
-            ),
-            OpenApiParameter(
-                'ingredients',
-                OpenApiTypes.STR,
-                description='Seperated comma list of ingredient IDS to filter',
-            ),
-        ]
+        parameters=RECIPE_FILTER_PARAMETERS,
     )
 )
-class RecipeAPIViewSet(viewsets.ModelViewSet):
+class RecipeAPIViewSet(ServerTimingMixin, viewsets.ModelViewSet):
     """View for manage recipe APIs as list and id"""
     serializer_class = serializers.RecipeDetailSerializer
 
@@ -78,6 +145,17 @@ class RecipeAPIViewSet(viewsets.ModelViewSet):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    # Opt in with ?page_size=N, see recipe/pagination.py
+    pagination_class = KeysetPagination
+
+    # Columns the list can be ordered by, each one has
+    # a (user, column, id) index on Recipe
+    ordering_fields = ['price', 'minute_to_make_recipe', 'title', 'id']
+
+    # Throttle budget, None is 'read'/'write' by method,
+    # actions can set their own (core/throttling.py)
+    throttle_scope = None
+
     # List paramters from list of integer (id)
     # to accept filter arguments as a list of IDs
     # as comma seperated string
@@ -85,6 +163,29 @@ class RecipeAPIViewSet(viewsets.ModelViewSet):
         """Convert list of strings to integers"""
         return list(map(int, query_string.split(',')))
 
+    def _param(self, name, convert):
+        """Optional query param converted to a type, 400 if invalid"""
+        value = self.request.query_params.get(name)
+        if value is None or value == '':
+            return None
+
+        try:
+            return convert(value)
+        except (ValueError, InvalidOperation):
+            raise ValidationError({name: f'Invalid value "{value}"'})
+
+    def get_ordering(self):
+        """Return (column, descending) from ?ordering=, default id"""
+        ordering = self.request.query_params.get('ordering', 'id')
+        field = ordering.lstrip('-')
+
+        if field not in self.ordering_fields:
+            raise ValidationError({
+                'ordering': f'Must be one of {self.ordering_fields}',
+            })
+
+        return field, ordering.startswith('-')
+
     # Get list of recipes base on authenticated user (authen above)
     # Override this get_queryset to get the current logged user using
     # self.request.user ? (define in AUTH_USER_MODEL)
@@ -101,19 +202,62 @@ class RecipeAPIViewSet(viewsets.ModelViewSet):
         # Define a queryset
         queryset = self.queryset
 
+        match = self.request.query_params.get('match', bitmaps.ANY)
+        pantry = self.request.query_params.get('pantry')
+        index = self.request.query_params.get('index', 'sql')
+        if match not in (bitmaps.ANY, bitmaps.ALL):
+            raise ValidationError({'match': 'Must be "any" or "all"'})
+        if index not in ('sql', 'bitmap'):
+            raise ValidationError({'index': 'Must be "sql" or "bitmap"'})
+
+        # "all" and pantry are only answered by the bitmap index
+        # (core/bitmaps.py), plain filters can opt in with ?index=bitmap
+        use_index = (tags or ingredients or pantry) and (
+            index == 'bitmap' or match == bitmaps.ALL or pantry
+        )
+        if use_index:
+            recipe_ids = bitmaps.filter_recipe_ids(
+                self.request.user.id,
+                tags=self._params_to_list_ints(tags) if tags else None,
+                ingredients=(self._params_to_list_ints(ingredients)
+                             if ingredients else None),
+                match=match,
+                pantry=self._params_to_list_ints(pantry) if pantry else None,
+            )
+            # One array parameter, the list can be very long
+            queryset = queryset.filter(id__any_of=recipe_ids)
+
         # Filter ManyToMany Fields ?
         # We make filter is an optional
-        if tags:
+        if tags and not use_index:
             # Convert params from string to list in as
             # defined that represent primary key
             tag_ids = self._params_to_list_ints(tags)
 
             # Double underscore in queryset mean Field lookup ?
             queryset = queryset.filter(tags__id__in=tag_ids)
-        if ingredients:
+        if ingredients and not use_index:
             ingredient_ids = self._params_to_list_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
 
+        # Range filters
+        price_min = self._param('price_min', Decimal)
+        price_max = self._param('price_max', Decimal)
+        minutes_max = self._param('minutes_max', int)
+
+        if price_min is not None:
+            queryset = queryset.filter(price__gte=price_min)
+        if price_max is not None:
+            queryset = queryset.filter(price__lte=price_max)
+        if minutes_max is not None:
+            queryset = queryset.filter(minute_to_make_recipe__lte=minutes_max)
+
+        # Order by requested column then id in the same direction,
+        # so the order is total (needed by keyset pagination) and
+        # matches the (user, column, id) index
+        field, descending = self.get_ordering()
+        prefix = '-' if descending else ''
+
         # Call specific user
         # Retrive all object then filter by user (must optimize ?)
         # We want user manage only their recipe (create, view, update)
@@ -123,7 +267,7 @@ class RecipeAPIViewSet(viewsets.ModelViewSet):
         # code above)
         return queryset.filter(
             user=self.request.user
-        ).order_by('id').distinct()
+        ).order_by(f'{prefix}{field}', f'{prefix}id').distinct()
 
     # Override this method to let DRF call
     # for a particular action ?
@@ -138,9 +282,19 @@ class RecipeAPIViewSet(viewsets.ModelViewSet):
         # custom action
         elif self.action == 'upload_image':
             return serializers.RecipeDetailImageSerializer
+        elif self.action == 'similar':
+            return serializers.SimilarRecipeSerializer
+        elif self.action == 'bulk_delete':
+            return serializers.RecipeBulkDeleteSerializer
 
         return self.serializer_class
 
+    # Retried POST with the same Idempotency-Key header
+    # gets the first response back (core/idempotency.py)
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     # Method for our existing view in order to
     # tell it to save correct user to recipe created
     # Override create method perform_create
@@ -161,7 +315,10 @@ class RecipeAPIViewSet(viewsets.ModelViewSet):
     # to detail endpoint ?
     # not detail ~ list view, generic list of the recipe
     # url_path = custom url path for our action
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    # throttle_scope: own rate for uploads (core/throttling.py)
+    @action(methods=['POST'], detail=True, url_path='upload-image',
+            throttle_scope='upload')
+    @idempotent
     def upload_image(self, request, pk=None):
 
         # Get recipe object by the primary key
@@ -179,6 +336,112 @@ class RecipeAPIViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    # Image of the recipe, only for its owner (get_object looks
+    # in the user recipes). The bytes are sent by nginx, this
+    # view only checks access (core/media.py)
+    @extend_schema(
+        parameters=[OpenApiParameter('v', OpenApiTypes.STR)],
+        responses={(200, 'image/*'): OpenApiTypes.BINARY},
+    )
+    @action(methods=['GET'], detail=True,
+            content_negotiation_class=FileContentNegotiation)
+    def image(self, request, pk=None):
+        recipe = self.get_object()
+        if not recipe.image:
+            raise NotFound('Recipe has no image')
+
+        return file_response(request, recipe.image)
+
+    # Many recipes at once, deleted in batches by a background
+    # job (core/deletion.py). Answers 202 with the operation,
+    # its progress is at the Location URL
+    @extend_schema(responses={202: serializers.DeletionOperationSerializer})
+    @action(methods=['POST'], detail=False, url_path='bulk-delete')
+    @idempotent
+    def bulk_delete(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        operation = delete_recipes(
+            request.user, serializer.validated_data['ids'],
+        )
+        data = serializers.DeletionOperationSerializer(operation).data
+        location = reverse('recipe:deletionoperation-detail',
+                           args=[operation.id])
+        return Response(
+            data, status=status.HTTP_202_ACCEPTED,
+            headers={'Location': request.build_absolute_uri(location)},
+        )
+
+    # Counts per tag, ingredient, price and time range of
+    # the recipes matching the same filters as the list
+    # Cached per user and filters, a change to the user
+    # recipes/tags/ingredients changes the key (core/cache.py)
+    # at once in the worker making it. Other workers keep their
+    # local entries until the NOTIFY reaches them (usually a few
+    # ms, core/invalidation.py), they may serve stale facets
+    # until then
+    @extend_schema(parameters=RECIPE_FILTER_PARAMETERS)
+    @action(methods=['GET'], detail=False)
+    def facets(self, request):
+        key = recipe_cache_key(
+            request.user.id, 'facets', request.query_params,
+        )
+        data = cache.get(key)
+
+        if data is None:
+            data = recipe_facets(self.get_queryset())
+            cache.set(key, data, settings.RECIPE_CACHE_TIMEOUT)
+
+        return Response(data)
+
+    # Recipes of the user with the most similar tags/ingredients,
+    # found through the MinHash/LSH index (core/similarity.py)
+    @extend_schema(parameters=[
+        OpenApiParameter('limit', OpenApiTypes.INT),
+    ])
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        recipe = self.get_object()
+        limit = min(max(self._param('limit', int) or 10, 1), 50)
+
+        scores = dict(similar_recipes(recipe, limit))
+        recipes = Recipe.objects.filter(id__in=scores).prefetch_related(
+            'tags', 'ingredients',
+        )
+        for similar in recipes:
+            similar.similarity = round(scores[similar.id], 3)
+
+        recipes = sorted(recipes, key=lambda item: (-item.similarity,
+                                                    item.id))
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
+    # Delta sync for offline clients, pass the "cursor" of the
+    # previous response as ?since= (0 or missing: everything)
+    @extend_schema(parameters=[
+        OpenApiParameter('since', OpenApiTypes.INT),
+        OpenApiParameter('limit', OpenApiTypes.INT),
+    ])
+    @action(methods=['GET'], detail=False)
+    def changes(self, request):
+        since = self._param('since', int) or 0
+        limit = self._param('limit', int) or settings.SYNC_CHANGES_LIMIT
+        limit = min(max(limit, 1), settings.SYNC_CHANGES_LIMIT)
+
+        try:
+            data = changes_since(
+                request.user, since, limit, self.get_serializer_context(),
+            )
+        except SyncExpired:
+            # Deletes after since are forgotten, start over
+            return Response(
+                {'detail': 'Cursor is too old, sync again from since=0'},
+                status=status.HTTP_410_GONE,
+            )
+
+        return Response(data)
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -206,7 +469,8 @@ class RecipeAPIViewSet(viewsets.ModelViewSet):
 # destroy, list, ...) check mixin with model ?
 # In this project, we let user create tag, ingredient
 # through recipe API
-class BaseRecipeAtributeViewSet(mixins.ListModelMixin,
+class BaseRecipeAtributeViewSet(ServerTimingMixin,
+                                mixins.ListModelMixin,
                                 mixins.UpdateModelMixin,
                                 mixins.DestroyModelMixin,
                                 viewsets.GenericViewSet):
@@ -233,22 +497,56 @@ class BaseRecipeAtributeViewSet(mixins.ListModelMixin,
         queryset = self.queryset
 
         if ids_assigned:
-            # Remove null recipe in filter, when tag/ingredients
-            # assign to recipe in system, then we delete that recipe
-            # a tag/ingredients has no recipe associated with it
-            # still appear in listing (tag/ingredients) but
-            # by ManyToMany Field so recipe field set to null ?
-            queryset = queryset.filter(recipe__isnull=False)
+            # recipe_count is kept by signals (core/signals.py),
+            # so no join on the recipe table and no distinct
+            # needed, the (user, recipe_count) index is used
+            queryset = queryset.filter(recipe_count__gt=0)
 
         return queryset.filter(
             user=self.request.user
-        ).order_by('name').distinct()
+        ).order_by('name')
+
+    def get_serializer_class(self):
+        """Return the serializer class for request"""
+        if self.action == 'popular':
+            return self.popular_serializer_class
+
+        return self.serializer_class
+
+    # Most used tags/ingredients of the user, ordered by
+    # the denormalized counter (?limit=N, default 10)
+    @extend_schema(parameters=[
+        OpenApiParameter(
+            'limit',
+            OpenApiTypes.INT,
+            description='Number of items returned (max 100)',
+        ),
+    ])
+    @action(methods=['GET'], detail=False)
+    def popular(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response(
+                {'limit': 'Must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = min(max(limit, 1), 100)
+
+        queryset = self.queryset.filter(
+            user=request.user,
+            recipe_count__gt=0,
+        ).order_by('-recipe_count', 'name')[:limit]
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
 
 
 class TagViewSet(BaseRecipeAtributeViewSet):
     """Manage tags """
 
     serializer_class = serializers.TagSerializer
+    popular_serializer_class = serializers.TagCountSerializer
     queryset = Tag.objects.all()
 
 
@@ -256,4 +554,21 @@ class IngredientViewSet(BaseRecipeAtributeViewSet):
     """Manage ingredient"""
 
     serializer_class = serializers.IngredientSerializer
+    popular_serializer_class = serializers.IngredientCountSerializer
     queryset = Ingredient.objects.all()
+
+
+# Progress of bulk deletions (RecipeAPIViewSet.bulk_delete)
+class DeletionViewSet(ServerTimingMixin,
+                      mixins.RetrieveModelMixin,
+                      viewsets.GenericViewSet):
+    """View background deletions of the user"""
+    serializer_class = serializers.DeletionOperationSerializer
+    queryset = DeletionOperation.objects.all()
+
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Filter queryset by authenticated user"""
+        return self.queryset.filter(user=self.request.user)
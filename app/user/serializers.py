@@ -52,15 +52,26 @@ class UserSerializer(serializers.ModelSerializer):
         # Because we dont force user to change password in this request so
         # set password field to non
         password = validated_data.pop('password', None)
-        user = super().update(instance, validated_data)
+
+        # Track changed columns to save only those
+        # (save(update_fields=...)) in a single UPDATE
+        changed = []
+        for attr, value in validated_data.items():
+            if getattr(instance, attr) != value:
+                setattr(instance, attr, value)
+                changed.append(attr)
 
         # Update the old password for user
         if password:
             # Must define password, if not it will stored in clear text
-            user.set_password(password)
-            user.save()
+            instance.set_password(password)
+            changed.append('password')
+
+        # Nothing changed, no UPDATE at all
+        if changed:
+            instance.save(update_fields=changed)
 
-        return user
+        return instance
 
 
 # Create a base class for serialize
@@ -2,13 +2,18 @@
 Tests API user
 """
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model  # noqa
 from django.urls import reverse
 
 # Import api client test
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from core.models import Job
 
 
 # URL endpoint create user
@@ -249,3 +254,47 @@ class PrivateAPIUserTest(TestCase):
         # the same updated in4
         self.assertEqual(self.user.name, sample_test['name'])
         self.assertTrue(self.user.check_password(sample_test['password']))
+
+    def test_update_user_single_update(self):
+        """Test name and password change are saved in one UPDATE"""
+        payload = {'password': 'Updatepassword', 'name': 'Updated user'}
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(ME_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        updates = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE "core_user" ')
+        ]
+        self.assertEqual(len(updates), 1)
+        set_clause = updates[0].split(' WHERE ')[0]
+        self.assertIn('"name"', set_clause)
+        self.assertIn('"password"', set_clause)
+        self.assertNotIn('"email"', set_clause)
+
+    def test_update_user_unchanged_no_update(self):
+        """Test PATCH with same name does not issue UPDATE"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(ME_URL, {'name': self.user.name})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse([
+            query['sql'] for query in queries
+            if query['sql'].startswith('UPDATE "core_user" ')
+        ])
+
+    def test_delete_account(self):
+        """Test delete deactivates now, deletion is queued"""
+        Token.objects.create(user=self.user)
+
+        res = self.client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertNotIn('id', res.data)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertTrue(
+            Job.objects.filter(name='core.run_deletion').exists()
+        )
@@ -6,7 +6,10 @@ View of user API
 # Search more APIview, viewset,
 # GenericsAPIView
 # authentication and permission for token
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, authentication, permissions, status
+from rest_framework.response import Response
+from core.deletion import delete_account
+from core.timing import ServerTimingMixin
 from user.serializers import UserSerializer
 
 # For token
@@ -17,7 +20,7 @@ from user.serializers import AuthTokenSerializer  # import serializer of token
 
 # Create API handles HTTP post request
 # for creating objects in database and logic
-class CreateUserAPIView(generics.CreateAPIView):
+class CreateUserAPIView(ServerTimingMixin, generics.CreateAPIView):
     """Create a new user"""
 
     # Define serializer class
@@ -28,7 +31,7 @@ class CreateUserAPIView(generics.CreateAPIView):
 
 # This view use token serializer we defined
 # Link to a URL to handle token authentication
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(ServerTimingMixin, ObtainAuthToken):
     """Create a authentication token for user"""
 
     # Define serializer class (using our customized)
@@ -41,11 +44,16 @@ class CreateTokenView(ObtainAuthToken):
     # Define render class (using default in api)
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    # ObtainAuthToken turns throttling off, login is the
+    # first thing to guess passwords on so keep it on
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+
 
 # This view for API user profile page
 # Using built in retreving and updating objects
 # in the db
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(ServerTimingMixin,
+                     generics.RetrieveUpdateDestroyAPIView):
     """Manage authenticated user profile"""
     serializer_class = UserSerializer
 
@@ -61,3 +69,16 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     def get_object(self):
         """Retrive and return authenticated user"""
         return self.request.user
+
+    # Deleting an account with all its recipes takes long, the
+    # account is deactivated (token gone) now and deleted in
+    # batches by a background job (core/deletion.py). Fire and
+    # forget: without a token the client can't poll progress,
+    # staff follow it in the admin (DeletionOperation)
+    def destroy(self, request, *args, **kwargs):
+        """Deactivate user and queue deletion of the account"""
+        delete_account(request.user)
+        return Response(
+            {'detail': 'Account deactivated, deletion queued'},
+            status=status.HTTP_202_ACCEPTED,
+        )
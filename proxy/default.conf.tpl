@@ -5,6 +5,53 @@ server {
         alias /vol/static;
     }
 
+    # Collected static files (app/core/storage.py), their .gz
+    # copies are sent as is to clients accepting gzip. Brotli
+    # copies are there for builds with ngx_brotli (brotli_static)
+    location /static/static/ {
+        root                    /vol;
+        gzip_static             on;
+        gzip_vary               on;
+
+        # Hashed names change with the content, cache them for good
+        location ~ "\.[0-9a-f]{12}\.\w+$" {
+            add_header          Cache-Control "public, max-age=31536000, immutable";
+        }
+    }
+
+    # Uploaded images, not public: only sent when the image action
+    # of a recipe checked its owner and answered X-Accel-Redirect
+    # (app/core/media.py). nginx adds ETag/Last-Modified, answers
+    # conditional and Range requests, Cache-Control is from Django
+    location /static/media/ {
+        internal;
+        alias                   /vol/static/media/;
+    }
+
+    # Metrics only for scrapers inside private networks
+    location = /metrics {
+        allow                   127.0.0.1;
+        allow                   10.0.0.0/8;
+        allow                   172.16.0.0/12;
+        allow                   192.168.0.0/16;
+        deny                    all;
+        uwsgi_pass              ${APP_HOST}:${APP_PORT};
+        include                 /etc/nginx/uwsgi_params;
+    }
+
+    # Admin and Swagger UI are served by their own pool,
+    # the API pool loads neither sessions nor templates
+    location /admin/ {
+        uwsgi_pass              ${APP_HOST}:${ADMIN_PORT};
+        include                 /etc/nginx/uwsgi_params;
+        client_max_body_size    10M;
+    }
+
+    location = /api/docs/ {
+        uwsgi_pass              ${APP_HOST}:${ADMIN_PORT};
+        include                 /etc/nginx/uwsgi_params;
+    }
+
     location / {
         uwsgi_pass              ${APP_HOST}:${APP_PORT};
         include                 /etc/nginx/uwsgi_params;
@@ -2,8 +2,41 @@
 
 set -e
 
+# Shared directory for metrics of all uWSGI workers,
+# cleared on start so stale files of old workers are dropped
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Token buckets of core/throttling.py, shared by the workers
+export THROTTLE_TABLE_PATH=${THROTTLE_TABLE_PATH:-/tmp/recipe-throttle}
+rm -f "$THROTTLE_TABLE_PATH"
+
 python manage.py wait_for_db
-python manage.py collectstatic --noinput
+# Collects (hashes, compresses) static files only if they changed
+python manage.py sync_static
 python manage.py migrate
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# OpenAPI schema of this code, so no request has to generate it
+python manage.py build_schema
+
+# Two pools, both load and warm up the app in the master, workers
+# fork from it and share its memory (no --lazy-apps, see
+# core/warmup.py). A worker is replaced once its RSS passes
+# UWSGI_RELOAD_ON_RSS MB, or after UWSGI_MAX_REQUESTS requests in
+# case growth is slow.
+UWSGI_OPTIONS="--master --enable-threads --module app.wsgi --need-app \
+    --reload-on-rss ${UWSGI_RELOAD_ON_RSS:-256} \
+    --max-requests ${UWSGI_MAX_REQUESTS:-10000} \
+    --worker-reload-mercy 30"
+
+# Admin and Swagger UI, every app loaded (app.settings),
+# the proxy sends /admin/ and /api/docs/ here
+uwsgi --socket :9001 --workers "${UWSGI_ADMIN_WORKERS:-1}" \
+    $UWSGI_OPTIONS &
+
+# The API, token authentication only: no sessions, CSRF,
+# admin or templates (app/settings_api.py)
+uwsgi --socket :9000 --workers "${UWSGI_WORKERS:-4}" \
+    --env DJANGO_SETTINGS_MODULE=app.settings_api \
+    $UWSGI_OPTIONS